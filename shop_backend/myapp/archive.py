@@ -0,0 +1,130 @@
+"""
+Cold storage for old orders.
+
+``archive_batch`` copies a batch of orders into ArchivedOrder, one row per
+order with its items packed into a JSON list, and deletes the Order and
+OrderItem rows in the same transaction. ``manage.py archive_orders`` feeds
+it batches of orders older than ``ORDER_ARCHIVE_AFTER_DAYS``.
+
+The order list reads the archive only when asked (``include_archived``).
+Hot and archived rows are both newest first, so ``merge_order_rows`` merges
+the two pages and keeps the cursor pagination unchanged.
+"""
+
+import heapq
+from decimal import Decimal
+from itertools import islice
+
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Q
+
+from .conditional import touch_orders_on_commit
+from .models import ArchivedOrder, Order, OrderItem
+from .projections import ORDER_COLUMNS, format_decimal, order_items_query
+
+ARCHIVED_ORDER_COLUMNS = ORDER_COLUMNS + ('items',)
+
+
+def order_page(queryset, params):
+    """
+    Apply the order list's status filter, cursor and ordering to an Order
+    or ArchivedOrder queryset.
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    if 'status' in params:
+        queryset = queryset.filter(status=params['status'])
+    if 'cursor' in params:
+        created_at, order_id = params['cursor']
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id))
+    return queryset
+
+
+def merge_order_rows(rows, archived_rows, limit):
+    """
+    Merge hot ``rows`` (ORDER_COLUMNS) and ``archived_rows``
+    (ARCHIVED_ORDER_COLUMNS), both newest first. Returns up to ``limit + 1``
+    rows in ORDER_COLUMNS order, the last one only telling whether there is
+    a next page, and the item rows, in ORDER_ITEM_COLUMNS order, of the
+    archived orders among the first ``limit``.
+    """
+    merged = heapq.merge(rows, archived_rows, key=lambda row: (row[2], row[0]), reverse=True)
+    page, item_rows = [], []
+    for row in islice(merged, limit + 1):
+        if len(row) > len(ORDER_COLUMNS):
+            order_id, items = row[0], row[-1]
+            if len(page) < limit:
+                item_rows.extend(
+                    (order_id, item_id, product_name, Decimal(product_price), quantity)
+                    for item_id, product_name, product_price, quantity in items
+                )
+            row = row[:-1]
+        page.append(row)
+    return page, item_rows
+
+
+def archive_batch(order_ids, cutoff):
+    """
+    Move the orders in ``order_ids`` created before ``cutoff`` to the
+    archive. Returns ``(orders, items)`` moved.
+    """
+    with transaction.atomic():
+        # 鎖住要搬移的訂單，避免搬移途中被取消而遺失更新
+        rows = list(
+            Order.objects.select_for_update()
+            .filter(id__in=order_ids, created_at__lt=cutoff)
+            .values_list(*ORDER_COLUMNS, 'cancelled_at')
+        )
+        if not rows:
+            return 0, 0
+        moved_ids = [row[0] for row in rows]
+        items = {order_id: [] for order_id in moved_ids}
+        item_count = 0
+        for order_id, item_id, product_name, product_price, quantity in order_items_query(moved_ids):
+            items[order_id].append([item_id, product_name, format_decimal(product_price), quantity])
+            item_count += 1
+
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(
+                id=order_id, user_id=user_id, created_at=created_at, total_amount=total_amount,
+                item_count=count, status=order_status, cancelled_at=cancelled_at, items=items[order_id],
+            )
+            for order_id, user_id, created_at, total_amount, count, order_status, cancelled_at in rows
+        ])
+        # 明細已先刪除，且兩個模型都沒有訊號；_raw_delete 直接送出兩個 DELETE，
+        # 不經由 Collector 先查詢 Order 的 items 反向關聯
+        OrderItem.objects.filter(order_id__in=moved_ids)._raw_delete(OrderItem.objects.db)
+        Order.objects.filter(id__in=moved_ids)._raw_delete(Order.objects.db)
+        touch_orders_on_commit(row[1] for row in rows)
+    return len(rows), item_count
+
+
+def table_size(model, using='default'):
+    """
+    Return the bytes allocated to ``model``'s table and indexes, or None
+    when the database does not expose it.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT pg_total_relation_size(%s)', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT data_length + index_length FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s',
+                [table]
+            )
+        elif connection.vendor == 'sqlite':
+            # dbstat 需以 SQLITE_ENABLE_DBSTAT_VTAB 編譯，不支援時回傳 None
+            try:
+                cursor.execute(
+                    'SELECT SUM(pgsize) FROM dbstat WHERE name = %s OR name IN '
+                    '(SELECT name FROM sqlite_master WHERE type = %s AND tbl_name = %s)',
+                    [table, 'index', table]
+                )
+            except DatabaseError:
+                return None
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
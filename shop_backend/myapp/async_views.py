@@ -0,0 +1,159 @@
+"""
+Async versions of the read-heavy endpoints.
+
+These are plain Django async views rather than DRF APIViews, so under an
+ASGI server they run on the event loop instead of occupying a worker
+thread. Query parameters, JWT validation and response shapes match the
+synchronous views in views.py.
+"""
+
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.db import DatabaseError
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+
+from .authentication import ShopJWTAuthentication
+from .catalog import aget_cached_catalog, aget_catalog_version, build_catalog, compute_etag, etag_matches
+from .conditional import aget_order_stamp, is_not_modified, order_validators, set_validators
+from .instrumentation import serialization_timer
+from .archive import ARCHIVED_ORDER_COLUMNS, merge_order_rows, order_page
+from .models import ArchivedOrder, Order
+from .pagination import encode_cursor
+from .projections import ORDER_COLUMNS, build_orders, order_items_query
+from .serializers import OrderQuerySerializer, ProductQuerySerializer
+from .views import ProductListView
+
+logger = logging.getLogger(__name__)
+
+
+def _json(data, status=200):
+    with serialization_timer():
+        return JsonResponse(
+            data,
+            status=status,
+            json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')},
+            content_type='application/json; charset=utf-8'
+        )
+
+
+async def _authenticate(request):
+    """
+    Validate the Bearer token and resolve its user without blocking the
+    event loop. Returns None when the request is not authenticated.
+    """
+    auth = ShopJWTAuthentication()
+    header = auth.get_header(request)
+    if header is None:
+        return None
+    raw_token = auth.get_raw_token(header)
+    if raw_token is None:
+        return None
+    try:
+        validated_token = auth.get_validated_token(raw_token)
+        return await auth.aget_user(validated_token)
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+@require_GET
+async def product_list(request):
+    """
+    GET api/async/products/ - 獲取商品列表（非同步）
+    """
+    query = ProductQuerySerializer(data=request.GET)
+    if not query.is_valid():
+        return _json({'message': '查詢參數錯誤', 'errors': query.errors}, status=400)
+    params = query.validated_data
+
+    try:
+        version = await aget_catalog_version()
+        variant = json.dumps(sorted(params.items()), default=str)
+        catalog = await aget_cached_catalog(version, variant)
+        if catalog is None:
+            # 重建時沿用同步版的單一重建鎖，在執行緒中執行
+            catalog = await sync_to_async(build_catalog)(
+                version, lambda: ProductListView._build_page(params), variant
+            )
+    except DatabaseError as e:
+        logger.error(f"Async product list database error: {str(e)}")
+        return _json({'message': '資料庫錯誤，請稍後再試'}, status=500)
+
+    if etag_matches(catalog['etag'], request.headers.get('If-None-Match')):
+        response = HttpResponse(status=304)
+    else:
+        response = _json({'message': '商品列表取得成功', **catalog['payload']})
+    response['ETag'] = catalog['etag']
+    return response
+
+
+@require_GET
+async def order_list(request):
+    """
+    GET api/async/orders/ - 獲取用戶的訂單列表（非同步）
+    """
+    query = OrderQuerySerializer(data=request.GET)
+    if not query.is_valid():
+        return _json({'message': '查詢參數錯誤', 'errors': query.errors}, status=400)
+    params = query.validated_data
+    limit = min(params.get('limit', settings.ORDER_PAGE_SIZE), settings.ORDER_MAX_PAGE_SIZE)
+
+    try:
+        user = await _authenticate(request)
+        if user is None:
+            return _json({'message': '使用者未登入'}, status=401)
+        variant = json.dumps(['list', sorted(params.items()), limit], default=str)
+        etag, last_modified = order_validators(user.id, await aget_order_stamp(user.id), variant)
+        if is_not_modified(request, etag, last_modified):
+            return set_validators(HttpResponse(status=304), etag, last_modified)
+        orders = order_page(Order.objects.filter(user_id=user.id), params)
+        # values_list 的 aiterator() 會在事件迴圈中同步執行查詢，改以 async for 讀取整個結果
+        rows = [row async for row in orders.values_list(*ORDER_COLUMNS)[:limit + 1]]
+        item_rows = []
+        if params['include_archived']:
+            archived = order_page(ArchivedOrder.objects.filter(user_id=user.id), params)
+            archived_rows = [row async for row in archived.values_list(*ARCHIVED_ORDER_COLUMNS)[:limit + 1]]
+            rows, item_rows = merge_order_rows(rows, archived_rows, limit)
+        next_cursor = None
+        if len(rows) > limit:
+            order_id, _, created_at = rows[limit - 1][:3]
+            next_cursor = encode_cursor(created_at.isoformat(), order_id)
+        rows = rows[:limit]
+        archived_ids = {row[0] for row in item_rows}
+        order_ids = [row[0] for row in rows if row[0] not in archived_ids]
+        if order_ids:
+            item_rows = [row async for row in order_items_query(order_ids)] + item_rows
+    except DatabaseError as e:
+        logger.error(f"Async order list database error: {str(e)}")
+        return _json({'message': '資料庫錯誤，請稍後再試'}, status=500)
+
+    data = build_orders(rows, item_rows)
+    response = _json({'message': '訂單列表取得成功', 'data': data, 'next_cursor': next_cursor})
+    return set_validators(response, etag, last_modified)
+
+
+@require_GET
+async def user_info(request):
+    """
+    GET api/async/user/info - 獲取用戶的姓名和電子郵件（非同步）
+    """
+    try:
+        user = await _authenticate(request)
+    except DatabaseError as e:
+        logger.error(f"Async user profile database error: {str(e)}")
+        return _json({'message': '資料庫錯誤，請稍後再試'}, status=500)
+    if user is None:
+        return _json({'message': '使用者未登入'}, status=401)
+
+    data = {
+        'first_name': getattr(user, 'first_name', ''),
+        'email': getattr(user, 'email', '')
+    }
+    etag = compute_etag(data)
+    if is_not_modified(request, etag):
+        return set_validators(HttpResponse(status=304), etag)
+    return set_validators(_json({'message': '用戶資料取得成功', 'data': data}), etag)
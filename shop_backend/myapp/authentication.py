@@ -0,0 +1,143 @@
+"""
+JWT authentication with configurable user lookup.
+
+``settings.JWT_AUTH_MODE`` selects how the user behind a valid access token
+is resolved:
+
+- ``database``: load ``CustomUser`` on every request (simplejwt default).
+- ``cached``: load the user's id and ``USER_CLAIMS`` through a short-TTL
+  cache entry that is dropped whenever the user is saved or deleted, and
+  return a ``TokenUser`` built from them. The password hash and other
+  fields never reach the cache.
+- ``stateless``: trust the ``email``, ``first_name``, ``is_active`` and
+  ``is_staff`` claims stamped into the token at login and return a
+  ``TokenUser`` without any query. Tokens minted before the claims existed
+  fall back to the cached lookup.
+
+In stateless mode a deactivated, renamed or demoted user is only noticed
+when the access token is refreshed, i.e. within ``ACCESS_TOKEN_LIFETIME``.
+"""
+
+import secrets
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from rest_framework.authentication import BaseAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from .instrumentation import record_cache_lookup
+
+USER_CLAIMS = ('email', 'first_name', 'is_active', 'is_staff')
+
+# MetricsTokenAuthentication 成功時的 request.auth
+METRICS_TOKEN_AUTH = 'metrics_token'
+
+
+def _user_claims(user):
+    return {claim: getattr(user, claim) for claim in USER_CLAIMS}
+
+
+def add_user_claims(token, user):
+    for claim, value in _user_claims(user).items():
+        token[claim] = value
+    return token
+
+
+def _user_cache_key(user_id):
+    # 以前的版本以 jwt_user_<id> 快取整個使用者物件
+    return f'jwt_user_claims_{user_id}'
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(_user_cache_key(user_id))
+
+
+def _auth_mode():
+    return getattr(settings, 'JWT_AUTH_MODE', 'database')
+
+
+class ShopJWTAuthentication(JWTAuthentication):
+
+    def get_user(self, validated_token):
+        mode = _auth_mode()
+        if mode == 'stateless' and all(claim in validated_token for claim in USER_CLAIMS):
+            return self._get_token_user(validated_token)
+        if mode in ('stateless', 'cached'):
+            return self._get_cached_user(validated_token)
+        return super().get_user(validated_token)
+
+    async def aget_user(self, validated_token):
+        mode = _auth_mode()
+        if mode == 'stateless' and all(claim in validated_token for claim in USER_CLAIMS):
+            return self._get_token_user(validated_token)
+
+        user_id = self._get_user_id(validated_token)
+        key = _user_cache_key(user_id)
+        if mode in ('stateless', 'cached'):
+            claims = await cache.aget(key)
+            record_cache_lookup(claims is not None)
+            if claims is not None:
+                return self._get_claims_user(user_id, claims)
+        try:
+            user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        self._check_active(user.is_active)
+        if mode in ('stateless', 'cached'):
+            claims = _user_claims(user)
+            await cache.aset(key, claims, timeout=settings.JWT_USER_CACHE_TIMEOUT)
+            return self._get_claims_user(user_id, claims)
+        return user
+
+    def _get_token_user(self, validated_token):
+        self._check_active(validated_token['is_active'])
+        return api_settings.TOKEN_USER_CLASS(validated_token)
+
+    def _get_cached_user(self, validated_token):
+        user_id = self._get_user_id(validated_token)
+        key = _user_cache_key(user_id)
+        claims = cache.get(key)
+        record_cache_lookup(claims is not None)
+        if claims is None:
+            claims = _user_claims(super().get_user(validated_token))
+            cache.set(key, claims, timeout=settings.JWT_USER_CACHE_TIMEOUT)
+        return self._get_claims_user(user_id, claims)
+
+    def _get_claims_user(self, user_id, claims):
+        self._check_active(claims['is_active'])
+        return api_settings.TOKEN_USER_CLASS({api_settings.USER_ID_CLAIM: user_id, **claims})
+
+    @staticmethod
+    def _get_user_id(validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise AuthenticationFailed('Token contained no recognizable user identification',
+                                       code='bad_authorization_header')
+
+    @staticmethod
+    def _check_active(is_active):
+        if api_settings.CHECK_USER_IS_ACTIVE and not is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+
+
+class MetricsTokenAuthentication(BaseAuthentication):
+    """
+    Accept ``Authorization: Bearer <METRICS_TOKEN>`` from monitoring
+    clients. Other bearer tokens are left to ShopJWTAuthentication.
+    """
+
+    def authenticate(self, request):
+        token = getattr(settings, 'METRICS_TOKEN', '')
+        scheme, _, credentials = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+        if not token or scheme.lower() != 'bearer':
+            return None
+        if not secrets.compare_digest(credentials.encode('utf-8'), token.encode('utf-8')):
+            return None
+        return AnonymousUser(), METRICS_TOKEN_AUTH
+
+    def authenticate_header(self, request):
+        return 'Bearer realm="api"'
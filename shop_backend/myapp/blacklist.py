@@ -0,0 +1,293 @@
+"""
+Cache-backed refresh-token blacklist.
+
+Revoked tokens are stored in the security cache (``SECURITY_CACHE_ALIAS``),
+which never culls entries, as ``jwt_blacklist_<jti>`` with a TTL equal to
+the token's remaining lifetime, so the blacklist never needs cleaning up.
+Revoking uses ``cache.add``, which makes "check and revoke" a single atomic
+step: when two requests race to rotate the same refresh token, only one of
+them wins.
+
+Lookups first ask a per-process Bloom filter. A Bloom filter has no false
+negatives, so "not in the filter" means "not revoked" without a round trip
+to the cache. To learn about revocations made by other workers, each
+revocation is also appended to a numbered log in the cache, and every
+process replays new log entries into its filter at most once per
+``JWT_BLACKLIST_SYNC_INTERVAL`` seconds. A token revoked by another worker
+may therefore pass ``is_revoked`` for up to that interval. Rotation is not
+affected because it always goes through ``cache.add``.
+
+Every ``JWT_BLACKLIST_SNAPSHOT_INTERVAL`` log entries a worker writes a
+snapshot of the revocations that have not expired yet. A process starting
+cold loads the snapshot and replays only the log after it. If the log's
+sequence number is lost, the next revocation restarts it under a new
+epoch, and processes that see the epoch change or the sequence go
+backwards rebuild their filter from the snapshot. Rebuilds fill a new
+filter and swap it in, so lookups never see a half-built one.
+
+A Bloom filter cannot forget, so expired revocations would fill it until
+every lookup is a false positive. Writing a snapshot, or inserting more
+than ``JWT_BLACKLIST_BLOOM_CAPACITY`` entries, drops the expired ones and
+refills the filter from the rest. ``RevocationFilter.metrics`` reports the
+fill ratio and the resulting false-positive rate.
+"""
+
+import hashlib
+import secrets
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
+
+BLACKLIST_KEY_PREFIX = 'jwt_blacklist'
+BLACKLIST_SEQ_KEY = 'jwt_blacklist_seq'
+BLACKLIST_EPOCH_KEY = 'jwt_blacklist_epoch'
+BLACKLIST_SNAPSHOT_KEY = 'jwt_blacklist_snapshot'
+# 最新快照的 (epoch, seq)，與序號一起讀取，不需載入整份快照
+BLACKLIST_SNAPSHOT_SEQ_KEY = 'jwt_blacklist_snapshot_seq'
+
+
+def security_cache():
+    # 獨立於一般快取，不會因項目數達上限而被刪除（見 settings.py 的 SECURITY_CACHE_ALIAS）
+    return caches[getattr(settings, 'SECURITY_CACHE_ALIAS', 'default')]
+
+
+class BloomFilter:
+    def __init__(self, size_bits=1 << 20, hashes=7):
+        self.size_bits = size_bits
+        self.hashes = hashes
+        self._bits = bytearray(size_bits // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size_bits for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    def fill_ratio(self):
+        return int.from_bytes(self._bits, 'little').bit_count() / self.size_bits
+
+    def false_positive_rate(self):
+        return self.fill_ratio() ** self.hashes
+
+
+def _log_key(seq):
+    return f'{BLACKLIST_KEY_PREFIX}_log_{seq}'
+
+
+def _read_log(cache, first, last):
+    """
+    Return ``{jti: exp}`` for the unexpired revocations logged with
+    sequence numbers ``first`` to ``last``.
+    """
+    revoked = {}
+    now = time.time()
+    keys = [_log_key(n) for n in range(first, last + 1)]
+    for start in range(0, len(keys), 1000):
+        # 過期的紀錄已隨 TTL 消失，剩下的也只保留尚未過期的
+        for jti, exp in cache.get_many(keys[start:start + 1000]).values():
+            if exp > now:
+                revoked[jti] = exp
+    return revoked
+
+
+class RevocationFilter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 同一時間只有一個執行緒同步，其他執行緒沿用目前的 filter
+        self._sync_lock = threading.Lock()
+        self._bloom = self._new_bloom()
+        # 上次重新填入 filter 時的項目數
+        self._filled = 0
+        # 本行程已知且尚未過期的撤銷紀錄，用來寫入快照
+        self._revoked = {}
+        self._pending = None
+        self._epoch = None
+        self._seq = 0
+        self._synced_at = 0.0
+
+    @staticmethod
+    def _new_bloom():
+        return BloomFilter(
+            size_bits=getattr(settings, 'JWT_BLACKLIST_BLOOM_BITS', 1 << 20),
+            hashes=getattr(settings, 'JWT_BLACKLIST_BLOOM_HASHES', 7),
+        )
+
+    def add(self, jti, exp):
+        with self._lock:
+            self._bloom.add(jti)
+            self._revoked[jti] = exp
+            if self._pending is not None:
+                # 重建期間的撤銷在換上新的 filter 時補上
+                self._pending[jti] = exp
+
+    def might_contain(self, jti):
+        self._sync()
+        with self._lock:
+            return jti in self._bloom
+
+    def _sync(self):
+        interval = getattr(settings, 'JWT_BLACKLIST_SYNC_INTERVAL', 1.0)
+        if time.monotonic() - self._synced_at < interval:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() - self._synced_at < interval:
+                return
+            self._synced_at = time.monotonic()
+            cache = security_cache()
+            state = cache.get_many([BLACKLIST_SEQ_KEY, BLACKLIST_EPOCH_KEY, BLACKLIST_SNAPSHOT_SEQ_KEY])
+            latest = state.get(BLACKLIST_SEQ_KEY, 0)
+            epoch = state.get(BLACKLIST_EPOCH_KEY)
+            if epoch != self._epoch or latest < self._seq:
+                # 序號被清除後重新開始，無法得知錯過哪些撤銷
+                self._rebuild(cache, epoch, latest)
+            elif latest > self._seq:
+                revoked = _read_log(cache, self._seq + 1, latest)
+                with self._lock:
+                    for jti, exp in revoked.items():
+                        self._bloom.add(jti)
+                        self._revoked[jti] = exp
+                    self._seq = latest
+
+            with self._lock:
+                inserted = self._bloom.count
+            # 每次重新填入後項目數至少加倍才再做一次，活著的撤銷超過容量時不會每次同步都重建
+            if inserted >= max(self._capacity(), 2 * self._filled):
+                self._prune()
+
+            snapshot_epoch, snapshot_seq = state.get(BLACKLIST_SNAPSHOT_SEQ_KEY, (None, 0))
+            if snapshot_epoch != epoch:
+                snapshot_seq = 0
+            if epoch is not None and self._seq - snapshot_seq >= self._snapshot_interval():
+                self._write_snapshot(cache, epoch)
+        finally:
+            self._sync_lock.release()
+
+    @staticmethod
+    def _snapshot_interval():
+        return getattr(settings, 'JWT_BLACKLIST_SNAPSHOT_INTERVAL', 1000)
+
+    @staticmethod
+    def _capacity():
+        return getattr(settings, 'JWT_BLACKLIST_BLOOM_CAPACITY', 100_000)
+
+    def _rebuild(self, cache, epoch, latest):
+        with self._lock:
+            self._pending = {}
+            # 已知的撤銷仍然有效，快取中的紀錄遺失時也不能忘記
+            revoked, first = dict(self._revoked), 1
+        snapshot = cache.get(BLACKLIST_SNAPSHOT_KEY)
+        if snapshot is not None and snapshot['seq'] <= latest:
+            # 不同 epoch 的快照仍是有效的撤銷紀錄，只是序號不再對應
+            revoked.update(snapshot['revoked'])
+            if snapshot['epoch'] == epoch:
+                first = snapshot['seq'] + 1
+        revoked.update(_read_log(cache, first, latest))
+        self._fill(revoked)
+        with self._lock:
+            self._epoch, self._seq = epoch, latest
+
+    def _prune(self):
+        with self._lock:
+            self._pending = {}
+            revoked = dict(self._revoked)
+        self._fill(revoked)
+
+    def _fill(self, revoked):
+        """
+        Swap in a new filter holding the unexpired entries of ``revoked``
+        and those added since ``_pending`` was set.
+        """
+        now = time.time()
+        bloom = self._new_bloom()
+        revoked = {jti: exp for jti, exp in revoked.items() if exp > now}
+        for jti in revoked:
+            bloom.add(jti)
+        with self._lock:
+            for jti, exp in self._pending.items():
+                bloom.add(jti)
+                revoked[jti] = exp
+            self._bloom, self._revoked, self._pending = bloom, revoked, None
+            self._filled = bloom.count
+
+    def _write_snapshot(self, cache, epoch):
+        # 過期的撤銷同時移出快照與 filter
+        self._prune()
+        with self._lock:
+            snapshot = {'epoch': epoch, 'seq': self._seq, 'revoked': dict(self._revoked)}
+        # 快照先於序號寫入，讀到序號的行程一定能載入不舊於它的快照
+        cache.set(BLACKLIST_SNAPSHOT_KEY, snapshot, timeout=None)
+        cache.set(BLACKLIST_SNAPSHOT_SEQ_KEY, (epoch, snapshot['seq']), timeout=None)
+
+    def metrics(self):
+        with self._lock:
+            bloom, revoked = self._bloom, len(self._revoked)
+        return {
+            'revoked': revoked,
+            'bloom_entries': bloom.count,
+            'bloom_fill_ratio': bloom.fill_ratio(),
+            'bloom_false_positive_rate': bloom.false_positive_rate(),
+        }
+
+
+revocation_filter = RevocationFilter()
+
+
+def _remaining_lifetime(exp):
+    return max(int(exp - time.time()), 1)
+
+
+def revoke(jti, exp):
+    """
+    Blacklist ``jti`` until ``exp``. Returns False if it was already revoked.
+    """
+    cache = security_cache()
+    timeout = _remaining_lifetime(exp)
+    if not cache.add(f'{BLACKLIST_KEY_PREFIX}_{jti}', 1, timeout=timeout):
+        return False
+    revocation_filter.add(jti, exp)
+    try:
+        seq = cache.incr(BLACKLIST_SEQ_KEY)
+    except ValueError:
+        # 序號遺失時從 0 重新開始並換一個 epoch，各行程看到後會重建 filter
+        cache.add(BLACKLIST_SEQ_KEY, 0, timeout=None)
+        cache.set(BLACKLIST_EPOCH_KEY, secrets.token_hex(8), timeout=None)
+        seq = cache.incr(BLACKLIST_SEQ_KEY)
+    cache.set(_log_key(seq), (jti, exp), timeout=timeout)
+    return True
+
+
+def is_revoked(jti):
+    if getattr(settings, 'JWT_BLACKLIST_BLOOM', True) and not revocation_filter.might_contain(jti):
+        return False
+    return security_cache().get(f'{BLACKLIST_KEY_PREFIX}_{jti}') is not None
+
+
+class ShopRefreshToken(RefreshToken):
+    """
+    Refresh token checked against and revoked in the cache blacklist.
+    """
+
+    def verify(self, *args, **kwargs):
+        super().verify(*args, **kwargs)
+        if is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError('Token is blacklisted')
+
+    def blacklist(self):
+        if not revoke(self.payload[api_settings.JTI_CLAIM], self.payload['exp']):
+            raise TokenError('Token is blacklisted')
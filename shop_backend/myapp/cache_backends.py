@@ -0,0 +1,56 @@
+"""
+Database cache backend for deployments without Redis.
+
+Django's DatabaseCache makes ``add`` atomic through the ``cache_key``
+primary key, but inherits ``incr`` from BaseCache as a ``get`` followed by
+a ``set``: two workers can read the same value and both write value + 1.
+The revocation and search logs number their entries with ``incr``, so this
+backend reads the row with SELECT ... FOR UPDATE and writes it back in one
+transaction. SQLite has no row locks, so settings.py opens its transactions
+with ``transaction_mode='IMMEDIATE'``, which takes the write lock before
+reading.
+
+Create the tables with ``python manage.py createcachetable``.
+"""
+
+import base64
+import pickle
+
+from django.core.cache.backends.db import DatabaseCache as DjangoDatabaseCache
+from django.db import connections, models, router, transaction
+from django.utils.timezone import now as tz_now
+
+
+class DatabaseCache(DjangoDatabaseCache):
+    def incr(self, key, delta=1, version=None):
+        cache_key = self.make_and_validate_key(key, version=version)
+        db = router.db_for_write(self.cache_model_class)
+        connection = connections[db]
+        quote_name = connection.ops.quote_name
+        for_update = ' FOR UPDATE' if connection.features.has_select_for_update else ''
+
+        with transaction.atomic(using=db), connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {quote_name('value')}, {quote_name('expires')} FROM {quote_name(self._table)} "
+                f"WHERE {quote_name('cache_key')} = %s{for_update}",
+                [cache_key],
+            )
+            row = cursor.fetchone()
+            if row is not None:
+                value, expires = row
+                expression = models.Expression(output_field=models.DateTimeField())
+                for converter in connection.ops.get_db_converters(expression) + \
+                        expression.get_db_converters(connection):
+                    expires = converter(expires, expression, connection)
+            if row is None or expires < tz_now():
+                raise ValueError(f"Key '{key}' not found")
+
+            value = pickle.loads(base64.b64decode(connection.ops.process_clob(value).encode()))
+            new_value = value + delta
+            # 只更新值，保留原本的到期時間
+            cursor.execute(
+                f"UPDATE {quote_name(self._table)} SET {quote_name('value')} = %s "
+                f"WHERE {quote_name('cache_key')} = %s",
+                [base64.b64encode(pickle.dumps(new_value, self.pickle_protocol)).decode('latin1'), cache_key],
+            )
+        return new_value
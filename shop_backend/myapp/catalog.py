@@ -0,0 +1,181 @@
+"""
+Versioned product catalog cache.
+
+The serialized product list is stored in the Django cache under a key that
+embeds a catalog version. Saving or deleting a Product bumps the version
+(see signals.py), so stale payloads are never read again and simply expire.
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .instrumentation import record_cache_lookup
+from .models import Product
+
+CATALOG_VERSION_KEY = 'product_catalog_version'
+CATALOG_KEY_PREFIX = 'product_catalog'
+
+
+def _catalog_timeout():
+    return getattr(settings, 'PRODUCT_CATALOG_CACHE_TIMEOUT', 60 * 60)
+
+
+def _lock_timeout():
+    return getattr(settings, 'PRODUCT_CATALOG_LOCK_TIMEOUT', 10)
+
+
+def _new_version():
+    # 以時間作為初始版本，避免版本鍵被淘汰後又回到舊版本號而讀到過期資料
+    return time.time_ns() // 1000
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, _new_version(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, _new_version())
+    return version
+
+
+async def aget_catalog_version():
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        await cache.aadd(CATALOG_VERSION_KEY, _new_version(), timeout=None)
+        version = await cache.aget(CATALOG_VERSION_KEY, _new_version())
+    return version
+
+
+def bump_catalog_version():
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        version = _new_version()
+        cache.set(CATALOG_VERSION_KEY, version, timeout=None)
+        return version
+
+
+def compute_etag(data):
+    body = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return '"%s"' % hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+def etag_matches(etag, if_none_match):
+    if not etag or not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    if '*' in candidates:
+        return True
+    return any(tag.removeprefix('W/') == etag for tag in candidates)
+
+
+def _catalog_key(version, variant):
+    digest = hashlib.md5(variant.encode('utf-8')).hexdigest() if variant else 'all'
+    return f'{CATALOG_KEY_PREFIX}:{version}:{digest}'
+
+
+def get_cached_catalog(version, variant=''):
+    """
+    Return the cached ``{'etag', 'payload'}`` entry for ``version`` or None.
+
+    ``variant`` identifies one page/filter combination of the catalog.
+    """
+    entry = cache.get(_catalog_key(version, variant))
+    record_cache_lookup(entry is not None)
+    return entry
+
+
+async def aget_cached_catalog(version, variant=''):
+    entry = await cache.aget(_catalog_key(version, variant))
+    record_cache_lookup(entry is not None)
+    return entry
+
+
+def build_catalog(version, builder, variant=''):
+    """
+    Rebuild the catalog entry for ``version`` with ``builder``.
+
+    Only the worker holding the rebuild lock runs ``builder``; the others
+    poll the cache for its result instead of hitting the database at the
+    same time. If the lock holder does not finish in time, the waiting
+    worker builds the payload itself without storing it.
+    """
+    key = _catalog_key(version, variant)
+    lock_key = f'{key}:lock'
+    lock_timeout = _lock_timeout()
+
+    if cache.add(lock_key, 1, timeout=lock_timeout):
+        try:
+            # 取得鎖前，上一個持鎖者可能剛存入結果
+            entry = cache.get(key)
+            if entry is not None:
+                return entry
+            payload = builder()
+            entry = {'etag': compute_etag(payload), 'payload': payload}
+            cache.set(key, entry, timeout=_catalog_timeout())
+            return entry
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+
+    payload = builder()
+    return {'etag': compute_etag(payload), 'payload': payload}
+
+
+class ProductPriceIndex:
+    """
+    Process-local ``id -> (name, price, stock_shards)`` lookup used when
+    pricing orders.
+
+    Entries are tagged with the catalog version they were read under and the
+    whole index is dropped once the version moves on, so a Product save or
+    delete in any worker invalidates every process. Ids that are not in the
+    index are loaded with a single ``id__in`` query.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = {}
+
+    def resolve(self, product_ids):
+        product_ids = set(product_ids)
+        # 先讀版本再查資料庫，查詢期間若商品被修改，下一次請求會看到新版本並捨棄這些資料
+        version = get_catalog_version()
+        with self._lock:
+            if self._version != version:
+                self._version = version
+                self._entries = {}
+            found = {pid: self._entries[pid] for pid in product_ids if pid in self._entries}
+
+        missing = product_ids - found.keys()
+        if missing:
+            loaded = {
+                pid: (name, price, stock_shards)
+                for pid, name, price, stock_shards in Product.objects.filter(id__in=missing).values_list(
+                    'id', 'name', 'price', 'stock_shards'
+                )
+            }
+            with self._lock:
+                if self._version == version:
+                    self._entries.update(loaded)
+            found.update(loaded)
+        return found
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+            self._entries = {}
+
+
+price_index = ProductPriceIndex()
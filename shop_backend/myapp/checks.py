@@ -0,0 +1,70 @@
+"""
+System checks for the cache configuration.
+
+The app keeps state shared by all workers in the cache: ``cache.add``
+decides which request rotates a refresh token, and ``cache.incr`` numbers
+the revocation and search logs. Redis and the app's DatabaseCache (see
+myapp/cache_backends.py) make those operations atomic across processes.
+Django's own DatabaseCache does not lock the row in ``incr``, LocMemCache is
+private to each process, and FileBasedCache implements ``add`` as a check
+followed by a write. The local and database caches also delete entries once
+they hold ``MAX_ENTRIES``, which must never happen to the security cache: a
+culled revocation is a token that works again.
+"""
+
+import sys
+
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+ATOMIC_CACHE_BACKENDS = (
+    'django_redis.cache.RedisCache',
+    'django.core.cache.backends.redis.RedisCache',
+    'myapp.cache_backends.DatabaseCache',
+)
+
+FILE_CACHE_BACKEND = 'django.core.cache.backends.filebased.FileBasedCache'
+
+CULLING_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    FILE_CACHE_BACKEND,
+    'django.core.cache.backends.db.DatabaseCache',
+    'myapp.cache_backends.DatabaseCache',
+)
+
+# 未設定 MAX_ENTRIES 時 Django 的預設值
+DEFAULT_MAX_ENTRIES = 300
+
+
+@register()
+def check_cache_backends(app_configs, **kwargs):
+    messages = []
+    workers = getattr(settings, 'WEB_CONCURRENCY', 1)
+    security_alias = getattr(settings, 'SECURITY_CACHE_ALIAS', 'default')
+    for alias, config in settings.CACHES.items():
+        backend = config['BACKEND']
+        if workers > 1 and backend not in ATOMIC_CACHE_BACKENDS:
+            messages.append(Error(
+                f"CACHES['{alias}'] uses {backend}, which {workers} workers cannot share atomically.",
+                hint='Set REDIS_URL, CACHE_BACKEND=redis or CACHE_BACKEND=db when WEB_CONCURRENCY is greater than 1.',
+                obj=alias,
+                id='myapp.E001',
+            ))
+        elif backend == FILE_CACHE_BACKEND:
+            messages.append(Warning(
+                f"CACHES['{alias}'] uses FileBasedCache, whose add() and incr() are not atomic.",
+                hint='Use it for single-process development only.',
+                obj=alias,
+                id='myapp.W001',
+            ))
+
+        max_entries = config.get('OPTIONS', {}).get('MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+        if alias == security_alias and backend in CULLING_CACHE_BACKENDS and max_entries < sys.maxsize:
+            messages.append(Error(
+                f"CACHES['{alias}'] holds revoked tokens and verification codes, but {backend} "
+                f"deletes entries at random once it holds {max_entries}.",
+                hint="Set OPTIONS['MAX_ENTRIES'] to sys.maxsize or use Redis for this cache.",
+                obj=alias,
+                id='myapp.E002',
+            ))
+    return messages
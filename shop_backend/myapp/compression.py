@@ -0,0 +1,121 @@
+"""
+Response compression negotiated from ``Accept-Encoding``.
+
+CompressionMiddleware compresses response bodies of at least
+``COMPRESSION_MIN_SIZE`` bytes with brotli when the client accepts it and
+the optional ``brotli`` package is installed, and with gzip otherwise.
+Smaller bodies are sent as is: below a kilobyte or so the saved bytes do
+not pay for the compression time and the extra headers.
+
+A compressed body is no longer byte-for-byte what the ETag was computed
+for, so strong ETags are weakened (``W/``). ``etag_matches`` ignores the
+prefix, so conditional requests still match.
+"""
+
+import gzip
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+
+def _min_size():
+    return getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+
+def _gzip_level():
+    return getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6)
+
+
+def _brotli_quality():
+    return getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+
+
+def available_encodings():
+    # 依偏好排序，用戶端權重相同時採用較前者
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(accept_encoding, encodings=None):
+    """
+    Return the entry of ``encodings`` the client prefers according to the
+    ``Accept-Encoding`` header, or None to send the body uncompressed.
+    """
+    weights = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        param, _, value = params.strip().partition('=')
+        if param.strip().lower() == 'q':
+            try:
+                weight = float(value)
+            except ValueError:
+                weight = 0.0
+        weights[name] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in encodings or available_encodings():
+        weight = weights.get(encoding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=_brotli_quality())
+    # mtime 固定為 0，相同內容壓縮後的位元組也相同
+    return gzip.compress(content, compresslevel=_gzip_level(), mtime=0)
+
+
+class CompressionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self._compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._compress(request, await self.get_response(request))
+
+    @staticmethod
+    def _compress(request, response):
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or not 200 <= response.status_code < 300
+            or len(response.content) < _min_size()
+        ):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
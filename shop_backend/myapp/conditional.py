@@ -0,0 +1,109 @@
+"""
+Conditional GET for per-user order endpoints.
+
+Each user has an order stamp in the cache: the time, in microseconds, of
+the last change to their orders. Order writers call
+``touch_orders_on_commit`` and the stamp moves once the change commits.
+The order list and summary build their ETag and Last-Modified from the
+stamp alone, so answering a revalidation with 304 runs no query.
+
+Readers take the stamp before querying. A change that commits after that
+read moves the stamp afterwards, so the ETag sent with the response never
+vouches for data newer than itself. If the key is evicted, the next read
+starts a new stamp, and clients holding the old ETag simply get a full
+response.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+
+from .catalog import etag_matches
+
+ORDER_STAMP_KEY_PREFIX = 'order_stamp'
+
+
+def _stamp_timeout():
+    return getattr(settings, 'ORDER_STAMP_TIMEOUT', 30 * 24 * 60 * 60)
+
+
+def _stamp_key(user_id):
+    return f'{ORDER_STAMP_KEY_PREFIX}:{user_id}'
+
+
+def _now():
+    return time.time_ns() // 1000
+
+
+def get_order_stamp(user_id):
+    key = _stamp_key(user_id)
+    stamp = cache.get(key)
+    if stamp is None:
+        cache.add(key, _now(), timeout=_stamp_timeout())
+        stamp = cache.get(key, _now())
+    return stamp
+
+
+async def aget_order_stamp(user_id):
+    key = _stamp_key(user_id)
+    stamp = await cache.aget(key)
+    if stamp is None:
+        await cache.aadd(key, _now(), timeout=_stamp_timeout())
+        stamp = await cache.aget(key, _now())
+    return stamp
+
+
+def touch_orders(user_ids):
+    stamp = _now()
+    cache.set_many({_stamp_key(user_id): stamp for user_id in user_ids}, timeout=_stamp_timeout())
+
+
+def touch_orders_on_commit(user_ids):
+    """
+    Move the order stamps of ``user_ids`` once the current transaction
+    commits, or right away outside a transaction.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if user_ids:
+        transaction.on_commit(lambda: touch_orders(user_ids))
+
+
+def order_validators(user_id, stamp, variant):
+    """
+    Return ``(etag, last_modified)`` for a response built from ``user_id``'s
+    orders after reading ``stamp``. ``variant`` tells apart endpoints and
+    query parameters. ``last_modified`` is None while the stamp's second is
+    still running, since a later change in the same second would get the
+    same one-second Last-Modified.
+    """
+    digest = hashlib.md5(variant.encode('utf-8')).hexdigest()[:16]
+    etag = f'"orders-{user_id}-{stamp}-{digest}"'
+    seconds = stamp // 1_000_000
+    last_modified = seconds if seconds < _now() // 1_000_000 else None
+    return etag, last_modified
+
+
+def is_not_modified(request, etag, last_modified=None):
+    # 有 If-None-Match 時忽略 If-Modified-Since（RFC 9110 13.2.2）
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return etag_matches(etag, if_none_match)
+    if last_modified is None:
+        return False
+    if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # 內容依使用者而不同，只允許瀏覽器自身快取，且每次都需重新驗證
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ('Authorization',))
+    return response
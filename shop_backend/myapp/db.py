@@ -0,0 +1,187 @@
+"""
+Database connection metrics.
+
+With ``CONN_MAX_AGE`` above zero each worker thread keeps its connection
+open between requests, and ``CONN_HEALTH_CHECKS`` pings a reused
+connection before the first query of a request. ConnectionMetricsMiddleware
+records, for requests that touch the database, whether an open connection
+was reused and how long acquiring it took: a fresh connect, or a
+health-check ping for a reused connection. Requests that run no query,
+such as 304s answered from the cache, never connect and are only counted
+as ``requests_without_queries``. Every connection opened by the process is
+counted through ``connection_created``.
+
+Nothing is acquired up front. ``install_acquire_timer`` wraps the two
+methods Django calls before the first cursor or transaction of a request,
+``close_if_health_check_failed`` and ``ensure_connection``, on each
+connection object, and reports into a per-request context variable. The
+wrappers are installed when the middleware first sees the thread's
+connection, or on ``connection_created`` for the threads asgiref runs the
+async ORM in, so the first connect of such a thread is counted as opened
+without its duration.
+"""
+
+import contextvars
+import functools
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+
+class ConnectionMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stats = {
+                'requests': 0,
+                'requests_without_queries': 0,
+                'reused': 0,
+                'opened': 0,
+                'health_check_failures': 0,
+                'acquire_seconds_total': 0.0,
+                'acquire_seconds_max': 0.0,
+            }
+
+    def record_open(self):
+        with self._lock:
+            self._stats['opened'] += 1
+
+    def record_request(self, reused, acquire_seconds, health_check_failed=False):
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['reused'] += int(reused)
+            self._stats['health_check_failures'] += int(health_check_failed)
+            self._stats['acquire_seconds_total'] += acquire_seconds
+            self._stats['acquire_seconds_max'] = max(self._stats['acquire_seconds_max'], acquire_seconds)
+
+    def record_request_without_queries(self):
+        with self._lock:
+            self._stats['requests_without_queries'] += 1
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+        requests = stats['requests']
+        stats['opened_per_request'] = stats['opened'] / requests if requests else 0.0
+        stats['reuse_ratio'] = stats['reused'] / requests if requests else 0.0
+        stats['acquire_seconds_avg'] = stats['acquire_seconds_total'] / requests if requests else 0.0
+        return stats
+
+
+connection_metrics = ConnectionMetrics()
+
+
+class _RequestConnection:
+    __slots__ = ('touched', 'had_connection', 'opened', 'health_check_failed', 'acquire_seconds')
+
+    def __init__(self):
+        self.touched = False
+        self.had_connection = False
+        self.opened = False
+        self.health_check_failed = False
+        self.acquire_seconds = 0.0
+
+
+_request_connection = contextvars.ContextVar('request_connection', default=None)
+
+
+def _timed(connection, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        state = _request_connection.get()
+        if state is None:
+            return method(*args, **kwargs)
+        had_connection = connection.connection is not None
+        if not state.touched:
+            state.touched = True
+            state.had_connection = had_connection
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            state.acquire_seconds += time.perf_counter() - start
+            if had_connection and connection.connection is None:
+                state.health_check_failed = True
+    return wrapper
+
+
+def install_acquire_timer(connection):
+    """
+    Time ``connection``'s health check and connect for the current request.
+    The wrappers live on the connection object and stay across reconnects.
+    """
+    if getattr(connection, '_acquire_timer_installed', False):
+        return
+    connection.close_if_health_check_failed = _timed(connection, connection.close_if_health_check_failed)
+    connection.ensure_connection = _timed(connection, connection.ensure_connection)
+    connection._acquire_timer_installed = True
+
+
+def record_connection_opened(connection):
+    """
+    Called through ``connection_created`` for every new connection.
+    """
+    connection_metrics.record_open()
+    install_acquire_timer(connection)
+    state = _request_connection.get()
+    if state is not None:
+        if not state.touched:
+            # 執行緒的第一個連線在計時器安裝前建立，只記錄開啟，不計入耗時
+            state.touched = True
+        state.opened = True
+
+
+def _record(state):
+    if not state.touched:
+        connection_metrics.record_request_without_queries()
+        return
+    connection_metrics.record_request(
+        reused=state.had_connection and not state.opened,
+        acquire_seconds=state.acquire_seconds,
+        health_check_failed=state.health_check_failed,
+    )
+
+
+class ConnectionMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not getattr(settings, 'DB_CONNECTION_METRICS', True):
+            return self.get_response(request)
+        # 只安裝計時器，不在 view 之前連線；沒有查詢的請求不會建立或檢查連線
+        install_acquire_timer(connections[DEFAULT_DB_ALIAS])
+        state = _RequestConnection()
+        token = _request_connection.set(state)
+        try:
+            return self.get_response(request)
+        finally:
+            _request_connection.reset(token)
+            _record(state)
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'DB_CONNECTION_METRICS', True):
+            return await self.get_response(request)
+        # 非同步 ORM 在其他執行緒使用該執行緒的連線，計時器由 connection_created 安裝
+        state = _RequestConnection()
+        token = _request_connection.set(state)
+        try:
+            return await self.get_response(request)
+        finally:
+            _request_connection.reset(token)
+            _record(state)
@@ -0,0 +1,114 @@
+"""
+Idempotency keys for unsafe requests.
+
+A client that retries a request sends the same ``Idempotency-Key`` header
+each time. The first request runs and, if it succeeds, its status and body
+are stored in an IdempotencyKey row for ``IDEMPOTENCY_KEY_TTL`` seconds.
+Retries get that response replayed, with an ``Idempotent-Replayed: true``
+header, without running the view again.
+
+The row is inserted before the view runs, in the same transaction as the
+view's writes, and the unique constraint on (user, scope, key) makes the
+database the lock: a duplicate arriving meanwhile blocks on the insert
+until the first request commits, then replays its response. When the
+first request fails, its transaction rolls the row back with everything
+else and the duplicate runs instead. Keys are bound to a fingerprint of
+the request body, so reusing a key for a different body is rejected
+instead of replaying the wrong response. ``manage.py
+purge_idempotency_keys`` deletes expired rows.
+"""
+
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+
+
+def _ttl():
+    return getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
+
+
+def expired_before():
+    return timezone.now() - timedelta(seconds=_ttl())
+
+
+def request_fingerprint(data):
+    body = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+def _error(message, status_code):
+    return Response(
+        {'message': message},
+        status=status_code,
+        content_type='application/json; charset=utf-8'
+    )
+
+
+def _replay(entry, fingerprint):
+    if entry.fingerprint != fingerprint:
+        return _error('Idempotency-Key 已用於內容不同的請求', status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return Response(
+        entry.response,
+        status=entry.status_code,
+        content_type='application/json; charset=utf-8',
+        headers={'Idempotent-Replayed': 'true'}
+    )
+
+
+def idempotent_response(request, scope, handler):
+    """
+    Return ``handler()``'s response, running it at most once per
+    Idempotency-Key of ``request.user`` within ``scope``. Requests without
+    the header just run ``handler``. Only 2xx responses are stored for
+    replay.
+    """
+    key = request.META.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        return handler()
+    if not key or len(key) > MAX_KEY_LENGTH or not key.isprintable():
+        return _error('Idempotency-Key 格式錯誤', status.HTTP_400_BAD_REQUEST)
+
+    lookup = {
+        'user_id': request.user.id,
+        'scope': scope,
+        'key': hashlib.sha256(key.encode('utf-8')).hexdigest(),
+    }
+    fingerprint = request_fingerprint(request.data)
+
+    # 第二輪只在舊的鍵過期被刪除後發生
+    for _ in range(2):
+        with transaction.atomic():
+            try:
+                # 同鍵的請求尚未提交時，這裡的 INSERT 會等到它提交或回滾
+                with transaction.atomic():
+                    entry = IdempotencyKey.objects.create(fingerprint=fingerprint, **lookup)
+            except IntegrityError:
+                entry = None
+            if entry is not None:
+                response = handler()
+                if status.is_success(response.status_code):
+                    entry.status_code = response.status_code
+                    entry.response = response.data
+                    entry.save(update_fields=['status_code', 'response'])
+                else:
+                    # 失敗的回應不保留，鍵隨交易回滾，下一次重試會重新執行
+                    transaction.set_rollback(True)
+                return response
+
+        entry = IdempotencyKey.objects.filter(**lookup).first()
+        if entry is not None and entry.created_at >= expired_before():
+            return _replay(entry, fingerprint)
+        if entry is not None:
+            IdempotencyKey.objects.filter(id=entry.id).delete()
+    return _error('相同的請求正在處理中，請稍後再試', status.HTTP_409_CONFLICT)
@@ -0,0 +1,249 @@
+"""
+Per-request performance instrumentation.
+
+RequestTimingMiddleware measures each request and reports it in three
+places:
+- a ``Server-Timing`` response header;
+- one JSON log line on the ``myapp.performance`` logger;
+- per-route histograms served by ``api/metrics/`` in the Prometheus text
+  exposition format.
+
+It records total time, database query count and time, read-through cache
+hits and misses (reported by the catalog and JWT user caches via
+``record_cache_lookup``) and JSON rendering time (reported via
+``serialization_timer``).
+
+The per-request stats live in a context variable. Every database
+connection gets a permanent execute wrapper (``install_query_timer``) that
+reports into it. asgiref copies the context into ``sync_to_async`` threads,
+so queries made by async views through the async ORM are counted too.
+"""
+
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger('myapp.performance')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class RequestStats:
+    __slots__ = ('db_queries', 'db_seconds', 'cache_hits', 'cache_misses', 'serialize_seconds')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.serialize_seconds = 0.0
+
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+def record_cache_lookup(hit):
+    stats = _current.get()
+    if stats is not None:
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+
+
+def _time_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_queries += 1
+        stats.db_seconds += time.perf_counter() - start
+
+
+def install_query_timer(connection):
+    """
+    Add the query timer to ``connection``. Called for every new connection
+    through ``connection_created``; the wrapper stays across reconnects.
+    """
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+@contextmanager
+def serialization_timer():
+    stats = _current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            stats.serialize_seconds += time.perf_counter() - start
+
+
+class MetricsRegistry:
+    """
+    In-process per-route counters and latency histograms.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def reset(self):
+        with self._lock:
+            self._routes = {}
+
+    def observe(self, method, route, status_code, seconds, stats):
+        with self._lock:
+            entry = self._routes.get((method, route))
+            if entry is None:
+                entry = self._routes[(method, route)] = {
+                    'statuses': {},
+                    'buckets': [0] * len(self.buckets),
+                    'count': 0,
+                    'sum': 0.0,
+                    'db_queries': 0,
+                    'db_seconds': 0.0,
+                    'cache_hits': 0,
+                    'cache_misses': 0,
+                    'serialize_seconds': 0.0,
+                }
+            entry['statuses'][status_code] = entry['statuses'].get(status_code, 0) + 1
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    entry['buckets'][i] += 1
+            entry['count'] += 1
+            entry['sum'] += seconds
+            entry['db_queries'] += stats.db_queries
+            entry['db_seconds'] += stats.db_seconds
+            entry['cache_hits'] += stats.cache_hits
+            entry['cache_misses'] += stats.cache_misses
+            entry['serialize_seconds'] += stats.serialize_seconds
+
+    def render(self):
+        with self._lock:
+            routes = {key: dict(entry, statuses=dict(entry['statuses']), buckets=list(entry['buckets']))
+                      for key, entry in self._routes.items()}
+
+        lines = [
+            '# HELP shop_http_requests_total Requests handled, by route and status.',
+            '# TYPE shop_http_requests_total counter',
+        ]
+        for (method, route), entry in sorted(routes.items()):
+            for status_code, count in sorted(entry['statuses'].items()):
+                lines.append(f'shop_http_requests_total{{{_labels(method, route)},status="{status_code}"}} {count}')
+
+        lines += [
+            '# HELP shop_http_request_duration_seconds Request latency, by route.',
+            '# TYPE shop_http_request_duration_seconds histogram',
+        ]
+        for (method, route), entry in sorted(routes.items()):
+            labels = _labels(method, route)
+            for bound, count in zip(self.buckets, entry['buckets']):
+                lines.append(f'shop_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'shop_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {entry["count"]}')
+            lines.append(f'shop_http_request_duration_seconds_sum{{{labels}}} {entry["sum"]}')
+            lines.append(f'shop_http_request_duration_seconds_count{{{labels}}} {entry["count"]}')
+
+        for name, key, kind, help_text in (
+            ('shop_db_queries_total', 'db_queries', 'counter', 'Database queries executed, by route.'),
+            ('shop_db_seconds_total', 'db_seconds', 'counter', 'Time spent in database queries, by route.'),
+            ('shop_cache_hits_total', 'cache_hits', 'counter', 'Read-through cache hits, by route.'),
+            ('shop_cache_misses_total', 'cache_misses', 'counter', 'Read-through cache misses, by route.'),
+            ('shop_serialize_seconds_total', 'serialize_seconds', 'counter', 'Time spent rendering JSON, by route.'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            for (method, route), entry in sorted(routes.items()):
+                lines.append(f'{name}{{{_labels(method, route)}}} {entry[key]}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(method, route):
+    route = route.replace('\\', '\\\\').replace('"', '\\"')
+    return f'method="{method}",route="{route}"'
+
+
+metrics_registry = MetricsRegistry()
+
+
+def _server_timing(total, stats):
+    return ', '.join([
+        f'total;dur={total * 1000:.1f}',
+        f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.db_queries} queries"',
+        f'cache;desc="hit={stats.cache_hits} miss={stats.cache_misses}"',
+        f'serialize;dur={stats.serialize_seconds * 1000:.1f}',
+    ])
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    # 以 URL 樣式而非實際路徑分組，避免 order_id 等參數讓路由數量無限增加
+    return f'/{match.route}' if match is not None else 'unmatched'
+
+
+class RequestTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not getattr(settings, 'REQUEST_TIMING_ENABLED', True):
+            return self.get_response(request)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._record(request, response, stats, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'REQUEST_TIMING_ENABLED', True):
+            return await self.get_response(request)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._record(request, response, stats, time.perf_counter() - start)
+
+    @staticmethod
+    def _record(request, response, stats, total):
+        route = _route(request)
+        response['Server-Timing'] = _server_timing(total, stats)
+        metrics_registry.observe(request.method, route, response.status_code, total, stats)
+        logger.info(json.dumps({
+            'method': request.method,
+            'route': route,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(total * 1000, 3),
+            'db_queries': stats.db_queries,
+            'db_ms': round(stats.db_seconds * 1000, 3),
+            'cache_hits': stats.cache_hits,
+            'cache_misses': stats.cache_misses,
+            'serialize_ms': round(stats.serialize_seconds * 1000, 3),
+        }))
+        return response
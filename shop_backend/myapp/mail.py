@@ -0,0 +1,175 @@
+"""
+Background mail delivery.
+
+Views hand messages to ``mail_queue`` and return immediately. A small pool
+of daemon worker threads drains the bounded queue in batches and sends
+each batch over one SMTP connection that stays open while there is more
+work. Messages are sent one at a time on that connection, so a failure
+retries only the message that failed, with exponential backoff, and never
+resends ones already delivered. Permanent rejections (refused recipients
+and other 5xx replies) are not retried.
+"""
+
+import logging
+import queue
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+logger = logging.getLogger(__name__)
+
+
+class MailQueue:
+    def __init__(self, maxsize=None, workers=None, batch_size=None, max_retries=None, retry_delay=None):
+        self._maxsize = maxsize
+        self._workers = workers
+        self._batch_size = batch_size
+        self._max_retries = max_retries
+        self._retry_delay = retry_delay
+        self._queue = None
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'rejected': 0,
+            'sent': 0,
+            'failed': 0,
+            'batches': 0,
+            'send_seconds_total': 0.0,
+            'send_seconds_max': 0.0,
+        }
+
+    def _setting(self, value, name, default):
+        return value if value is not None else getattr(settings, name, default)
+
+    def _ensure_started(self):
+        # 延後到第一次寄信才啟動執行緒，避免在 pre-fork 的主行程中建立
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            self._queue = queue.Queue(maxsize=self._setting(self._maxsize, 'MAIL_QUEUE_SIZE', 1000))
+            for i in range(self._setting(self._workers, 'MAIL_QUEUE_WORKERS', 2)):
+                thread = threading.Thread(target=self._run, name=f'mail-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, message):
+        """
+        Queue ``message`` for delivery. Returns False when the queue is full.
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self._record(rejected=1)
+            return False
+        self._record(enqueued=1)
+        return True
+
+    def join(self):
+        """
+        Block until every queued message has been sent or given up on.
+        """
+        if self._queue is not None:
+            self._queue.join()
+
+    def metrics(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize() if self._queue is not None else 0
+        stats['send_seconds_avg'] = (
+            stats['send_seconds_total'] / stats['batches'] if stats['batches'] else 0.0
+        )
+        return stats
+
+    def _record(self, **values):
+        with self._stats_lock:
+            for key, value in values.items():
+                if key == 'send_seconds_max':
+                    self._stats[key] = max(self._stats[key], value)
+                else:
+                    self._stats[key] += value
+
+    def _run(self):
+        batch_size = self._setting(self._batch_size, 'MAIL_BATCH_SIZE', 50)
+        connection = None
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                connection = self._send(batch, connection)
+                # 佇列清空後才關閉連線，連續寄信時重複使用同一個 SMTP 連線
+                if connection is not None and self._queue.empty():
+                    connection.close()
+                    connection = None
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _send(self, batch, connection):
+        start = time.perf_counter()
+        for message in batch:
+            connection = self._send_one(message, connection)
+        elapsed = time.perf_counter() - start
+        self._record(batches=1, send_seconds_total=elapsed, send_seconds_max=elapsed)
+        return connection
+
+    def _send_one(self, message, connection):
+        max_retries = self._setting(self._max_retries, 'MAIL_MAX_RETRIES', 3)
+        retry_delay = self._setting(self._retry_delay, 'MAIL_RETRY_DELAY', 1.0)
+        for attempt in range(max_retries + 1):
+            try:
+                if connection is None:
+                    connection = get_connection(fail_silently=False)
+                    connection.open()
+                connection.send_messages([message])
+            except Exception as e:
+                if _is_permanent(e):
+                    # 收件人被拒絕後 SMTP 連線仍可使用，繼續寄送同批的其他信件
+                    logger.error(f"Mail rejected for {', '.join(message.recipients())}: {str(e)}")
+                    break
+                logger.error(f"Mail send error (attempt {attempt + 1}): {str(e)}")
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+                    connection = None
+                if attempt < max_retries:
+                    time.sleep(retry_delay * 2 ** attempt)
+                continue
+            self._record(sent=1)
+            return connection
+        self._record(failed=1)
+        return connection
+
+
+def _is_permanent(error):
+    # 5xx 回應重試也不會成功
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+mail_queue = MailQueue()
+
+
+def send_verification_code(email, code, purpose):
+    subject = '註冊驗證碼' if purpose == 'registration' else '重設密碼驗證碼'
+    message = EmailMessage(
+        subject=subject,
+        body=f'您的驗證碼為 {code}，5 分鐘內有效。',
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[email],
+    )
+    return mail_queue.enqueue(message)
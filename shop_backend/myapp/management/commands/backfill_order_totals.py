@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+
+from myapp.conditional import touch_orders_on_commit
+from myapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Recompute Order.total_amount and Order.item_count from order items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Orders updated per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        line_total = ExpressionWrapper(
+            F('items__product_price') * F('items__quantity'),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        )
+
+        last_id = 0
+        updated = 0
+        while True:
+            rows = list(
+                Order.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .annotate(computed_total=Sum(line_total), computed_count=Sum('items__quantity'))
+                .values_list('id', 'computed_total', 'computed_count', 'user_id')[:batch_size]
+            )
+            if not rows:
+                break
+
+            orders = [
+                Order(id=order_id, total_amount=total or Decimal('0'), item_count=count or 0)
+                for order_id, total, count, _ in rows
+            ]
+            with transaction.atomic():
+                Order.objects.bulk_update(orders, ['total_amount', 'item_count'])
+                touch_orders_on_commit(row[3] for row in rows)
+
+            last_id = rows[-1][0]
+            updated += len(rows)
+            self.stdout.write(f'Backfilled {updated} orders (last id {last_id})')
+
+        self.stdout.write(self.style.SUCCESS(f'Done, {updated} orders backfilled'))
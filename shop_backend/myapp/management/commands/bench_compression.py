@@ -0,0 +1,97 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from myapp.compression import available_encodings
+from myapp.models import Order, OrderItem
+
+User = get_user_model()
+
+BENCH_EMAIL = 'bench-compression@example.com'
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed one user with a long order history, download every page of api/orders/ uncompressed '
+        'and with each available encoding, then revalidate the pages with If-None-Match. '
+        'Reports bytes on the wire, compression time and the queries a 304 costs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--items', type=int, default=3, help='Items per order')
+        parser.add_argument('--limit', type=int, default=200, help='Orders per page')
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(email=BENCH_EMAIL)
+        Order.objects.filter(user=user).delete()
+        now = timezone.now()
+        orders = Order.objects.bulk_create([
+            Order(user=user, total_amount=Decimal('59.70'), item_count=options['items'])
+            for _ in range(options['orders'])
+        ])
+        for i, order in enumerate(orders):
+            order.created_at = now - timedelta(minutes=i)
+        Order.objects.bulk_update(orders, ['created_at'], batch_size=1000)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_name=f'測試商品 {order.id % 500}-{n}', product_price=Decimal('19.90'),
+                      quantity=1)
+            for order in orders for n in range(options['items'])
+        ], batch_size=1000)
+
+        client = APIClient()
+        client.force_authenticate(user=user)
+        try:
+            # 測試用戶端的主機名稱為 testserver
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                self._report(client, options['limit'])
+        finally:
+            Order.objects.filter(user=user).delete()
+            user.delete()
+
+    @staticmethod
+    def _pages(client, limit):
+        cursor, pages = None, []
+        while True:
+            params = {'limit': limit, **({'cursor': cursor} if cursor else {})}
+            response = client.get('/api/orders/', params)
+            pages.append((params, response))
+            cursor = response.json()['next_cursor']
+            if not cursor:
+                return pages
+
+    def _report(self, client, limit):
+        plain = self._pages(client, limit)
+        identity = sum(len(response.content) for _, response in plain)
+        self.stdout.write(f'{len(plain)} pages of up to {limit} orders, identity {identity:,} bytes')
+
+        # 壓縮後的內容無法直接解析游標，沿用未壓縮那一輪的查詢參數
+        for encoding in ('identity', *available_encodings()):
+            started = time.perf_counter()
+            responses = [client.get('/api/orders/', params, HTTP_ACCEPT_ENCODING=encoding) for params, _ in plain]
+            elapsed = (time.perf_counter() - started) * 1000
+            size = sum(len(response.content) for response in responses)
+            self.stdout.write(
+                f'{encoding:<8} {size:>12,} bytes  saved {1 - size / identity:6.1%}  '
+                f'{elapsed / len(responses):7.2f}ms per page (including the view)'
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            revalidated = [
+                client.get('/api/orders/', params, HTTP_IF_NONE_MATCH=response['ETag'])
+                for params, response in plain
+            ]
+        not_modified = sum(response.status_code == 304 for response in revalidated)
+        size = sum(len(response.content) for response in revalidated)
+        self.stdout.write(
+            f'304      {size:>12,} bytes  {not_modified}/{len(revalidated)} pages not modified, '
+            f'{len(queries)} queries'
+        )
@@ -0,0 +1,329 @@
+import itertools
+import json
+import logging
+import random
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from myapp.authentication import add_user_claims
+from myapp.blacklist import ShopRefreshToken, security_cache
+from myapp.models import Order, OrderItem, Product
+
+User = get_user_model()
+
+BENCH_DOMAIN = 'bench.local'
+BENCH_PASSWORD = 'bench-password-123'
+BENCH_PRODUCT_PREFIX = 'bench '
+
+
+class Dataset:
+    """
+    Seeded rows plus the helpers scenarios use to build authenticated requests.
+    """
+
+    def __init__(self, users, products):
+        self.users = users
+        self.product_ids = products
+        self._access_tokens = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def next_index(self):
+        with self._lock:
+            return next(self._counter)
+
+    def user(self, i):
+        return self.users[i % len(self.users)]
+
+    def access_token(self, user):
+        with self._lock:
+            token = self._access_tokens.get(user.pk)
+        if token is None:
+            token = str(add_user_claims(ShopRefreshToken.for_user(user).access_token, user))
+            with self._lock:
+                self._access_tokens[user.pk] = token
+        return token
+
+    def auth(self, i):
+        return {'HTTP_AUTHORIZATION': f'Bearer {self.access_token(self.user(i))}'}
+
+
+def _get(path, auth=False):
+    def build(data, i):
+        return 'get', path, None, data.auth(i) if auth else {}
+    return build
+
+
+def _create_order(data, i):
+    body = {'products': [
+        {'product_id': data.product_ids[(i + n) % len(data.product_ids)], 'quantity': 1 + n} for n in range(3)
+    ]}
+    return 'post', '/api/orders/', body, data.auth(i)
+
+
+def _cancel_order(data, i):
+    # 每次取消一筆新建立的訂單，建立時間不計入量測
+    order = Order.objects.create(user=data.user(i), total_amount=Decimal('0'), item_count=0)
+    return 'delete', f'/api/orders/{order.id}/cancel/', None, data.auth(i)
+
+
+def _bulk_cancel_orders(data, i):
+    order_ids = [
+        Order.objects.create(user=data.user(i), total_amount=Decimal('0'), item_count=0).id for _ in range(5)
+    ]
+    return 'post', '/api/orders/cancel/', {'order_ids': order_ids}, data.auth(i)
+
+
+def _update_name(data, i):
+    return 'put', '/api/user/update_name/', {'name': f'bench {i}'}, data.auth(i)
+
+
+def _register(data, i):
+    email = f'bench-register-{data.next_index()}-{time.time_ns()}@{BENCH_DOMAIN}'
+    security_cache().set(f'registration_{email}', '123456', timeout=300)
+    body = {'email': email, 'password': BENCH_PASSWORD, 'verification_code': '123456'}
+    return 'post', '/api/register/', body, {}
+
+
+def _login(data, i):
+    return 'post', '/api/login/', {'email': data.user(i).email, 'password': BENCH_PASSWORD}, {}
+
+
+def _refresh(data, i):
+    return 'post', '/api/token/refresh/', {'refresh': str(ShopRefreshToken.for_user(data.user(i)))}, {}
+
+
+def _verify(data, i):
+    return 'post', '/api/token/verify/', {'token': data.access_token(data.user(i))}, {}
+
+
+def _send_code(data, i):
+    body = {'email': f'bench-code-{i}@{BENCH_DOMAIN}', 'purpose': 'registration'}
+    return 'post', '/api/send_verification_code/', body, {}
+
+
+def _reset_password(data, i):
+    email = data.user(i).email
+    security_cache().set(f'password_reset_{email}', '654321', timeout=300)
+    body = {'email': email, 'code': '654321', 'password': BENCH_PASSWORD}
+    return 'post', '/api/reset_password/', body, {}
+
+
+# (標籤, URL 名稱, 產生請求的函式)；urls.py 新增路由時需在此補上對應情境
+SCENARIOS = [
+    ('GET api/products/', 'products', _get('/api/products/')),
+    ('GET api/products/search/', 'product_search', _get('/api/products/search/?q=bench')),
+    ('GET api/orders/', 'orders', _get('/api/orders/', auth=True)),
+    ('POST api/orders/', 'orders', _create_order),
+    ('DELETE api/orders/<id>/cancel/', 'orders_cancel', _cancel_order),
+    ('POST api/orders/cancel/', 'orders_bulk_cancel', _bulk_cancel_orders),
+    ('GET api/orders/summary/', 'orders_summary', _get('/api/orders/summary/', auth=True)),
+    ('GET api/user/info', 'user_info', _get('/api/user/info', auth=True)),
+    ('PUT api/user/update_name/', 'update_username', _update_name),
+    ('POST api/register/', 'register', _register),
+    ('POST api/login/', 'login', _login),
+    ('POST api/token/refresh/', 'token_refresh', _refresh),
+    ('POST api/token/verify/', 'token_verify', _verify),
+    ('POST api/send_verification_code/', 'send_verification_code', _send_code),
+    ('POST api/reset_password/', 'reset_password', _reset_password),
+    ('GET api/health/cache/', 'cache_health', _get('/api/health/cache/')),
+    ('GET api/health/mail/', 'mail_health', _get('/api/health/mail/')),
+    ('GET api/health/db/', 'db_health', _get('/api/health/db/')),
+    ('GET api/metrics/', 'metrics', _get('/api/metrics/')),
+    ('GET api/async/products/', 'async_products', _get('/api/async/products/')),
+    ('GET api/async/orders/', 'async_orders', _get('/api/async/orders/', auth=True)),
+    ('GET api/async/user/info', 'async_user_info', _get('/api/async/user/info', auth=True)),
+]
+
+
+def _percentile(cuts, p):
+    return round(cuts[p - 1], 3)
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, timeout=5
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a dataset with bulk inserts, drive every route in shop_backend/urls.py through the '
+        'Django test client and report p50/p95/p99 latency, requests/sec and queries per request as '
+        'JSON. Runs offline; use DB_ENGINE=sqlite for a local database. Seeded rows are removed afterwards '
+        'unless --keep is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=20, help='Orders per user')
+        parser.add_argument('--items', type=int, default=3, help='Line items per order')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per route')
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument('--routes', nargs='+', help='Only run scenarios for these URL names')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the dataset')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded rows')
+
+    def handle(self, *args, **options):
+        if min(options['users'], options['products'], options['requests'], options['concurrency']) < 1:
+            raise CommandError('--users, --products, --requests and --concurrency must be positive')
+
+        route_names = {pattern.name for pattern in get_resolver().url_patterns if getattr(pattern, 'name', None)}
+        missing = route_names - {name for _, name, _ in SCENARIOS}
+        if missing:
+            raise CommandError(f'No benchmark scenario for routes: {", ".join(sorted(missing))}')
+        scenarios = SCENARIOS
+        if options['routes']:
+            unknown = set(options['routes']) - route_names
+            if unknown:
+                raise CommandError(f'Unknown routes: {", ".join(sorted(unknown))}')
+            scenarios = [scenario for scenario in SCENARIOS if scenario[1] in options['routes']]
+
+        started = time.perf_counter()
+        data = self._seed(options)
+        seed_seconds = time.perf_counter() - started
+        self.stderr.write(f'Seeded {len(data.users)} users, {len(data.product_ids)} products in {seed_seconds:.1f}s')
+
+        try:
+            # 寄信改用記憶體後端，避免離線環境連線 SMTP 或大量輸出到主控台；每個請求的效能記錄也暫時關閉
+            # 測試用戶端的 REMOTE_ADDR 是 127.0.0.1，允許它讀取監控端點
+            performance_logger = logging.getLogger('myapp.performance')
+            previous_level = performance_logger.level
+            performance_logger.setLevel(logging.WARNING)
+            with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                                   METRICS_ALLOWED_IPS=['127.0.0.1']):
+                results = []
+                for label, name, build in scenarios:
+                    result = self._run(data, build, options['requests'], options['concurrency'])
+                    result.update(route=label, name=name)
+                    results.append(result)
+                    self.stderr.write(
+                        f"{label:<34} {result['requests_per_second']:8.1f} req/s p50={result['p50_ms']:7.2f}ms "
+                        f"p99={result['p99_ms']:7.2f}ms queries={result['queries_per_request']:5.1f} "
+                        f"errors={result['errors']}"
+                    )
+        finally:
+            performance_logger.setLevel(previous_level)
+            if not options['keep']:
+                self._cleanup()
+
+        report = {
+            'revision': _git_revision(),
+            'timestamp': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'dataset': {key: options[key] for key in ('users', 'products', 'orders', 'items', 'seed')},
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'seed_seconds': round(seed_seconds, 3),
+            'results': results,
+        }
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def _seed(self, options):
+        rng = random.Random(options['seed'])
+        self._cleanup()
+        password = make_password(BENCH_PASSWORD)
+        users = User.objects.bulk_create(
+            [User(email=f'bench-{i}@{BENCH_DOMAIN}', password=password, first_name=f'bench {i}')
+             for i in range(options['users'])],
+            batch_size=1000
+        )
+        if users[0].pk is None:
+            users = list(User.objects.filter(email__endswith=f'@{BENCH_DOMAIN}').order_by('id'))
+
+        products = Product.objects.bulk_create(
+            [Product(name=f'{BENCH_PRODUCT_PREFIX}{i}', price=Decimal(rng.randint(100, 99999)) / 100)
+             for i in range(options['products'])],
+            batch_size=1000
+        )
+        if products[0].pk is None:
+            products = list(Product.objects.filter(name__startswith=BENCH_PRODUCT_PREFIX).order_by('id'))
+
+        items_per_order = options['items']
+        orders, lines = [], []
+        for user in users:
+            for _ in range(options['orders']):
+                picked = rng.sample(products, min(items_per_order, len(products)))
+                quantities = [rng.randint(1, 3) for _ in picked]
+                orders.append(Order(
+                    user=user,
+                    total_amount=sum(p.price * q for p, q in zip(picked, quantities)),
+                    item_count=sum(quantities),
+                ))
+                lines.append(list(zip(picked, quantities)))
+        orders = Order.objects.bulk_create(orders, batch_size=1000)
+        if orders and orders[0].pk is None:
+            orders = list(Order.objects.filter(user__in=users).order_by('id'))
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(order=order, product_name=product.name, product_price=product.price, quantity=quantity)
+                for order, order_lines in zip(orders, lines) for product, quantity in order_lines
+            ],
+            batch_size=1000
+        )
+        return Dataset(users, [product.pk for product in products])
+
+    @staticmethod
+    def _cleanup():
+        User.objects.filter(email__endswith=f'@{BENCH_DOMAIN}').delete()
+        Product.objects.filter(name__startswith=BENCH_PRODUCT_PREFIX).delete()
+
+    def _run(self, data, build, total, concurrency):
+        local = threading.local()
+
+        def send(i):
+            client = getattr(local, 'client', None)
+            if client is None:
+                client = local.client = APIClient(SERVER_NAME='localhost')
+            method, path, body, headers = build(data, i)
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = getattr(client, method)(path, body, format='json', **headers)
+                latency = (time.perf_counter() - start) * 1000
+            return latency, len(queries), response.status_code < 400
+
+        started = time.perf_counter()
+        if concurrency == 1:
+            samples = [send(i) for i in range(total)]
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                samples = list(pool.map(send, range(total)))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, _, _ in samples)
+        cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+        return {
+            'requests': total,
+            'errors': sum(1 for _, _, ok in samples if not ok),
+            'requests_per_second': round(total / elapsed, 1) if elapsed else 0.0,
+            'mean_ms': round(statistics.fmean(latencies), 3),
+            'p50_ms': _percentile(cuts, 50),
+            'p95_ms': _percentile(cuts, 95),
+            'p99_ms': _percentile(cuts, 99),
+            'queries_per_request': round(statistics.fmean(queries for _, queries, _ in samples), 2),
+        }
+
@@ -0,0 +1,133 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+from django.db.models import Sum
+from rest_framework.test import APIRequestFactory
+
+from myapp.catalog import price_index
+from myapp.models import Order, OrderItem, Product, StockShard
+from myapp.serializers import CreateOrderSerializer
+from myapp.stock import InsufficientStock, available_stock, set_stock
+
+User = get_user_model()
+
+BENCH_EMAIL = 'bench-inventory@example.com'
+BENCH_PRODUCT = 'bench inventory product'
+
+
+def create_order_locking(user, product, quantity):
+    """
+    The naive path: lock every stock row of the product with
+    SELECT ... FOR UPDATE, check the total and decrement in Python.
+    """
+    with transaction.atomic():
+        shards = list(StockShard.objects.select_for_update().filter(product=product).order_by('shard'))
+        if sum(shard.quantity for shard in shards) < quantity:
+            raise InsufficientStock([product.id])
+        needed = quantity
+        for shard in shards:
+            units = min(needed, shard.quantity)
+            if units:
+                shard.quantity -= units
+                shard.save(update_fields=['quantity'])
+                needed -= units
+        order = Order.objects.create(user=user, total_amount=product.price * quantity, item_count=quantity)
+        OrderItem.objects.create(order=order, product_name=product.name, product_price=product.price, quantity=quantity)
+
+
+class Command(BaseCommand):
+    help = (
+        'Have many threads order the same product until it sells out, once with SELECT ... FOR UPDATE, '
+        'once with conditional decrements on one stock row and once on sharded stock rows. '
+        'Reports throughput and checks that nothing was oversold.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--stock', type=int, default=2000, help='Units on sale in each run')
+        parser.add_argument('--quantity', type=int, default=1, help='Units per order')
+        parser.add_argument('--shards', type=int, default=None,
+                            help='Shards in the sharded run, defaults to STOCK_FLASH_SALE_SHARDS')
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(email=BENCH_EMAIL)
+        product = Product.objects.create(name=BENCH_PRODUCT, price=Decimal('9.90'))
+        request = APIRequestFactory().post('/api/orders/')
+        request.user = user
+        shards = options['shards'] or settings.STOCK_FLASH_SALE_SHARDS
+        quantity = options['quantity']
+        payload = {'products': [{'product_id': product.id, 'quantity': quantity}]}
+
+        def locking():
+            create_order_locking(user, product, quantity)
+
+        def conditional():
+            serializer = CreateOrderSerializer(data=payload, context={'request': request})
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+
+        runs = (('for_update', locking, 1), ('conditional', conditional, 1), ('sharded', conditional, shards))
+        try:
+            for label, place_order, shard_count in runs:
+                Order.objects.filter(user=user).delete()
+                set_stock(product, options['stock'], shards=shard_count)
+                price_index.clear()
+                placed, rejected, errors, elapsed = self._run(place_order, options['threads'])
+
+                sold = OrderItem.objects.filter(order__user=user).aggregate(units=Sum('quantity'))['units'] or 0
+                remaining = available_stock([product.id]).get(product.id, 0)
+                oversold = max(0, sold - options['stock'])
+                consistent = sold + remaining == options['stock']
+                style = self.style.SUCCESS if not oversold and consistent else self.style.ERROR
+                self.stdout.write(style(
+                    f'{label:<12} shards={shard_count:<3} threads={options["threads"]:<3} '
+                    f'orders={placed:<6} rejected={rejected:<5} db_errors={errors:<5} '
+                    f'{placed / elapsed:8.0f} orders/s  sold={sold} remaining={remaining} '
+                    f'oversold={oversold} consistent={consistent}'
+                ))
+        finally:
+            Order.objects.filter(user=user).delete()
+            product.delete()
+            user.delete()
+
+    @staticmethod
+    def _run(place_order, threads):
+        counts = {'placed': 0, 'rejected': 0, 'errors': 0}
+        lock = threading.Lock()
+        start = threading.Barrier(threads + 1)
+
+        def worker():
+            placed = rejected = errors = 0
+            try:
+                start.wait()
+                # 每個執行緒持續下單，直到看到庫存不足
+                while True:
+                    try:
+                        place_order()
+                        placed += 1
+                    except InsufficientStock:
+                        rejected += 1
+                        break
+                    except OperationalError:
+                        # SQLite 在寫入鎖競爭時會回報 database is locked，重試即可
+                        errors += 1
+            finally:
+                connection.close()
+                with lock:
+                    counts['placed'] += placed
+                    counts['rejected'] += rejected
+                    counts['errors'] += errors
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        start.wait()
+        began = time.perf_counter()
+        for thread in workers:
+            thread.join()
+        return counts['placed'], counts['rejected'], counts['errors'], time.perf_counter() - began
@@ -0,0 +1,67 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from myapp.renderers import FastJSONRenderer, orjson
+
+
+def build_order_list(count, items_per_order):
+    """
+    Build a payload shaped like the GET api/orders/ response, with the raw
+    Decimal and datetime values the renderer has to encode.
+    """
+    now = timezone.now()
+    data = []
+    for order_id in range(1, count + 1):
+        items = [
+            {
+                'id': order_id * items_per_order + i,
+                'product_name': f'商品 {i}',
+                'product_price': Decimal('19.99') + i,
+                'quantity': 1 + i % 3,
+            }
+            for i in range(items_per_order)
+        ]
+        data.append({
+            'id': order_id,
+            'user': 1,
+            'created_at': now - timedelta(minutes=order_id),
+            'total_amount': sum(item['product_price'] * item['quantity'] for item in items),
+            'item_count': sum(item['quantity'] for item in items),
+            'items': items,
+        })
+    return {'message': '訂單列表取得成功', 'data': data, 'next_cursor': None}
+
+
+class Command(BaseCommand):
+    help = 'Compare DRF JSONRenderer and FastJSONRenderer on order lists of 1k and 10k orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+        parser.add_argument('--items', type=int, default=3, help='Line items per order')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed, FastJSONRenderer uses the stdlib'))
+
+        for size in options['sizes']:
+            payload = build_order_list(size, options['items'])
+            baseline = JSONRenderer().render(payload)
+            if FastJSONRenderer().render(payload) != baseline:
+                raise CommandError(f'FastJSONRenderer output differs from JSONRenderer at {size} orders')
+
+            timings = {}
+            for label, renderer in (('JSONRenderer', JSONRenderer()), ('FastJSONRenderer', FastJSONRenderer())):
+                best = float('inf')
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    renderer.render(payload)
+                    best = min(best, time.perf_counter() - start)
+                timings[label] = best
+                self.stdout.write(f'{label:<17} orders={size:<6} {best * 1000:9.2f}ms  {len(baseline)} bytes')
+            self.stdout.write(f'speedup x{timings["JSONRenderer"] / timings["FastJSONRenderer"]:.1f}')
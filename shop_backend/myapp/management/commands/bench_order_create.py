@@ -0,0 +1,82 @@
+import statistics
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+
+from myapp.models import Order, OrderItem
+from myapp.serializers import CreateOrderSerializer
+
+User = get_user_model()
+
+BENCH_EMAIL = 'bench-order-create@example.com'
+
+
+def create_order_per_row(user, products_data):
+    """
+    The previous write path: one INSERT per row and no transaction.
+    """
+    order = Order.objects.create(user=user)
+    for product_data in products_data:
+        OrderItem.objects.create(
+            order=order,
+            product_name=product_data['product_name'],
+            product_price=product_data['product_price'],
+            quantity=product_data['quantity']
+        )
+    return order
+
+
+class Command(BaseCommand):
+    help = 'Compare order creation latency of the per-row path against the atomic bulk path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100],
+                            help='Cart sizes (number of line items) to measure')
+        parser.add_argument('--iterations', type=int, default=50,
+                            help='Orders created per cart size and path')
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(email=BENCH_EMAIL)
+        request = APIRequestFactory().post('/api/orders/')
+        request.user = user
+        serializer = CreateOrderSerializer(context={'request': request})
+
+        try:
+            for size in options['sizes']:
+                validated = [
+                    {
+                        'product_id': i + 1, 'product_name': f'商品 {i}', 'product_price': Decimal('19.99'),
+                        'stock_shards': 0, 'quantity': 1 + i % 3
+                    }
+                    for i in range(size)
+                ]
+
+                def per_row():
+                    create_order_per_row(user, validated)
+
+                def bulk():
+                    serializer.create({'products': validated})
+
+                for label, func in (('per_row', per_row), ('atomic_bulk', bulk)):
+                    samples = self._measure(func, options['iterations'])
+                    self.stdout.write(
+                        f'{label:<12} items={size:<4} '
+                        f'mean={statistics.mean(samples):8.3f}ms '
+                        f'p50={statistics.median(samples):8.3f}ms '
+                        f'max={max(samples):8.3f}ms'
+                    )
+        finally:
+            Order.objects.filter(user=user).delete()
+            user.delete()
+
+    @staticmethod
+    def _measure(func, iterations):
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
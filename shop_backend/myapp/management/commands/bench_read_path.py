@@ -0,0 +1,82 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+
+from myapp.models import Order, OrderItem, Product
+from myapp.projections import ORDER_COLUMNS, PRODUCT_COLUMNS, serialize_orders, serialize_products
+from myapp.serializers import OrderSerializer, ProductSerializer
+
+User = get_user_model()
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare CPU time of the ModelSerializer read path and the values_list fast path '
+        'for the product and order lists. Seed rows are rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--items', type=int, default=3, help='Line items per order')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options['rows'], options['items'], options['repeat'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, count, items_per_order, repeat):
+        user = User.objects.create(email='bench-read-path@example.com')
+        Product.objects.bulk_create(
+            [Product(name=f'商品 {i}', price=Decimal('19.99')) for i in range(count)], batch_size=1000
+        )
+        orders = Order.objects.bulk_create(
+            [Order(user=user, total_amount=Decimal('59.97'), item_count=items_per_order) for _ in range(count)],
+            batch_size=1000
+        )
+        if orders[0].pk is None:
+            orders = list(Order.objects.filter(user=user))
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(order=order, product_name=f'商品 {i}', product_price=Decimal('19.99'), quantity=1)
+                for order in orders for i in range(items_per_order)
+            ],
+            batch_size=1000
+        )
+
+        products = Product.objects.order_by('id')
+        order_qs = Order.objects.filter(user=user).order_by('-created_at', '-id')
+        cases = (
+            ('products / ProductSerializer',
+             lambda: ProductSerializer(products, many=True).data),
+            ('products / values_list',
+             lambda: serialize_products(products.values_list(*PRODUCT_COLUMNS))),
+            ('orders   / OrderSerializer',
+             lambda: OrderSerializer(
+                 order_qs.prefetch_related(Prefetch('items', queryset=OrderItem.objects.order_by('id'))),
+                 many=True
+             ).data),
+            ('orders   / values_list',
+             lambda: serialize_orders(list(order_qs.values_list(*ORDER_COLUMNS)))),
+        )
+        for label, func in cases:
+            best_cpu = best_wall = float('inf')
+            for _ in range(repeat):
+                cpu, wall = time.process_time(), time.perf_counter()
+                func()
+                best_cpu = min(best_cpu, time.process_time() - cpu)
+                best_wall = min(best_wall, time.perf_counter() - wall)
+            self.stdout.write(
+                f'{label:<30} rows={count:<6} cpu={best_cpu * 1000:9.1f}ms wall={best_wall * 1000:9.1f}ms'
+            )
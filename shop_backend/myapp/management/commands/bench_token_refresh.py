@@ -0,0 +1,56 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+BENCH_EMAIL = 'bench-token-refresh@example.com'
+BENCH_PASSWORD = 'bench-password-123'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure /api/token/refresh/ throughput with the cache-backed blacklist, and '
+        '/api/token/verify/ throughput with and without the Bloom-filter fast path'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=500)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        user, _ = User.objects.get_or_create(email=BENCH_EMAIL)
+        user.set_password(BENCH_PASSWORD)
+        user.save()
+        client = APIClient(SERVER_NAME='localhost')
+
+        try:
+            refresh = self._login(client)
+            start = time.perf_counter()
+            for _ in range(iterations):
+                response = client.post('/api/token/refresh/', {'refresh': refresh}, format='json')
+                refresh = response.json()['refresh']
+            self._report('refresh (rotate + blacklist)', iterations, time.perf_counter() - start)
+
+            token = self._login(client)
+            for label, bloom in (('verify (bloom)', True), ('verify (cache only)', False)):
+                with override_settings(JWT_BLACKLIST_BLOOM=bloom):
+                    start = time.perf_counter()
+                    for _ in range(iterations):
+                        client.post('/api/token/verify/', {'token': token}, format='json')
+                    self._report(label, iterations, time.perf_counter() - start)
+        finally:
+            user.delete()
+
+    @staticmethod
+    def _login(client):
+        response = client.post('/api/login/', {'email': BENCH_EMAIL, 'password': BENCH_PASSWORD}, format='json')
+        return response.json()['refresh_token']
+
+    def _report(self, label, iterations, elapsed):
+        self.stdout.write(
+            f'{label:<30} {iterations / elapsed:9.1f} req/s  {elapsed / iterations * 1000:7.3f}ms/req'
+        )
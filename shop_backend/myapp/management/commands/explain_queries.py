@@ -0,0 +1,124 @@
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+
+from myapp.models import Order, Product
+from myapp.projections import ORDER_COLUMNS, PRODUCT_COLUMNS, order_items_query
+
+User = get_user_model()
+
+SAMPLE_CURSOR = (datetime(2026, 1, 1, tzinfo=dt_timezone.utc), 1000)
+
+# 依主鍵順序讀取並在 LIMIT 筆後停止，SQLite 會顯示為 SCAN，但不會讀完整張表
+BOUNDED_SCANS = {'GET api/products/'}
+
+
+def hot_queries(using):
+    """
+    The querysets the API endpoints run, with representative parameters.
+    Keep in sync with views.py and async_views.py.
+    """
+    products = Product.objects.using(using).order_by('id')
+    product_limit = settings.PRODUCT_PAGE_SIZE + 1
+    orders = Order.objects.using(using).filter(user_id=1).order_by('-created_at', '-id')
+    order_limit = settings.ORDER_PAGE_SIZE + 1
+    created_at, order_id = SAMPLE_CURSOR
+
+    return [
+        ('POST api/login/', User.objects.using(using).filter(email='user@example.com')),
+        ('JWT user lookup', User.objects.using(using).filter(pk=1)),
+        ('GET api/products/', products.values_list(*PRODUCT_COLUMNS)[:product_limit]),
+        ('GET api/products/?cursor', products.filter(id__gt=1000).values_list(*PRODUCT_COLUMNS)[:product_limit]),
+        ('GET api/products/?min_price&max_price',
+         products.filter(price__gte=10, price__lte=20).values_list(*PRODUCT_COLUMNS)[:product_limit]),
+        ('GET api/products/?name', products.filter(name__startswith='商品').values_list(*PRODUCT_COLUMNS)[:product_limit]),
+        ('POST api/orders/ (price index)', Product.objects.using(using).filter(id__in=[1, 2, 3]).values_list(*PRODUCT_COLUMNS)),
+        ('GET api/orders/', orders.values_list(*ORDER_COLUMNS)[:order_limit]),
+        ('GET api/orders/?cursor', orders.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id)
+        ).values_list(*ORDER_COLUMNS)[:order_limit]),
+        ('GET api/orders/?status', orders.filter(status=Order.Status.CANCELLED).values_list(*ORDER_COLUMNS)[:order_limit]),
+        ('GET api/orders/ (items)', order_items_query([1, 2, 3]).using(using)),
+        ('GET api/orders/summary/',
+         Order.objects.using(using).filter(user_id=1, status=Order.Status.PLACED).values_list('total_amount')),
+        ('DELETE api/orders/<id>/cancel/',
+         Order.objects.using(using).filter(id=1, user_id=1, status=Order.Status.PLACED)),
+        ('POST api/orders/cancel/',
+         Order.objects.using(using).filter(id__in=[1, 2, 3], user_id=1, status=Order.Status.PLACED)),
+    ]
+
+
+def _sqlite_scans(plan):
+    # SEARCH 表示使用索引查找，SCAN 且未使用索引才是整表掃描
+    return re.findall(r'\bSCAN (?:TABLE )?(\w+)(?! USING)', plan)
+
+
+def _postgresql_scans(plan):
+    return re.findall(r'Seq Scan on (\w+)', plan)
+
+
+def _mysql_scans(plan):
+    scans = []
+    for line in plan.splitlines():
+        columns = line.split()
+        # EXPLAIN 的 type 欄位為 ALL 代表整表掃描，MariaDB 沒有 partitions 欄位
+        if len(columns) > 4 and 'ALL' in columns[3:5]:
+            scans.append(columns[2])
+    return scans
+
+
+def _oracle_scans(plan):
+    return re.findall(r'TABLE ACCESS FULL\s*\|\s*(\w+)', plan)
+
+
+SCAN_DETECTORS = {
+    'sqlite': _sqlite_scans,
+    'postgresql': _postgresql_scans,
+    'mysql': _mysql_scans,
+    'oracle': _oracle_scans,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN on the queries behind each API endpoint against the configured database '
+        'and flag full table scans. On nearly empty tables the planner may prefer a scan even '
+        'when a usable index exists, so audit against realistic data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--verbose-plan', action='store_true', help='Print the full plan for every query')
+        parser.add_argument('--fail-on-scan', action='store_true', help='Exit with an error if any scan is found')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        vendor = connections[using].vendor
+        detect = SCAN_DETECTORS.get(vendor)
+        if detect is None:
+            self.stdout.write(self.style.WARNING(f'No scan detector for {vendor}, plans are printed as-is'))
+
+        flagged = []
+        queries = hot_queries(using)
+        for label, queryset in queries:
+            plan = queryset.explain()
+            scans = detect(plan) if detect else []
+            if scans and label in BOUNDED_SCANS:
+                self.stdout.write(self.style.WARNING(f'LIMIT {label}: ordered scan on {", ".join(sorted(set(scans)))}'))
+            elif scans:
+                flagged.append(label)
+                self.stdout.write(self.style.ERROR(f'SCAN  {label}: full scan on {", ".join(sorted(set(scans)))}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'OK    {label}'))
+            if scans or options['verbose_plan'] or detect is None:
+                for line in plan.splitlines():
+                    self.stdout.write(f'        {line}')
+
+        self.stdout.write(f'{len(flagged)} of {len(queries)} queries use a full table scan ({vendor})')
+        if flagged and options['fail_on_scan']:
+            raise CommandError(f'Full table scans in: {", ".join(flagged)}')
@@ -0,0 +1,148 @@
+import csv
+import io
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+
+from myapp.catalog import bump_catalog_version, price_index
+from myapp.models import Product
+from myapp.search import mark_search_index_stale
+
+FIELDS = ('sku', 'name', 'price')
+
+_CENT = Decimal('0.01')
+
+
+def _read_csv(stream):
+    reader = csv.DictReader(stream)
+    missing = set(FIELDS) - set(reader.fieldnames or ())
+    if missing:
+        raise CommandError(f'CSV header is missing columns: {", ".join(sorted(missing))}')
+    for line_number, row in enumerate(reader, start=2):
+        yield line_number, row
+
+
+def _read_jsonl(stream):
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, e
+            continue
+        yield line_number, row if isinstance(row, dict) else ValueError('not a JSON object')
+
+
+def _parse(row):
+    if isinstance(row, Exception):
+        raise ValueError(str(row))
+    sku = str(row.get('sku') or '').strip()
+    name = str(row.get('name') or '').strip()
+    if not sku or not name:
+        raise ValueError('sku and name are required')
+    if len(sku) > 64 or len(name) > 255:
+        raise ValueError('sku or name is too long')
+    try:
+        price = Decimal(str(row.get('price'))).quantize(_CENT)
+    except (InvalidOperation, ValueError):
+        raise ValueError(f'invalid price {row.get("price")!r}')
+    if price < 0 or price >= Decimal('1e8'):
+        raise ValueError(f'price out of range {price}')
+    return sku, name, price
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream a CSV or JSONL file of products (sku, name, price) and upsert them by SKU in batches. '
+        'Rows are read one at a time, so memory stays bounded by --batch-size. The product catalog '
+        'cache is invalidated once at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file, or '-' for stdin")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows upserted per transaction')
+        parser.add_argument('--strict', action='store_true', help='Abort on the first invalid row')
+        parser.add_argument('--progress-every', type=int, default=100000, help='Report throughput every N rows')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+
+        if path == '-':
+            stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='')
+            self._import(stream, file_format, options)
+            return
+        try:
+            stream = open(path, encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(f'Cannot open {path}: {e}')
+        with stream:
+            self._import(stream, file_format, options)
+
+    def _import(self, stream, file_format, options):
+        rows = _read_csv(stream) if file_format == 'csv' else _read_jsonl(stream)
+        batch_size = options['batch_size']
+        progress_every = options['progress_every']
+
+        # 同一批內重複的 SKU 以最後一筆為準，避免 ON CONFLICT 在同一句內更新同一列兩次
+        batch = {}
+        read = upserted = invalid = 0
+        started = time.perf_counter()
+        try:
+            for line_number, row in rows:
+                read += 1
+                try:
+                    sku, name, price = _parse(row)
+                except ValueError as e:
+                    if options['strict']:
+                        raise CommandError(f'Line {line_number}: {e}')
+                    invalid += 1
+                    self.stderr.write(f'Skipping line {line_number}: {e}')
+                    continue
+
+                batch[sku] = Product(sku=sku, name=name, price=price)
+                if len(batch) >= batch_size:
+                    upserted += self._upsert(batch.values())
+                    batch.clear()
+                if progress_every and read % progress_every == 0:
+                    self._report(read, upserted, invalid, started)
+            if batch:
+                upserted += self._upsert(batch.values())
+        finally:
+            # 無論中途是否失敗，已寫入的批次都需讓快取失效，且整個匯入只做一次
+            if upserted:
+                bump_catalog_version()
+                price_index.clear()
+                mark_search_index_stale()
+
+        self._report(read, upserted, invalid, started)
+        self.stdout.write(self.style.SUCCESS(f'Done, {upserted} products upserted, {invalid} invalid rows skipped'))
+
+    @staticmethod
+    def _upsert(products):
+        products = list(products)
+        options = {'update_conflicts': True, 'update_fields': ['name', 'price']}
+        # MySQL 的 ON DUPLICATE KEY UPDATE 不能指定衝突欄位，其他資料庫需指定 sku
+        if connection.features.supports_update_conflicts_with_target:
+            options['unique_fields'] = ['sku']
+        with transaction.atomic():
+            Product.objects.bulk_create(products, **options)
+        # DEBUG 模式下 connection.queries 會保留每批的完整 SQL，清掉以免記憶體隨匯入量成長
+        reset_queries()
+        return len(products)
+
+    def _report(self, read, upserted, invalid, started):
+        elapsed = time.perf_counter() - started
+        rate = read / elapsed if elapsed else 0.0
+        self.stdout.write(
+            f'{read} rows read, {upserted} upserted, {invalid} invalid in {elapsed:.1f}s ({rate:,.0f} rows/s)'
+        )
@@ -0,0 +1,87 @@
+import json
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+# 同一組讀取端點在 WSGI（同步 APIView）與 ASGI（非同步 view）下的路徑
+ENDPOINTS = {
+    'products': ('/api/products/', '/api/async/products/'),
+    'orders': ('/api/orders/', '/api/async/orders/'),
+    'user_info': ('/api/user/info', '/api/async/user/info'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare concurrent-request throughput of the read endpoints served by the WSGI '
+        'deployment against their async versions served over ASGI. Start both servers first, e.g. '
+        '"gunicorn shop_backend.wsgi -w 4 -b 127.0.0.1:8000" and '
+        '"uvicorn shop_backend.asgi:application --workers 4 --port 8001".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--asgi-url', default='http://127.0.0.1:8001')
+        parser.add_argument('--endpoints', nargs='+', choices=sorted(ENDPOINTS), default=sorted(ENDPOINTS))
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=1000,
+                            help='Requests sent per endpoint and deployment')
+        parser.add_argument('--token', default='',
+                            help='Access token for the authenticated endpoints')
+        parser.add_argument('--timeout', type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('--concurrency and --requests must be positive')
+        headers = {'Accept': 'application/json'}
+        if options['token']:
+            headers['Authorization'] = f"Bearer {options['token']}"
+
+        results = []
+        for name in options['endpoints']:
+            wsgi_path, asgi_path = ENDPOINTS[name]
+            for deployment, url in (('wsgi', options['wsgi_url'] + wsgi_path),
+                                    ('asgi', options['asgi_url'] + asgi_path)):
+                result = self._run(url, headers, options['requests'], options['concurrency'], options['timeout'])
+                result.update(endpoint=name, deployment=deployment)
+                results.append(result)
+                self.stdout.write(
+                    f"{name:<10} {deployment:<5} {result['requests_per_second']:9.1f} req/s "
+                    f"p50={result['p50_ms']:8.2f}ms p95={result['p95_ms']:8.2f}ms errors={result['errors']}"
+                )
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def _run(self, url, headers, total, concurrency, timeout):
+        def fetch(_):
+            request = urllib.request.Request(url, headers=headers)
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=timeout) as response:
+                    response.read()
+                    ok = response.status < 400
+            except urllib.error.HTTPError as e:
+                ok = e.code < 400
+            except OSError:
+                ok = False
+            return (time.perf_counter() - start) * 1000, ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(fetch, range(total)))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for latency, _ in samples)
+        cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            'requests': total,
+            'concurrency': concurrency,
+            'errors': sum(1 for _, ok in samples if not ok),
+            'requests_per_second': total / elapsed if elapsed else 0.0,
+            'p50_ms': cuts[49],
+            'p95_ms': cuts[94],
+        }
@@ -0,0 +1,106 @@
+import os
+import pstats
+from collections import Counter
+from io import StringIO
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.profiling import profile_dir, route_slug
+
+
+def _stored_profiles(directory, route=None):
+    if not os.path.isdir(directory):
+        return []
+    routes = [route_slug(route)] if route else sorted(os.listdir(directory))
+    profiles = []
+    for name in routes:
+        route_dir = os.path.join(directory, name)
+        if not os.path.isdir(route_dir):
+            continue
+        for filename in sorted(os.listdir(route_dir)):
+            if filename.endswith(('.prof', '.collapsed')):
+                stamp, method, duration = filename.rsplit('.', 1)[0].split('_', 2)
+                profiles.append({
+                    'id': f'{name}/{filename}',
+                    'route': name,
+                    'timestamp': stamp,
+                    'method': method,
+                    'duration_ms': int(duration.removesuffix('ms')),
+                    'path': os.path.join(route_dir, filename),
+                })
+    return profiles
+
+
+class Command(BaseCommand):
+    help = (
+        'List profiles saved by ProfilingMiddleware, or summarize one (--show) or all profiles of a '
+        'route (--route with --summary): top functions for pstats files, hottest frames for '
+        'collapsed stacks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help='Profile directory (defaults to PROFILING_DIR)')
+        parser.add_argument('--route', help="URL pattern or its slug, e.g. 'api/orders/' or api_orders")
+        parser.add_argument('--show', help='Profile id as returned in X-Profile-Id')
+        parser.add_argument('--summary', action='store_true', help='Summarize every listed profile together')
+        parser.add_argument('--sort', choices=['cumulative', 'tottime', 'ncalls'], default='cumulative')
+        parser.add_argument('--limit', type=int, default=25)
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or profile_dir()
+
+        if options['show']:
+            path = os.path.join(directory, options['show'])
+            if not os.path.isfile(path):
+                raise CommandError(f'Profile not found: {options["show"]}')
+            self._summarize([path], options)
+            return
+
+        profiles = _stored_profiles(directory, options['route'])
+        if not profiles:
+            self.stdout.write(f'No profiles in {directory}')
+            return
+
+        if options['summary']:
+            kinds = {os.path.splitext(profile['path'])[1] for profile in profiles}
+            if len(kinds) > 1:
+                raise CommandError('Cannot summarize pstats and collapsed profiles together, pass --route')
+            self._summarize([profile['path'] for profile in profiles], options)
+            return
+
+        self.stdout.write(f'{"timestamp":<22} {"method":<7} {"ms":>7}  id')
+        for profile in profiles:
+            self.stdout.write(
+                f'{profile["timestamp"]:<22} {profile["method"]:<7} {profile["duration_ms"]:>7}  {profile["id"]}'
+            )
+        by_route = Counter(profile['route'] for profile in profiles)
+        self.stdout.write(f'{len(profiles)} profiles: ' + ', '.join(f'{r} ({n})' for r, n in sorted(by_route.items())))
+
+    def _summarize(self, paths, options):
+        if paths[0].endswith('.prof'):
+            out = StringIO()
+            stats = pstats.Stats(*paths, stream=out)
+            stats.strip_dirs().sort_stats(options['sort']).print_stats(options['limit'])
+            self.stdout.write(out.getvalue())
+            return
+
+        # collapsed stack：統計每個 frame 出現在多少樣本中（含子呼叫）與作為最內層的次數
+        inclusive, leaf, total = Counter(), Counter(), 0
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    frames = stack.split(';')
+                    count = int(count)
+                    total += count
+                    leaf[frames[-1]] += count
+                    for frame in set(frames):
+                        inclusive[frame] += count
+        if not total:
+            self.stdout.write('No samples')
+            return
+        self.stdout.write(f'{total} samples')
+        for title, counter in (('inclusive', inclusive), ('self', leaf)):
+            self.stdout.write(f'{title:>9}  frame')
+            for frame, count in counter.most_common(options['limit']):
+                self.stdout.write(f'{count / total:9.1%}  {frame}')
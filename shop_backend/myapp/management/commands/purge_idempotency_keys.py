@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from myapp.idempotency import expired_before
+from myapp.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete stored Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL. Run it periodically, e.g. from cron.'
+
+    def handle(self, *args, **options):
+        # created_at 有索引，只刪除過期的列
+        deleted, _ = IdempotencyKey.objects.filter(created_at__lt=expired_before()).delete()
+        self.stdout.write(self.style.SUCCESS(f'Done, {deleted} expired idempotency keys deleted'))
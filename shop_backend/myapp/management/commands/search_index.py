@@ -0,0 +1,66 @@
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.search import search_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the product search index from the database, optionally write a snapshot that workers '
+        'load at startup (SEARCH_INDEX_SNAPSHOT), and measure query latency.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--snapshot', nargs='?', const='', default=None,
+                            help='Write a snapshot to this path (defaults to SEARCH_INDEX_SNAPSHOT)')
+        parser.add_argument('--bench', type=int, default=0, metavar='N',
+                            help='Run N searches and N autocompletes built from indexed names')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = search_index.build()
+        self.stdout.write(f'Indexed {count} products in {time.perf_counter() - start:.2f}s')
+
+        if options['snapshot'] is not None:
+            path = options['snapshot'] or getattr(settings, 'SEARCH_INDEX_SNAPSHOT', '')
+            if not path:
+                raise CommandError('No snapshot path given and SEARCH_INDEX_SNAPSHOT is not set')
+            start = time.perf_counter()
+            search_index.save_snapshot(path)
+            saved = time.perf_counter() - start
+            start = time.perf_counter()
+            search_index.load_snapshot(path)
+            self.stdout.write(
+                f'Snapshot written to {path} in {saved:.2f}s, loads in {time.perf_counter() - start:.2f}s'
+            )
+
+        if options['bench'] and count:
+            self._bench(options['bench'], random.Random(options['seed']))
+
+    def _bench(self, n, rng):
+        # 以已索引的商品名稱取片段作為查詢，模擬使用者輸入
+        names = [doc[0] for doc in rng.sample(list(search_index._docs.values()), min(n, len(search_index)))]
+        queries = []
+        for _ in range(n):
+            name = rng.choice(names)
+            length = rng.randint(1, min(4, len(name)))
+            offset = rng.randint(0, len(name) - length)
+            queries.append(name[offset:offset + length])
+
+        for label, func in (('search', search_index.search), ('autocomplete', search_index.autocomplete)):
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                func(query)
+                latencies.append((time.perf_counter() - start) * 1000)
+            latencies.sort()
+            cuts = statistics.quantiles(latencies, n=100, method='inclusive') if n > 1 else latencies * 99
+            self.stdout.write(
+                f'{label:<12} n={n} p50={cuts[49]:.3f}ms p95={cuts[94]:.3f}ms p99={cuts[98]:.3f}ms '
+                f'max={latencies[-1]:.3f}ms'
+            )
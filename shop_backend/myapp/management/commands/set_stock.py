@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.models import Product
+from myapp.stock import available_stock, set_stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Set a product's stock. --shards splits it across several rows so concurrent orders for "
+        'the same product update different rows; --untrack stops checking its stock.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_id', type=int)
+        parser.add_argument('quantity', type=int, nargs='?')
+        shards = parser.add_mutually_exclusive_group()
+        shards.add_argument('--shards', type=int, default=1, help='Number of stock rows, defaults to 1')
+        shards.add_argument('--flash-sale', action='store_true',
+                            help='Use STOCK_FLASH_SALE_SHARDS rows')
+        shards.add_argument('--untrack', action='store_true', help='Remove the stock rows')
+
+    def handle(self, *args, **options):
+        try:
+            product = Product.objects.get(id=options['product_id'])
+        except Product.DoesNotExist:
+            raise CommandError(f"Product {options['product_id']} does not exist")
+
+        if options['untrack']:
+            set_stock(product, 0, shards=0)
+            self.stdout.write(self.style.SUCCESS(f'Stock of product {product.id} is no longer tracked'))
+            return
+
+        quantity = options['quantity']
+        shards = settings.STOCK_FLASH_SALE_SHARDS if options['flash_sale'] else options['shards']
+        if quantity is None or quantity < 0 or not 1 <= shards <= 1000:
+            raise CommandError('quantity must not be negative and --shards must be between 1 and 1000')
+        set_stock(product, quantity, shards=shards)
+        self.stdout.write(self.style.SUCCESS(
+            f'Product {product.id} has {available_stock([product.id]).get(product.id, 0)} units '
+            f'in {shards} shard(s)'
+        ))
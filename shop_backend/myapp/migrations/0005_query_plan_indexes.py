@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-17 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_order_totals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'created_at', 'id', 'total_amount', 'item_count'], name='order_user_created_cover_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name'], name='product_name_pattern_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_user_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_name_idx',
+        ),
+    ]
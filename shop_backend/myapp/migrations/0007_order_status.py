@@ -0,0 +1,35 @@
+# Generated by Django 6.0.2 on 2026-10-17 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0006_product_sku'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='cancelled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('placed', '已成立'), ('cancelled', '已取消')], default='placed', max_length=16),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'created_at', 'id', 'total_amount', 'item_count', 'status'], name='order_user_history_cover_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'status', 'created_at', 'id', 'total_amount', 'item_count'], name='order_user_status_cover_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_user_created_cover_idx',
+        ),
+    ]
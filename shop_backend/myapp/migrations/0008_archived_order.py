@@ -0,0 +1,32 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_order_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField()),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(choices=[('placed', '已成立'), ('cancelled', '已取消')], default='placed', max_length=16)),
+                ('cancelled_at', models.DateTimeField(blank=True, null=True)),
+                ('items', models.JSONField(default=list)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'created_at', 'id'], name='archived_order_user_idx'), models.Index(fields=['user', 'status', 'total_amount'], name='archived_order_summary_idx')],
+            },
+        ),
+    ]
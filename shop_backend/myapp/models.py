@@ -2,9 +2,10 @@
 Definition of models.
 """
 
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 
 class CustomUserManager(BaseUserManager):
@@ -46,24 +47,158 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 
 class Product(models.Model):
     id = models.AutoField(primary_key=True)
+    # 匯入商品時用來比對既有商品，舊資料可為空值
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # 庫存分片數，0 表示不控管庫存（見 myapp/stock.py）
+    stock_shards = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # varchar_pattern_ops 讓 PostgreSQL 也能以索引處理 name LIKE 'xxx%'，其他資料庫會忽略
+            models.Index(fields=['name'], name='product_name_pattern_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+class StockShard(models.Model):
+    """
+    Part of a product's stock. A product with ``stock_shards = n`` has shards
+    ``0 .. n-1`` and its stock is their sum.
+    """
+    product = models.ForeignKey(Product, related_name='stock', on_delete=models.CASCADE)
+    shard = models.PositiveSmallIntegerField()
+    quantity = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'shard'], name='stock_shard_unique'),
+        ]
+
+    def __str__(self):
+        return f"Product {self.product_id} shard {self.shard}: {self.quantity}"
+
+class OrderQuerySet(models.QuerySet):
+    def cancel(self):
+        """
+        Cancel the placed orders in this queryset and return how many were
+        cancelled. Orders and their items are kept, and the stock their
+        items took is given back.
+        """
+        from .stock import release_stock
+
+        with transaction.atomic():
+            # 鎖住要取消的訂單，同一筆訂單同時被取消兩次時只會歸還一次庫存
+            order_ids = list(
+                self.filter(status=Order.Status.PLACED).select_for_update().values_list('id', flat=True)
+            )
+            if not order_ids:
+                return 0
+            cancelled = Order.objects.filter(id__in=order_ids, status=Order.Status.PLACED).update(
+                status=Order.Status.CANCELLED,
+                cancelled_at=timezone.now()
+            )
+            release_stock(order_ids)
+        return cancelled
+
 class Order(models.Model):
+    class Status(models.TextChoices):
+        PLACED = 'placed', '已成立'
+        CANCELLED = 'cancelled', '已取消'
+
     id = models.AutoField(primary_key=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='orders', on_delete=models.CASCADE, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # 建立訂單時一併寫入，避免每次都從 OrderItem 重新加總
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    # 取消訂單只更新狀態，保留訂單與明細作為歷史紀錄
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PLACED)
+    cancelled_at = models.DateTimeField(null=True, blank=True)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # 涵蓋訂單列表、cursor 分頁與統計所需的欄位，查詢只需讀索引
+            models.Index(
+                fields=['user', 'created_at', 'id', 'total_amount', 'item_count', 'status'],
+                name='order_user_history_cover_idx'
+            ),
+            # 依狀態篩選的列表與只計入已成立訂單的統計
+            models.Index(
+                fields=['user', 'status', 'created_at', 'id', 'total_amount', 'item_count'],
+                name='order_user_status_cover_idx'
+            ),
+        ]
+
     def __str__(self):
         return f"Order {self.id} by {self.user.email if self.user else 'No User'}"
 
+class ArchivedOrder(models.Model):
+    """
+    An order moved out of Order/OrderItem by ``manage.py archive_orders``.
+    It keeps the original id, and its items are packed into ``items`` as
+    ``[id, product_name, product_price, quantity]`` lists.
+    """
+    id = models.IntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='archived_orders', on_delete=models.CASCADE, null=True, blank=True)
+    created_at = models.DateTimeField()
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=16, choices=Order.Status.choices, default=Order.Status.PLACED)
+    cancelled_at = models.DateTimeField(null=True, blank=True)
+    items = models.JSONField(default=list)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='archived_order_user_idx'),
+            # 訂單統計只需讀索引
+            models.Index(fields=['user', 'status', 'total_amount'], name='archived_order_summary_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.id}"
+
 class OrderItem(models.Model):
     id = models.AutoField(primary_key=True)
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE, null=True, blank=True)
+    # 只用於取消訂單時歸還庫存；明細保留下單當下的名稱與價格，商品刪除後仍保留原編號
+    product = models.ForeignKey(
+        Product, related_name='+', on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+        null=True, blank=True
+    )
     product_name = models.CharField(max_length=255)
     product_price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField()
 
     def __str__(self):
-        return f"{self.quantity} x {self.product_name}"
\ No newline at end of file
+        return f"{self.quantity} x {self.product_name}"
+
+class IdempotencyKey(models.Model):
+    """
+    A response stored for an ``Idempotency-Key`` (see myapp/idempotency.py).
+    The row is inserted in the same transaction as the request's own writes,
+    so it exists exactly when they committed.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.CASCADE)
+    scope = models.CharField(max_length=32)
+    # 標頭值的 SHA-256，長度固定
+    key = models.CharField(max_length=64)
+    fingerprint = models.CharField(max_length=64)
+    # 請求執行期間為空值，其他交易看不到未提交的列
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='idempotency_key_unique'),
+        ]
+
+    def __str__(self):
+        return f"Idempotency key {self.scope}:{self.key} of user {self.user_id}"
@@ -0,0 +1,19 @@
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+from .authentication import METRICS_TOKEN_AUTH
+
+
+class IsMonitoringClient(BasePermission):
+    """
+    Metrics and health endpoints: staff users, requests carrying
+    ``METRICS_TOKEN``, or clients in ``METRICS_ALLOWED_IPS``.
+    """
+    message = '沒有權限查看監控資料'
+
+    def has_permission(self, request, view):
+        if request.auth == METRICS_TOKEN_AUTH:
+            return True
+        if request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', []):
+            return True
+        return bool(request.user and request.user.is_staff)
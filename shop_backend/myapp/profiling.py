@@ -0,0 +1,207 @@
+"""
+On-demand request profiling.
+
+ProfilingMiddleware is opt-in: with ``PROFILING_ENABLED`` off it raises
+MiddlewareNotUsed and is dropped from the middleware chain entirely. When
+it is on, a request is profiled if
+
+- it carries the ``X-Profile`` header and a staff user's access token, or
+- it is picked by ``PROFILING_SAMPLE_RATE``.
+
+A profiled request runs the rest of the chain, view and rendering
+included, under cProfile (``PROFILING_MODE = 'cprofile'``, saved as
+pstats) or under a thread that samples the request thread's stack
+(``'sampler'``, saved as collapsed stacks for flame graph tools). Files
+are written to ``PROFILING_DIR/<route>/<timestamp>_<method>_<ms>ms.<ext>``
+and the file name is returned in the ``X-Profile-Id`` response header.
+
+Both modes only see the request thread, so the async views served over
+WSGI, which run on a separate event-loop thread, show up as one wait.
+Under ASGI the middleware runs on the event loop and profiles the loop
+thread, which also includes whatever other requests ran on the loop
+meanwhile.
+"""
+
+import cProfile
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.exceptions import APIException
+
+from .authentication import ShopJWTAuthentication
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+
+# Python 3.12 起同時只能有一個 cProfile 執行，其他請求照常處理、不做分析
+_cprofile_lock = threading.Lock()
+
+
+def profile_dir():
+    return getattr(settings, 'PROFILING_DIR', os.path.join(settings.BASE_DIR, '.profiles'))
+
+
+def route_slug(route):
+    return re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+
+
+class StackSampler:
+    """
+    Sample one thread's Python stack every ``interval`` seconds and count
+    the collapsed stacks (``outer;inner;leaf``).
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.mode = getattr(settings, 'PROFILING_MODE', 'cprofile')
+        if self.mode not in ('cprofile', 'sampler'):
+            raise ValueError(f'Unsupported PROFILING_MODE: {self.mode}')
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self._should_profile(request):
+            return self.get_response(request)
+
+        if self.mode == 'cprofile' and not _cprofile_lock.acquire(blocking=False):
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        if self.mode == 'cprofile':
+            try:
+                profiler = cProfile.Profile()
+                response = profiler.runcall(self.get_response, request)
+            finally:
+                _cprofile_lock.release()
+        else:
+            profiler = StackSampler(threading.get_ident(), getattr(settings, 'PROFILING_SAMPLE_INTERVAL', 0.005))
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        try:
+            response['X-Profile-Id'] = self._save(request, profiler, elapsed_ms)
+        except OSError as e:
+            logger.error(f"Profile save error: {str(e)}")
+        return response
+
+    async def __acall__(self, request):
+        if PROFILE_HEADER in request.META:
+            # 驗證 token 可能需要查詢資料庫
+            profile = await sync_to_async(self._is_staff)(request)
+        else:
+            profile = self._sampled()
+        if not profile or (self.mode == 'cprofile' and not _cprofile_lock.acquire(blocking=False)):
+            return await self.get_response(request)
+
+        start = time.perf_counter()
+        if self.mode == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                response = await self.get_response(request)
+            finally:
+                profiler.disable()
+                _cprofile_lock.release()
+        else:
+            profiler = StackSampler(threading.get_ident(), getattr(settings, 'PROFILING_SAMPLE_INTERVAL', 0.005))
+            profiler.start()
+            try:
+                response = await self.get_response(request)
+            finally:
+                profiler.stop()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        try:
+            response['X-Profile-Id'] = await sync_to_async(self._save)(request, profiler, elapsed_ms)
+        except OSError as e:
+            logger.error(f"Profile save error: {str(e)}")
+        return response
+
+    def _should_profile(self, request):
+        if PROFILE_HEADER in request.META:
+            return self._is_staff(request)
+        return self._sampled()
+
+    @staticmethod
+    def _sampled():
+        rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        return rate > 0 and random.random() < rate
+
+    @staticmethod
+    def _is_staff(request):
+        # DRF 的驗證在 view 內才執行，這裡先自行解析 access token
+        try:
+            result = ShopJWTAuthentication().authenticate(request)
+        except APIException:
+            return False
+        return result is not None and getattr(result[0], 'is_staff', False)
+
+    def _save(self, request, profiler, elapsed_ms):
+        match = getattr(request, 'resolver_match', None)
+        route = route_slug(match.route if match is not None else 'unmatched')
+        directory = os.path.join(profile_dir(), route)
+        os.makedirs(directory, exist_ok=True)
+
+        stamp = datetime.now(dt_timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+        extension = 'prof' if self.mode == 'cprofile' else 'collapsed'
+        name = f'{stamp}_{request.method}_{elapsed_ms:.0f}ms.{extension}'
+        if self.mode == 'cprofile':
+            profiler.dump_stats(os.path.join(directory, name))
+        else:
+            profiler.dump(os.path.join(directory, name))
+        return f'{route}/{name}'
@@ -0,0 +1,103 @@
+"""
+Serializer-free read path for list endpoints.
+
+Rows are fetched with ``values_list`` and turned into the exact dicts that
+ProductSerializer and OrderSerializer produce, without instantiating
+models or walking DRF field objects per row. Any field added to those
+serializers must be added here too; the contract tests in tests.py compare
+both paths.
+"""
+
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .models import OrderItem
+
+PRODUCT_COLUMNS = ('id', 'name', 'price')
+
+ORDER_COLUMNS = ('id', 'user_id', 'created_at', 'total_amount', 'item_count', 'status')
+
+ORDER_ITEM_COLUMNS = ('order_id', 'id', 'product_name', 'product_price', 'quantity')
+
+_CENT = Decimal('0.01')
+
+
+def format_decimal(value):
+    # 與 DRF DecimalField(decimal_places=2) 的輸出相同
+    if value is None:
+        return None
+    return '{:f}'.format(value.quantize(_CENT))
+
+
+def format_datetime(value):
+    # 與 DRF DateTimeField 的 ISO 8601 輸出相同
+    if value is None:
+        return None
+    if timezone.is_aware(value):
+        value = value.astimezone(timezone.get_current_timezone())
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def serialize_products(rows):
+    """
+    ``rows`` are tuples in PRODUCT_COLUMNS order.
+    """
+    return [
+        {'id': product_id, 'name': name, 'price': format_decimal(price)}
+        for product_id, name, price in rows
+    ]
+
+
+def order_items_query(order_ids):
+    return (
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .order_by('id')
+        .values_list(*ORDER_ITEM_COLUMNS)
+    )
+
+
+def build_orders(rows, item_rows):
+    """
+    ``rows`` are tuples in ORDER_COLUMNS order and ``item_rows`` tuples in
+    ORDER_ITEM_COLUMNS order for those orders.
+    """
+    items_by_order = {row[0]: [] for row in rows}
+    for order_id, item_id, product_name, product_price, quantity in item_rows:
+        items_by_order[order_id].append({
+            'id': item_id,
+            'product_name': product_name,
+            'product_price': format_decimal(product_price),
+            'quantity': quantity,
+        })
+
+    return [
+        {
+            'id': order_id,
+            'user': user_id,
+            'created_at': format_datetime(created_at),
+            'total_amount': format_decimal(total_amount),
+            'item_count': item_count,
+            'status': order_status,
+            'items': items_by_order[order_id],
+        }
+        for order_id, user_id, created_at, total_amount, item_count, order_status in rows
+    ]
+
+
+def serialize_orders(rows, archived_items=None):
+    """
+    Items for every order in ``rows`` are loaded with one query, except for
+    archived orders whose item rows are passed in ``archived_items``.
+    """
+    if not rows:
+        return []
+    item_rows = archived_items or []
+    archived_ids = {row[0] for row in item_rows}
+    order_ids = [row[0] for row in rows if row[0] not in archived_ids]
+    if order_ids:
+        item_rows = list(order_items_query(order_ids)) + item_rows
+    return build_orders(rows, item_rows)
@@ -0,0 +1,63 @@
+"""
+orjson-backed JSON renderer.
+
+Produces exactly the bytes DRF's JSONRenderer would (compact separators,
+non-ASCII left unescaped, U+2028/U+2029 escaped, Decimal/datetime formatted
+by DRF's JSONEncoder) but encodes with orjson when it is installed. Any case
+orjson cannot reproduce exactly is handed to the stdlib renderer. Native
+Python floats are the exception: orjson writes exponents as ``1e16`` where
+the stdlib writes ``1e+16``.
+"""
+
+import math
+from decimal import Decimal
+
+from rest_framework.utils import encoders
+from rest_framework.renderers import JSONRenderer
+
+from .instrumentation import serialization_timer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+_drf_encoder = encoders.JSONEncoder()
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        # 與標準函式庫的浮點數格式不同的範圍交回 stdlib 處理
+        value = float(obj)
+        if not math.isfinite(value) or (value and not 1e-4 <= abs(value) < 1e16):
+            raise TypeError('Decimal outside the range orjson formats like json.dumps')
+        return value
+    return _drf_encoder.default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with serialization_timer():
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type, renderer_context):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=_default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+                | orjson.OPT_PASSTHROUGH_DATACLASS
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # 與 JSONRenderer 相同，完整跳脫 U+2028 與 U+2029
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,461 @@
+"""
+In-process product search.
+
+``search_index`` is an inverted index over Product.name. Names are NFKC
+normalized and lowercased. CJK runs are split into character unigrams and
+bigrams; other scripts into alphanumeric words. A query matches products
+containing every query token. Bigrams are used for CJK queries of two
+characters or more, so "蘋果汁" must contain "蘋果" and "果汁". Matches are
+ranked with BM25, and names starting with the query get a bonus. At
+most ``SEARCH_CANDIDATE_LIMIT`` matches are scored per query, taken in
+descending weight of the query's rarest token, so latency does not grow
+with the number of matches. Rankings of broad queries are therefore
+exact only among those candidates; one-token queries walk in score order
+and almost always come out exact.
+Autocomplete returns names starting with the prefix, then names with a
+word starting with it.
+
+Each process builds its own index lazily on first use. The sources, in
+order of preference:
+- a pickled snapshot at ``SEARCH_INDEX_SNAPSHOT``, if one was written by
+  ``manage.py search_index``;
+- the database.
+
+Product save/delete signals append the product id to a numbered change log
+in the cache. Every process replays new log entries at most once per
+``SEARCH_SYNC_INTERVAL`` seconds by reloading just those products.
+Changes that bypass signals, such as the bulk import, call
+``mark_search_index_stale`` and every process rebuilds. So does a process
+that finds log entries have expired before it replayed them.
+"""
+
+import bisect
+import heapq
+import logging
+import math
+import os
+import pickle
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+SEARCH_LOG_PREFIX = 'search_log'
+SEARCH_SEQ_KEY = 'search_log_seq'
+SEARCH_GENERATION_KEY = 'search_generation'
+SNAPSHOT_VERSION = 1
+
+# 中日韓文字（部首、假名、注音、漢字、諺文、相容漢字）
+_CJK = (
+    '\u2e80-\u2fdf\u3040-\u30ff\u3100-\u312f\u3190-\u31ff\u3400-\u4dbf'
+    '\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+)
+_TOKEN_RE = re.compile(rf'[{_CJK}]+|[^\W{_CJK}]+')
+_CJK_RE = re.compile(rf'[{_CJK}]')
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+PREFIX_BONUS = 2.0
+
+
+def normalize(text):
+    return unicodedata.normalize('NFKC', text).lower().strip()
+
+
+def tokenize(text, query=False):
+    """
+    Split ``text`` into index tokens. Documents index both unigrams and
+    bigrams of CJK runs; queries use bigrams when the run is long enough.
+    """
+    tokens = []
+    for run in _TOKEN_RE.findall(normalize(text)):
+        if not _CJK_RE.match(run):
+            tokens.append(run)
+            continue
+        bigrams = [run[i:i + 2] for i in range(len(run) - 1)]
+        if query:
+            tokens.extend(bigrams or [run])
+        else:
+            tokens.extend(run)
+            tokens.extend(bigrams)
+    return tokens
+
+
+class _NormTable(dict):
+    def __init__(self, avg_length):
+        super().__init__()
+        self.avg_length = avg_length or 1.0
+
+    def __missing__(self, length):
+        norm = self[length] = BM25_K1 * (1 - BM25_B + BM25_B * length / self.avg_length)
+        return norm
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self._ready = False
+        self._seq = 0
+        self._generation = 0
+        self._synced_at = 0.0
+
+    def _reset(self):
+        self._docs = {}  # id -> (name, price, token count, normalized name)
+        self._postings = {}  # token -> {id: term frequency}
+        self._names = []  # sorted (normalized name, id)
+        self._words = []  # sorted distinct non-CJK words
+        self._avg_length = 0.0
+        self._norm_cache = None
+        # token -> posting ids by descending BM25 term weight; common tokens
+        # are sorted at build time, the rest on first query
+        self._impact = {}
+
+    # 建立與同步
+
+    def build(self):
+        """
+        Rebuild from the database. Returns the number of indexed products.
+        """
+        seq = cache.get(SEARCH_SEQ_KEY, 0)
+        generation = cache.get(SEARCH_GENERATION_KEY, 0)
+        with self._lock:
+            self._reset()
+            for product_id, name, price in Product.objects.values_list('id', 'name', 'price').iterator(2000):
+                self._add(product_id, name, price)
+                self._names.append((self._docs[product_id][3], product_id))
+            self._names.sort()
+            self._words = sorted(token for token in self._postings if not _CJK_RE.match(token))
+            self._set_avg_length()
+            # 預先排序常見詞的清單，查詢時不必在請求中排序上萬筆
+            budget = getattr(settings, 'SEARCH_CANDIDATE_LIMIT', 200)
+            for token, posting in self._postings.items():
+                if len(posting) > budget:
+                    self._impact_order(token)
+            self._seq, self._generation = seq, generation
+            self._ready = True
+            self._synced_at = time.monotonic()
+            return len(self._docs)
+
+    def _set_avg_length(self):
+        # 平均長度只在重建時計算，增量更新不改變既有文件的權重，排序快取才能沿用
+        total = sum(doc[2] for doc in self._docs.values())
+        self._avg_length = total / len(self._docs) if self._docs else 0.0
+        self._norm_cache = None
+        self._impact = {}
+
+    def save_snapshot(self, path):
+        with self._lock:
+            state = {
+                'version': SNAPSHOT_VERSION,
+                'seq': self._seq,
+                'generation': self._generation,
+                'docs': self._docs,
+                'postings': self._postings,
+                'names': self._names,
+                'words': self._words,
+                'avg_length': self._avg_length,
+                'impact': self._impact,
+            }
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def load_snapshot(self, path):
+        # 快照由 manage.py search_index 在本機產生，視為可信任的檔案
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        if state.get('version') != SNAPSHOT_VERSION:
+            raise ValueError('Unsupported search snapshot version')
+        with self._lock:
+            self._reset()
+            self._docs = state['docs']
+            self._postings = state['postings']
+            self._names = state['names']
+            self._words = state['words']
+            self._avg_length = state['avg_length']
+            self._impact = state['impact']
+            self._seq, self._generation = state['seq'], state['generation']
+            self._ready = True
+            self._synced_at = 0.0
+        return len(self._docs)
+
+    def ensure_ready(self):
+        if self._ready:
+            self._sync()
+            return
+        with self._lock:
+            if self._ready:
+                return
+            path = getattr(settings, 'SEARCH_INDEX_SNAPSHOT', '')
+            if path and os.path.exists(path):
+                try:
+                    self.load_snapshot(path)
+                except (OSError, ValueError, KeyError, pickle.UnpicklingError, EOFError) as e:
+                    logger.error(f"Search snapshot load error: {str(e)}")
+                    self.build()
+                else:
+                    self._sync()
+            else:
+                self.build()
+
+    def _sync(self):
+        interval = getattr(settings, 'SEARCH_SYNC_INTERVAL', 1.0)
+        now = time.monotonic()
+        if now - self._synced_at < interval:
+            return
+        with self._lock:
+            if now - self._synced_at < interval:
+                return
+            self._synced_at = now
+            self._apply_changes()
+
+    def _apply_changes(self):
+        if cache.get(SEARCH_GENERATION_KEY, 0) != self._generation:
+            self.build()
+            return
+        latest = cache.get(SEARCH_SEQ_KEY, 0)
+        if latest < self._seq:
+            # 快取被清空後序號重新開始，無法得知錯過哪些變更
+            self.build()
+            return
+        if latest == self._seq:
+            return
+        keys = [f'{SEARCH_LOG_PREFIX}_{n}' for n in range(self._seq + 1, latest + 1)]
+        product_ids = set()
+        for start in range(0, len(keys), 1000):
+            chunk = keys[start:start + 1000]
+            found = cache.get_many(chunk)
+            if len(found) < len(chunk):
+                self.build()
+                return
+            product_ids.update(found.values())
+        self.refresh(product_ids)
+        self._seq = latest
+
+    def refresh(self, product_ids):
+        """
+        Reload ``product_ids`` from the database, dropping deleted ones.
+        """
+        rows = {
+            product_id: (name, price)
+            for product_id, name, price in Product.objects.filter(id__in=product_ids).values_list('id', 'name', 'price')
+        }
+        with self._lock:
+            for product_id in product_ids:
+                self._remove(product_id)
+                if product_id not in rows:
+                    continue
+                name, price = rows[product_id]
+                for token in self._add(product_id, name, price):
+                    if not _CJK_RE.match(token):
+                        bisect.insort(self._words, token)
+                bisect.insort(self._names, (self._docs[product_id][3], product_id))
+            if not self._avg_length:
+                self._set_avg_length()
+
+    def _add(self, product_id, name, price):
+        """
+        Index one product and return the tokens that are new to the index.
+        """
+        counts = Counter(tokenize(name))
+        self._docs[product_id] = (name, price, sum(counts.values()), normalize(name))
+        new_tokens = []
+        for token, tf in counts.items():
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = {}
+                new_tokens.append(token)
+            posting[product_id] = tf
+            order = self._impact.get(token)
+            if order is not None:
+                bisect.insort(order, product_id, key=self._impact_key(token))
+        return new_tokens
+
+    def _remove(self, product_id):
+        doc = self._docs.get(product_id)
+        if doc is None:
+            return
+        for token in set(tokenize(doc[0])):
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            order = self._impact.get(token)
+            if order is not None:
+                order.remove(product_id)
+            del posting[product_id]
+            if not posting:
+                del self._postings[token]
+                self._impact.pop(token, None)
+                if not _CJK_RE.match(token):
+                    j = bisect.bisect_left(self._words, token)
+                    if j < len(self._words) and self._words[j] == token:
+                        del self._words[j]
+        del self._docs[product_id]
+        entry = (doc[3], product_id)
+        i = bisect.bisect_left(self._names, entry)
+        if i < len(self._names) and self._names[i] == entry:
+            del self._names[i]
+
+    # 查詢
+
+    def _norms(self):
+        # BM25 的長度正規化只與名稱長度有關，依長度快取
+        if self._norm_cache is None:
+            self._norm_cache = _NormTable(self._avg_length)
+        return self._norm_cache
+
+    def _impact_key(self, token):
+        posting, docs, norms = self._postings[token], self._docs, self._norms()
+
+        def key(product_id):
+            tf = posting[product_id]
+            return (-tf / (tf + norms[docs[product_id][2]]), product_id)
+        return key
+
+    def _impact_order(self, token):
+        order = self._impact.get(token)
+        if order is None:
+            order = self._impact[token] = sorted(self._postings[token], key=self._impact_key(token))
+        return order
+
+    def search(self, query, limit=20):
+        """
+        Return up to ``limit`` ``(id, name, price, score)`` tuples, best first.
+        """
+        self.ensure_ready()
+        tokens = list(dict.fromkeys(tokenize(query, query=True)))
+        if not tokens or limit < 1:
+            return []
+        prefix = normalize(query)
+        with self._lock:
+            postings = [self._postings.get(token) for token in tokens]
+            if not all(postings):
+                return []
+            rarest = min(range(len(tokens)), key=lambda i: len(postings[i]))
+            candidates = postings[rarest]
+            if len(postings) > 1:
+                candidates = set(candidates).intersection(*(p for i, p in enumerate(postings) if i != rarest))
+            budget = max(getattr(settings, 'SEARCH_CANDIDATE_LIMIT', 200), limit)
+            if len(candidates) > budget:
+                candidates = self._best_candidates(
+                    tokens[rarest], candidates, prefix, limit if len(tokens) == 1 else budget, budget,
+                )
+
+            total_docs = len(self._docs)
+            idf = [math.log(1 + (total_docs - len(p) + 0.5) / (len(p) + 0.5)) for p in postings]
+            best = heapq.nlargest(limit, self._score(candidates, postings, idf, prefix))
+            return [(-neg_id, *self._docs[-neg_id][:2], score) for score, neg_id in best]
+
+    def _best_candidates(self, token, candidates, prefix, per_group, budget):
+        """
+        Pick at most about ``budget`` of ``candidates`` worth scoring.
+
+        Postings of ``token``, the query's rarest, are walked in descending
+        term weight, stopping after ``budget`` matches. Names starting with
+        the query, which carry the bonus, and the rest are picked apart, up
+        to ``per_group`` each. For a one-token query the walk is in score
+        order, so the first ``limit`` of each group are the exact answer
+        when both fill up within the walk.
+        """
+        docs = self._docs
+        picked = []
+        prefixed = rest = matched = 0
+        lo = bisect.bisect_left(self._names, (prefix,))
+        hi = bisect.bisect_left(self._names, (prefix + '\U0010ffff',))
+        if hi - lo <= budget:
+            # 前綴命中不多時直接納入，不必等走訪時遇到
+            picked.extend(product_id for _, product_id in self._names[lo:hi] if product_id in candidates)
+            prefixed = per_group
+        for product_id in self._impact_order(token):
+            if product_id not in candidates:
+                continue
+            matched += 1
+            if docs[product_id][3].startswith(prefix):
+                if prefixed < per_group:
+                    prefixed += 1
+                    picked.append(product_id)
+            elif rest < per_group:
+                rest += 1
+                picked.append(product_id)
+            if matched >= budget or (prefixed >= per_group and rest >= per_group):
+                break
+        return picked
+
+    def _score(self, candidates, postings, idf, prefix):
+        docs, norms = self._docs, self._norms()
+        terms = [(weight * (BM25_K1 + 1), posting) for weight, posting in zip(idf, postings)]
+        scored = []
+        for product_id in candidates:
+            _, _, length, normalized = docs[product_id]
+            norm = norms[length]
+            score = PREFIX_BONUS if normalized.startswith(prefix) else 0.0
+            for weight, posting in terms:
+                tf = posting[product_id]
+                score += weight * tf / (tf + norm)
+            scored.append((score, -product_id))
+        return scored
+
+    def autocomplete(self, prefix, limit=10):
+        """
+        Return up to ``limit`` ``(id, name, price)`` tuples whose name, or one
+        of whose words, starts with ``prefix``.
+        """
+        self.ensure_ready()
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            i = bisect.bisect_left(self._names, (prefix,))
+            while i < len(self._names) and len(results) < limit and self._names[i][0].startswith(prefix):
+                product_id = self._names[i][1]
+                name, price = self._docs[product_id][:2]
+                results.append((product_id, name, price))
+                seen.add(product_id)
+                i += 1
+
+            if len(results) < limit and not _CJK_RE.match(prefix):
+                j = bisect.bisect_left(self._words, prefix)
+                while j < len(self._words) and len(results) < limit and self._words[j].startswith(prefix):
+                    for product_id in sorted(self._postings[self._words[j]]):
+                        if product_id not in seen:
+                            name, price = self._docs[product_id][:2]
+                            results.append((product_id, name, price))
+                            seen.add(product_id)
+                            if len(results) >= limit:
+                                break
+                    j += 1
+        return results
+
+    def __len__(self):
+        return len(self._docs)
+
+
+search_index = SearchIndex()
+
+
+def record_product_change(product_id):
+    try:
+        seq = cache.incr(SEARCH_SEQ_KEY)
+    except ValueError:
+        cache.add(SEARCH_SEQ_KEY, 0, timeout=None)
+        seq = cache.incr(SEARCH_SEQ_KEY)
+    cache.set(f'{SEARCH_LOG_PREFIX}_{seq}', product_id, timeout=getattr(settings, 'SEARCH_LOG_TIMEOUT', 60 * 60))
+
+
+def mark_search_index_stale():
+    try:
+        cache.incr(SEARCH_GENERATION_KEY)
+    except ValueError:
+        cache.set(SEARCH_GENERATION_KEY, 1, timeout=None)
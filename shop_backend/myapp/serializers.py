@@ -1,12 +1,46 @@
 from rest_framework import serializers
+from .catalog import price_index
+from .conditional import touch_orders_on_commit
 from .models import Product,Order,OrderItem
-from django.contrib.auth import authenticate
+from .pagination import InvalidCursor, decode_cursor
+from .stock import reserve_stock
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer, TokenVerifySerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import UntypedToken
+from .authentication import add_user_claims
+from .blacklist import ShopRefreshToken, is_revoked
 
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'name', 'price']
 
+class ProductQuerySerializer(serializers.Serializer):
+    cursor = serializers.CharField(required=False)
+    limit = serializers.IntegerField(required=False, min_value=1)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    name = serializers.CharField(max_length=255, required=False)
+
+    def validate_cursor(self, value):
+        try:
+            after_id = decode_cursor(value, 1)[0]
+        except InvalidCursor:
+            raise serializers.ValidationError('無效的分頁游標')
+        if not isinstance(after_id, int):
+            raise serializers.ValidationError('無效的分頁游標')
+        return after_id
+
+class ProductSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=100, trim_whitespace=True)
+    limit = serializers.IntegerField(required=False, min_value=1)
+    autocomplete = serializers.BooleanField(required=False, default=False)
+
 class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
@@ -16,30 +50,76 @@ class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     class Meta:
         model = Order
-        fields = ['id', 'user', 'created_at', 'items']
-        read_only_fields = ['id', 'user', 'created_at']
+        fields = ['id', 'user', 'created_at', 'total_amount', 'item_count', 'status', 'items']
+        read_only_fields = ['id', 'user', 'created_at', 'total_amount', 'item_count', 'status']
+class OrderSummarySerializer(serializers.Serializer):
+    order_count = serializers.IntegerField()
+    total_spent = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+class OrderQuerySerializer(serializers.Serializer):
+    cursor = serializers.CharField(required=False)
+    limit = serializers.IntegerField(required=False, min_value=1)
+    status = serializers.ChoiceField(choices=Order.Status.choices, required=False)
+    include_archived = serializers.BooleanField(required=False, default=False)
+
+    def validate_cursor(self, value):
+        try:
+            created_at, order_id = decode_cursor(value, 2)
+        except InvalidCursor:
+            raise serializers.ValidationError('無效的分頁游標')
+        created_at = parse_datetime(created_at) if isinstance(created_at, str) else None
+        if created_at is None or not isinstance(order_id, int):
+            raise serializers.ValidationError('無效的分頁游標')
+        return created_at, order_id
+
+class BulkCancelOrderSerializer(serializers.Serializer):
+    order_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_order_ids(self, value):
+        if len(value) > settings.ORDER_BULK_CANCEL_MAX:
+            raise serializers.ValidationError(f'一次最多取消 {settings.ORDER_BULK_CANCEL_MAX} 筆訂單')
+        return value
+
 class CreateOrderItemSerializer(serializers.Serializer):
-    product_name = serializers.CharField(max_length=255)
-    product_price = serializers.DecimalField(max_digits=10, decimal_places=2)
-    quantity = serializers.IntegerField()
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
 
 class CreateOrderSerializer(serializers.Serializer):
-    products = serializers.ListField(
-        child=serializers.DictField(
-            child=serializers.CharField(max_length=255)
-        )
-    )
+    products = CreateOrderItemSerializer(many=True, allow_empty=False)
+
+    def validate_products(self, value):
+        # 商品名稱與價格一律由伺服器端決定，不採用客戶端傳入的值
+        resolved = price_index.resolve(item['product_id'] for item in value)
+        missing = sorted({item['product_id'] for item in value} - resolved.keys())
+        if missing:
+            raise serializers.ValidationError(f"商品不存在: {', '.join(map(str, missing))}")
+        for item in value:
+            item['product_name'], item['product_price'], item['stock_shards'] = resolved[item['product_id']]
+        return value
+
     def create(self, validated_data):
         products_data = validated_data.pop('products')
         user = self.context['request'].user
-        order = Order.objects.create(user=user)
-        for product_data in products_data:
-            OrderItem.objects.create(
-                order=order,
-                product_name=product_data['product_name'],
-                product_price=product_data['product_price'],
-                quantity=product_data['quantity']
+        # 訂單與所有明細在同一個交易內寫入，明細以單一批次新增
+        total_amount = sum(item['product_price'] * item['quantity'] for item in products_data)
+        item_count = sum(item['quantity'] for item in products_data)
+        with transaction.atomic():
+            # 先扣庫存，庫存不足時拋出 InsufficientStock，整筆交易回滾
+            reserve_stock(
+                (item['product_id'], item['stock_shards'], item['quantity']) for item in products_data
             )
+            order = Order.objects.create(user_id=user.id, total_amount=total_amount, item_count=item_count)
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product_id=product_data['product_id'],
+                    product_name=product_data['product_name'],
+                    product_price=product_data['product_price'],
+                    quantity=product_data['quantity']
+                )
+                for product_data in products_data
+            ])
+            touch_orders_on_commit([user.id])
         return order
 class CustomAuthTokenSerializer(serializers.Serializer):
     email = serializers.EmailField()
@@ -59,4 +139,46 @@ class CustomAuthTokenSerializer(serializers.Serializer):
     def validated_data(self):
         # Override to provide better type hints
         data = super().validated_data
-        return data
\ No newline at end of file
+        return data
+
+class ShopTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Re-stamps the user claims on every refreshed access token so that
+    stateless authentication sees name and status changes after a refresh.
+    Rotated refresh tokens are revoked in the cache blacklist.
+
+    Mirrors TokenRefreshSerializer.validate, which loads the user only to
+    check it and discards it, so that the same query also provides the
+    claims.
+    """
+    token_class = ShopRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        access = refresh.access_token
+
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        if user_id:
+            user = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+            # 使用者已刪除時與停用一樣回 401，而不是 DoesNotExist
+            if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+                raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+            add_user_claims(access, user)
+        data = {'access': str(access)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+            data['refresh'] = str(refresh)
+        return data
+
+class ShopTokenVerifySerializer(TokenVerifySerializer):
+    def validate(self, attrs):
+        token = UntypedToken(attrs['token'])
+        if is_revoked(token.get(api_settings.JTI_CLAIM)):
+            raise serializers.ValidationError('Token is blacklisted')
+        return {}
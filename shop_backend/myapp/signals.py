@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_cached_user
+from .catalog import bump_catalog_version
+from .db import record_connection_opened
+from .instrumentation import install_query_timer
+from .models import CustomUser, Product
+from .search import record_product_change
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_catalog(sender, **kwargs):
+    # 交易提交後才更新版本，否則其他行程可能以未提交的舊資料重建目錄並存到新版本下
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def track_product_search_change(sender, instance, **kwargs):
+    # 交易確定寫入後才記錄，各行程的搜尋索引才不會讀到尚未提交或已回滾的資料
+    product_id = instance.pk
+    transaction.on_commit(lambda: record_product_change(product_id))
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_authenticated_user(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(connection_created)
+def count_database_connection(sender, connection, **kwargs):
+    record_connection_opened(connection)
+
+
+@receiver(connection_created)
+def time_database_queries(sender, connection, **kwargs):
+    install_query_timer(connection)
@@ -0,0 +1,128 @@
+"""
+Product inventory.
+
+A product's stock lives in StockShard rows and ``Product.stock_shards``
+says how many there are. Products with no shards are not tracked and can
+always be ordered, which is how every existing product starts. Ordinary
+products use one shard; flash-sale products split their stock across
+several (``manage.py set_stock --shards``) so concurrent checkouts
+decrement different rows instead of queueing on a single row lock.
+
+``reserve_stock`` runs inside the order transaction and never reads with
+SELECT ... FOR UPDATE. Each decrement is one conditional
+``UPDATE ... SET quantity = quantity - n WHERE quantity >= n``: checking and
+taking stock happen in the same statement, so stock cannot go negative, and
+the row lock is held only until the order commits. If anything in the
+order fails, the transaction rolls the decrements back. Order items record
+their product, and ``release_stock`` gives their units back when the order
+is cancelled.
+"""
+
+import random
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import OrderItem, StockShard
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_ids):
+        super().__init__(f"Insufficient stock for products {product_ids}")
+        self.product_ids = product_ids
+
+
+def set_stock(product, quantity, shards=1):
+    """
+    Replace ``product``'s stock with ``quantity`` units split evenly across
+    ``shards`` rows. ``shards=0`` stops tracking the product's stock.
+    """
+    with transaction.atomic():
+        StockShard.objects.filter(product=product).delete()
+        StockShard.objects.bulk_create([
+            StockShard(product=product, shard=shard, quantity=quantity // shards + (shard < quantity % shards))
+            for shard in range(shards)
+        ])
+        # 交易提交後目錄版本才會更新，各行程的價格索引重新載入時一定讀到新的分片數
+        product.stock_shards = shards
+        product.save(update_fields=['stock_shards'])
+
+
+def available_stock(product_ids):
+    """
+    Return ``{product_id: units}`` for the tracked products among
+    ``product_ids``.
+    """
+    stock = {}
+    for product_id, quantity in StockShard.objects.filter(product_id__in=product_ids).values_list('product_id', 'quantity'):
+        stock[product_id] = stock.get(product_id, 0) + quantity
+    return stock
+
+
+def _take(product_id, shard, quantity):
+    return StockShard.objects.filter(
+        product_id=product_id, shard=shard, quantity__gte=quantity
+    ).update(quantity=F('quantity') - quantity) == 1
+
+
+def _reserve(product_id, shards, quantity):
+    # 隨機挑一個分片扣減，同時下單的請求多半落在不同的列上
+    if _take(product_id, random.randrange(shards), quantity):
+        return True
+    # 該分片不足時才讀取各分片餘量，已售完的商品在這裡直接回絕
+    remaining = dict(
+        StockShard.objects.filter(product_id=product_id, quantity__gt=0).values_list('shard', 'quantity')
+    )
+    if sum(remaining.values()) < quantity:
+        return False
+    for shard, units in remaining.items():
+        if units >= quantity and _take(product_id, shard, quantity):
+            return True
+    # 沒有單一分片足夠時依分片順序拆開扣減，固定順序避免交易互相等待成死結
+    for shard in sorted(remaining):
+        units = min(quantity, remaining[shard])
+        if _take(product_id, shard, units):
+            quantity -= units
+            if not quantity:
+                return True
+    return False
+
+
+def release_stock(order_ids):
+    """
+    Give back the stock taken by the items of ``order_ids``, inside the
+    caller's transaction. Items of untracked products are skipped.
+    """
+    returned = (
+        OrderItem.objects.filter(order_id__in=order_ids, product__stock_shards__gt=0)
+        .values_list('product_id', 'product__stock_shards')
+        .annotate(units=Sum('quantity'))
+        .order_by('product_id')
+    )
+    for product_id, shards, units in returned:
+        shard_rows = StockShard.objects.filter(product_id=product_id)
+        # 歸還到隨機分片，與扣減一樣分散鎖定；分片數剛被修改時改放回第一個分片
+        if not shard_rows.filter(shard=random.randrange(shards)).update(quantity=F('quantity') + units):
+            first = shard_rows.order_by('shard').values_list('shard', flat=True).first()
+            if first is not None:
+                shard_rows.filter(shard=first).update(quantity=F('quantity') + units)
+
+
+def reserve_stock(lines):
+    """
+    Take stock for ``lines``, ``(product_id, stock_shards, quantity)``
+    tuples, inside the caller's transaction. Untracked products are
+    skipped. Raises InsufficientStock listing the products that are short;
+    the caller's transaction must then be rolled back.
+    """
+    wanted = {}
+    for product_id, shards, quantity in lines:
+        if shards:
+            wanted[product_id] = (shards, wanted.get(product_id, (shards, 0))[1] + quantity)
+    # 依商品編號順序扣減，多商品訂單彼此不會交叉鎖定
+    short = [
+        product_id for product_id in sorted(wanted)
+        if not _reserve(product_id, *wanted[product_id])
+    ]
+    if short:
+        raise InsufficientStock(short)
@@ -1,3 +1,1585 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import json
+import logging
+import os
+import runpy
+import smtplib
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connection, connections
+from django.db.models import Prefetch
+from django.db.models.signals import post_save
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .archive import archive_batch
+from .authentication import ShopJWTAuthentication, add_user_claims
+from .blacklist import (BLACKLIST_KEY_PREFIX, BLACKLIST_SEQ_KEY, BLACKLIST_SNAPSHOT_KEY, RevocationFilter,
+                        ShopRefreshToken, is_revoked, revocation_filter, revoke, security_cache)
+from .cache_backends import DatabaseCache
+from .checks import check_cache_backends
+from .catalog import (CATALOG_KEY_PREFIX, build_catalog, get_cached_catalog, get_catalog_version,
+                      price_index)
+from .compression import negotiate_encoding
+from .conditional import ORDER_STAMP_KEY_PREFIX
+from .db import ConnectionMetrics, connection_metrics, install_acquire_timer
+from .idempotency import request_fingerprint
+from .management.commands.explain_queries import hot_queries
+from .instrumentation import metrics_registry
+from .mail import MailQueue, mail_queue
+from .pagination import encode_cursor
+from .parsers import FastJSONParser
+from .projections import ORDER_COLUMNS, PRODUCT_COLUMNS, serialize_orders, serialize_products
+from .renderers import FastJSONRenderer
+from .search import SearchIndex, mark_search_index_stale, tokenize
+from .serializers import OrderSerializer, ProductSerializer
+from .stock import available_stock, set_stock
+from .models import ArchivedOrder, IdempotencyKey, Order, OrderItem, Product, StockShard
+from .views import OrderManagementView
+
+User = get_user_model()
+
+
+class OrderListQueryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def create_orders(self, count, items_per_order=3):
+        now = timezone.now()
+        for i in range(count):
+            order = Order.objects.create(user=self.user)
+            Order.objects.filter(id=order.id).update(created_at=now - timedelta(minutes=i))
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_name=f'商品{j}', product_price='9.90', quantity=1)
+                for j in range(items_per_order)
+            ])
+
+    def test_query_count_does_not_grow_with_orders(self):
+        self.create_orders(1)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/orders/')
+        self.assertEqual(len(response.json()['data']), 1)
+
+        self.create_orders(30)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/orders/')
+        self.assertEqual(len(response.json()['data']), 31)
+
+    def test_cursor_walks_all_orders_newest_first(self):
+        self.create_orders(7)
+        seen = []
+        cursor = None
+        while True:
+            params = {'limit': 3}
+            if cursor:
+                params['cursor'] = cursor
+            body = self.client.get('/api/orders/', params).json()
+            seen.extend(order['id'] for order in body['data'])
+            cursor = body['next_cursor']
+            if cursor is None:
+                break
+
+        expected = list(
+            Order.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/orders/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductListQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def create_products(self, count, name='商品', price='9.90'):
+        return Product.objects.bulk_create([Product(name=f'{name}{i}', price=price) for i in range(count)])
+
+    def walk(self, **params):
+        seen, pages = [], 0
+        cursor = None
+        while True:
+            query = dict(params, **({'cursor': cursor} if cursor else {}))
+            body = self.client.get('/api/products/', query).json()
+            seen.extend(product['id'] for product in body['data'])
+            pages += 1
+            cursor = body['next_cursor']
+            if cursor is None:
+                return seen, pages
+
+    def test_query_count_does_not_grow_with_products(self):
+        self.create_products(1)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/products/')
+        self.assertEqual(len(response.json()['data']), 1)
+
+        self.create_products(30)
+        cache.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/products/')
+        self.assertEqual(len(response.json()['data']), 31)
+
+    def test_cursor_walks_all_products_in_id_order(self):
+        self.create_products(7)
+        with self.assertNumQueries(3):
+            seen, pages = self.walk(limit=3)
+        self.assertEqual(pages, 3)
+        self.assertEqual(seen, list(Product.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_filters_apply_to_every_page(self):
+        self.create_products(4, name='蘋果', price='5.00')
+        self.create_products(4, name='蘋果', price='50.00')
+        self.create_products(4, name='梨子', price='5.00')
+
+        seen, pages = self.walk(limit=3, name='蘋果', max_price='10')
+        self.assertEqual(pages, 2)
+        self.assertEqual(seen, list(
+            Product.objects.filter(name__startswith='蘋果', price__lte=10).order_by('id').values_list('id', flat=True)
+        ))
+        seen, _ = self.walk(limit=3, min_price='6', max_price='60')
+        self.assertEqual(seen, list(Product.objects.filter(price=50).order_by('id').values_list('id', flat=True)))
+        self.assertEqual(self.client.get('/api/products/', {'name': '香蕉'}).json()['data'], [])
+
+    def test_invalid_cursor_is_rejected(self):
+        for cursor in ('not-a-cursor', encode_cursor('1'), encode_cursor(1, 2)):
+            response = self.client.get('/api/products/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['errors']['cursor'], ['無效的分頁游標'])
+
+    @override_settings(PRODUCT_PAGE_SIZE=2, PRODUCT_MAX_PAGE_SIZE=3)
+    def test_page_size_is_limited(self):
+        self.create_products(5)
+        self.assertEqual(len(self.client.get('/api/products/').json()['data']), 2)
+        body = self.client.get('/api/products/', {'limit': 100}).json()
+        self.assertEqual(len(body['data']), 3)
+        self.assertIsNotNone(body['next_cursor'])
+        for limit in (0, -1, 'ten'):
+            self.assertEqual(self.client.get('/api/products/', {'limit': limit}).status_code, 400)
+
+
+class OrderCreatePricingTests(TestCase):
+    def setUp(self):
+        price_index.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.products = [Product.objects.create(name=f'商品{i}', price=f'{i}9.90') for i in range(5)]
+
+    def test_prices_come_from_the_catalog(self):
+        response = self.client.post('/api/orders/', {
+            'products': [{'product_id': self.products[1].id, 'quantity': 2, 'product_price': '0.01'}]
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        item = response.json()['data']['items'][0]
+        self.assertEqual(item['product_name'], '商品1')
+        self.assertEqual(item['product_price'], '19.90')
+
+    def test_resolving_prices_does_not_query_per_line(self):
+        payload = {'products': [{'product_id': p.id, 'quantity': 1} for p in self.products]}
+        self.client.post('/api/orders/', payload, format='json')
+        # 交易開始/結束、新增訂單、批次新增明細，以及回應中的明細查詢
+        with self.assertNumQueries(5):
+            self.client.post('/api/orders/', payload, format='json')
+
+    def test_items_are_inserted_in_one_query(self):
+        price_index.resolve(p.id for p in self.products)
+        table = OrderItem._meta.db_table
+        for products in (self.products[:1], self.products):
+            payload = {'products': [{'product_id': p.id, 'quantity': 1} for p in products]}
+            # 明細數量不影響查詢數
+            with self.assertNumQueries(5) as queries:
+                response = self.client.post('/api/orders/', payload, format='json')
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(len(response.json()['data']['items']), len(products))
+            inserts = [query['sql'] for query in queries.captured_queries
+                       if query['sql'].startswith(f'INSERT INTO "{table}"')]
+            self.assertEqual(len(inserts), 1)
+
+    def test_non_positive_quantity_is_rejected(self):
+        for quantity in (0, -1):
+            response = self.client.post('/api/orders/', {
+                'products': [{'product_id': self.products[0].id, 'quantity': quantity}]
+            }, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('quantity', response.json()['errors']['products']['0'])
+        self.assertFalse(Order.objects.exists())
+
+    def test_failure_after_inserting_items_rolls_back_the_order(self):
+        payload = {'products': [{'product_id': p.id, 'quantity': 1} for p in self.products]}
+        # 明細已批次新增後才失敗
+        with patch('myapp.serializers.touch_orders_on_commit', side_effect=DatabaseError('connection lost')), \
+                self.assertLogs('myapp.views', level='ERROR'):
+            response = self.client.post('/api/orders/', payload, format='json')
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_price_change_invalidates_the_index(self):
+        payload = {'products': [{'product_id': self.products[0].id, 'quantity': 1}]}
+        self.client.post('/api/orders/', payload, format='json')
+        self.products[0].price = '1.00'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].save()
+        response = self.client.post('/api/orders/', payload, format='json')
+        self.assertEqual(response.json()['data']['items'][0]['product_price'], '1.00')
+
+    def test_unknown_product_is_rejected(self):
+        response = self.client.post('/api/orders/', {
+            'products': [{'product_id': 999999, 'quantity': 1}]
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class OrderCancellationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.orders = [Order.objects.create(user=self.user, total_amount='10.00', item_count=1) for _ in range(3)]
+        OrderItem.objects.create(order=self.orders[0], product_name='蘋果', product_price='10.00', quantity=1)
+
+    def test_cancel_keeps_history(self):
+        order = self.orders[0]
+        # 交易開始/結束、鎖定訂單、更新狀態，以及查詢要歸還庫存的明細；不逐筆刪除明細
+        with self.assertNumQueries(5):
+            response = self.client.delete(f'/api/orders/{order.id}/cancel/')
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.status, Order.Status.CANCELLED)
+        self.assertIsNotNone(order.cancelled_at)
+        self.assertEqual(order.items.count(), 1)
+
+        self.assertEqual(self.client.delete(f'/api/orders/{order.id}/cancel/').status_code, 409)
+        self.assertEqual(self.client.delete('/api/orders/999999/cancel/').status_code, 404)
+
+    def test_bulk_cancel_skips_foreign_and_cancelled_orders(self):
+        other = User.objects.create_user(email='other@example.com', password='password123')
+        foreign = Order.objects.create(user=other)
+        Order.objects.filter(id=self.orders[2].id).cancel()
+
+        order_ids = [order.id for order in self.orders] + [foreign.id]
+        with self.assertNumQueries(5):
+            response = self.client.post('/api/orders/cancel/', {'order_ids': order_ids}, format='json')
+        self.assertEqual(response.json()['data'], {'requested': 4, 'cancelled': 2})
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.status, Order.Status.PLACED)
+
+        self.assertEqual(self.client.post('/api/orders/cancel/', {'order_ids': []}, format='json').status_code, 400)
+        with override_settings(ORDER_BULK_CANCEL_MAX=2):
+            response = self.client.post('/api/orders/cancel/', {'order_ids': order_ids}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_filters_by_status_and_summary_excludes_cancelled(self):
+        Order.objects.filter(id=self.orders[0].id).cancel()
+
+        data = self.client.get('/api/orders/', {'status': 'cancelled'}).json()['data']
+        self.assertEqual([order['id'] for order in data], [self.orders[0].id])
+        self.assertEqual(data[0]['status'], 'cancelled')
+        self.assertEqual(len(self.client.get('/api/orders/').json()['data']), 3)
+        self.assertEqual(self.client.get('/api/orders/', {'status': 'lost'}).status_code, 400)
+
+        summary = self.client.get('/api/orders/summary/').json()['data']
+        self.assertEqual(summary, {'order_count': 2, 'total_spent': '20.00'})
+
+
+class OrderArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        now = timezone.now()
+        self.orders = []
+        for days in (500, 450, 400, 1):
+            order = Order.objects.create(user=self.user, total_amount='10.00', item_count=2)
+            Order.objects.filter(id=order.id).update(created_at=now - timedelta(days=days))
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_name=f'商品{days}-{j}', product_price='5.00', quantity=1) for j in range(2)
+            ])
+            self.orders.append(order)
+        Order.objects.filter(id=self.orders[1].id).cancel()
+
+    def archive(self, **options):
+        out = StringIO()
+        call_command('archive_orders', older_than_days=365, stdout=out, **options)
+        return out.getvalue()
+
+    def test_moves_old_orders_with_items_in_one_row(self):
+        self.assertIn('3 orders created before', self.archive(dry_run=True))
+        self.assertEqual(ArchivedOrder.objects.count(), 0)
+
+        output = self.archive(batch_size=2)
+        self.assertIn('3 orders / 6 items archived', output)
+        self.assertIn('myapp_order: 4 -> 1 rows', output)
+        self.assertIn('myapp_orderitem: 8 -> 2 rows', output)
+        self.assertEqual(list(Order.objects.values_list('id', flat=True)), [self.orders[3].id])
+
+        archived = ArchivedOrder.objects.get(id=self.orders[0].id)
+        self.assertEqual(archived.total_amount, Decimal('10.00'))
+        self.assertEqual([item[1:] for item in archived.items], [['商品500-0', '5.00', 1], ['商品500-1', '5.00', 1]])
+        self.assertEqual(ArchivedOrder.objects.get(id=self.orders[1].id).status, Order.Status.CANCELLED)
+
+    def test_batch_deletes_without_collecting(self):
+        old_ids = [order.id for order in self.orders[:3]]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(archive_batch(old_ids, timezone.now() - timedelta(days=365)), (3, 6))
+        statements = [query['sql'].split()[0].upper() for query in queries.captured_queries]
+        # 鎖定訂單與讀取明細之外，只有寫入封存表與兩個 DELETE
+        self.assertEqual([sql for sql in statements if sql in ('SELECT', 'INSERT', 'DELETE')],
+                         ['SELECT', 'SELECT', 'INSERT', 'DELETE', 'DELETE'])
+        self.assertFalse(OrderItem.objects.filter(order_id__in=old_ids).exists())
+
+    def test_list_pages_through_archived_orders_when_asked(self):
+        self.archive()
+        self.assertEqual(len(self.client.get('/api/orders/').json()['data']), 1)
+
+        # 熱資料、封存表與熱資料明細各一次；整頁都是封存訂單時不需查明細
+        with self.assertNumQueries(3):
+            self.client.get('/api/orders/', {'include_archived': 'true', 'limit': 2})
+        ids, params = [], {'include_archived': 'true', 'limit': 2}
+        while True:
+            body = self.client.get('/api/orders/', params).json()
+            ids.extend(order['id'] for order in body['data'])
+            if not body['next_cursor']:
+                break
+            params['cursor'] = body['next_cursor']
+        self.assertEqual(ids, [order.id for order in reversed(self.orders)])
+
+        data = self.client.get('/api/orders/', {'include_archived': 'true', 'status': 'cancelled'}).json()['data']
+        self.assertEqual([order['id'] for order in data], [self.orders[1].id])
+        self.assertEqual(data[0]['items'][0]['product_name'], '商品450-0')
+        self.assertEqual(data[0]['items'][0]['product_price'], '5.00')
+
+    def test_summary_counts_archived_orders(self):
+        self.archive()
+        summary = self.client.get('/api/orders/summary/').json()['data']
+        self.assertEqual(summary, {'order_count': 3, 'total_spent': '30.00'})
+
+
+class OrderIdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        price_index.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.apple = Product.objects.create(name='蘋果', price='12.50')
+        self.payload = {'products': [{'product_id': self.apple.id, 'quantity': 2}]}
+
+    def post(self, payload=None, key='retry-1'):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key is not None else {}
+        return self.client.post('/api/orders/', payload or self.payload, format='json', **headers)
+
+    def stored(self, key='retry-1'):
+        return IdempotencyKey.objects.filter(
+            user=self.user, scope='orders', key=hashlib.sha256(key.encode('utf-8')).hexdigest()
+        )
+
+    def test_retry_replays_the_first_response(self):
+        first = self.post()
+        self.assertEqual(first.status_code, 201)
+        with patch.object(OrderManagementView, '_create_order') as create_order:
+            retry = self.post()
+        create_order.assert_not_called()
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+        self.post(key=None)
+        self.post(key=None)
+        self.assertEqual(Order.objects.count(), 3)
+
+    def test_key_is_bound_to_user_and_body(self):
+        self.post()
+        self.assertEqual(self.post({'products': [{'product_id': self.apple.id, 'quantity': 3}]}).status_code, 422)
+
+        other = User.objects.create_user(email='other@example.com', password='password123')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.post().status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(self.post(key='x' * 256).status_code, 400)
+
+    def test_failures_roll_the_key_back(self):
+        invalid = {'products': [{'product_id': 999999, 'quantity': 1}]}
+        self.assertEqual(self.post(invalid).status_code, 400)
+        self.assertFalse(self.stored().exists())
+
+        with patch.object(OrderManagementView, '_create_order', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.post()
+        self.assertFalse(self.stored().exists())
+
+        set_stock(self.apple, 1)
+        self.assertEqual(self.post().status_code, 409)
+        self.assertFalse(self.stored().exists())
+        set_stock(self.apple, 2)
+        self.assertEqual(self.post().status_code, 201)
+        self.assertEqual(self.stored().get().status_code, 201)
+
+    def test_key_committed_by_a_concurrent_request_is_replayed(self):
+        # 同鍵的請求先提交時，這裡的 INSERT 違反唯一限制，改為重播它的回應
+        IdempotencyKey.objects.create(
+            user=self.user, scope='orders', key=hashlib.sha256(b'retry-1').hexdigest(),
+            fingerprint=request_fingerprint(self.payload), status_code=201, response={'message': '訂單建立成功'}
+        )
+        response = self.post()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'message': '訂單建立成功'})
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertFalse(Order.objects.exists())
+
+    def test_expired_keys_run_again_and_are_purged(self):
+        self.post()
+        self.stored().update(created_at=timezone.now() - timedelta(days=2))
+        response = self.post()
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Order.objects.count(), 2)
+
+        self.post(key='retry-2')
+        self.stored('retry-2').update(created_at=timezone.now() - timedelta(days=2))
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertTrue(self.stored().exists())
+        self.assertFalse(self.stored('retry-2').exists())
+
+
+class OrderStockTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        price_index.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.apple = Product.objects.create(name='蘋果', price='12.50')
+        self.pear = Product.objects.create(name='梨子', price='3.00')
+
+    def order(self, *lines):
+        return self.client.post('/api/orders/', {'products': [
+            {'product_id': product.id, 'quantity': quantity} for product, quantity in lines
+        ]}, format='json')
+
+    def shards(self, product):
+        return list(StockShard.objects.filter(product=product).order_by('shard').values_list('quantity', flat=True))
+
+    def test_set_stock_splits_evenly(self):
+        set_stock(self.apple, 10, shards=4)
+        self.assertEqual(self.shards(self.apple), [3, 3, 2, 2])
+        self.assertEqual(available_stock([self.apple.id, self.pear.id]), {self.apple.id: 10})
+
+        set_stock(self.apple, 0, shards=0)
+        self.assertEqual(self.shards(self.apple), [])
+        self.assertEqual(Product.objects.get(id=self.apple.id).stock_shards, 0)
+
+    def test_order_takes_stock_with_one_update_per_product(self):
+        set_stock(self.apple, 5)
+        self.order((self.apple, 1), (self.pear, 1))
+        # 交易開始/結束、扣減庫存、新增訂單、批次新增明細，以及回應中的明細查詢
+        with self.assertNumQueries(6):
+            response = self.order((self.apple, 2), (self.pear, 100))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(available_stock([self.apple.id]), {self.apple.id: 2})
+
+    def test_insufficient_stock_rolls_back_the_order(self):
+        set_stock(self.apple, 5)
+        set_stock(self.pear, 1)
+        response = self.order((self.apple, 2), (self.pear, 1), (self.pear, 1))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['data'], {'product_ids': [self.pear.id]})
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(available_stock([self.apple.id, self.pear.id]), {self.apple.id: 5, self.pear.id: 1})
+
+    def test_sharded_stock_sells_out_exactly(self):
+        set_stock(self.apple, 7, shards=3)
+        for quantity in (3, 1, 2):
+            self.assertEqual(self.order((self.apple, quantity)).status_code, 201)
+        self.assertEqual(sum(self.shards(self.apple)), 1)
+        self.assertEqual(self.order((self.apple, 2)).status_code, 409)
+        self.assertEqual(self.order((self.apple, 1)).status_code, 201)
+        self.assertEqual(self.shards(self.apple), [0, 0, 0])
+
+    def test_order_larger_than_any_shard_is_split(self):
+        set_stock(self.apple, 9, shards=3)
+        self.assertEqual(self.order((self.apple, 8)).status_code, 201)
+        self.assertEqual(sum(self.shards(self.apple)), 1)
+
+    def test_set_stock_command(self):
+        out = StringIO()
+        call_command('set_stock', self.apple.id, 32, flash_sale=True, stdout=out)
+        self.assertEqual(len(self.shards(self.apple)), settings.STOCK_FLASH_SALE_SHARDS)
+        self.assertIn('32 units', out.getvalue())
+        call_command('set_stock', self.apple.id, untrack=True, stdout=StringIO())
+        self.assertEqual(self.order((self.apple, 1000)).status_code, 201)
+        with self.assertRaises(CommandError):
+            call_command('set_stock', self.apple.id, stdout=StringIO())
+
+    def test_cancel_returns_stock(self):
+        set_stock(self.apple, 5, shards=2)
+        first = self.order((self.apple, 3), (self.pear, 1)).json()['data']['id']
+        second = self.order((self.apple, 2)).json()['data']['id']
+        self.assertEqual(self.order((self.apple, 1)).status_code, 409)
+
+        self.assertEqual(self.client.delete(f'/api/orders/{first}/cancel/').status_code, 200)
+        self.assertEqual(available_stock([self.apple.id]), {self.apple.id: 3})
+        self.assertEqual(self.client.delete(f'/api/orders/{first}/cancel/').status_code, 409)
+        self.client.post('/api/orders/cancel/', {'order_ids': [first, second]}, format='json')
+        self.assertEqual(available_stock([self.apple.id]), {self.apple.id: 5})
+
+    def test_catalog_read_during_set_stock_sees_the_committed_shards(self):
+        price_index.resolve([self.apple.id])
+        seen = []
+
+        def read_in_another_worker(sender, instance, **kwargs):
+            # 模擬其他 worker 在 set_stock 提交前讀取價格索引
+            thread = threading.Thread(target=lambda: seen.append(price_index.resolve([self.apple.id])[self.apple.id]))
+            thread.start()
+            thread.join()
+
+        post_save.connect(read_in_another_worker, sender=Product)
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                set_stock(self.apple, 1, shards=4)
+        finally:
+            post_save.disconnect(read_in_another_worker, sender=Product)
+        self.assertEqual(seen[0][2], 0)
+        self.assertEqual(price_index.resolve([self.apple.id])[self.apple.id][2], 4)
+        self.assertEqual(self.order((self.apple, 2)).status_code, 409)
+
+
+class OrderTotalsTests(TestCase):
+    def setUp(self):
+        price_index.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.apple = Product.objects.create(name='蘋果', price='12.50')
+        self.pear = Product.objects.create(name='梨子', price='3.00')
+
+    def test_totals_are_stored_on_create_and_summed_by_summary(self):
+        response = self.client.post('/api/orders/', {'products': [
+            {'product_id': self.apple.id, 'quantity': 2},
+            {'product_id': self.pear.id, 'quantity': 3},
+        ]}, format='json')
+        data = response.json()['data']
+        self.assertEqual(data['total_amount'], '34.00')
+        self.assertEqual(data['item_count'], 5)
+
+        self.client.post('/api/orders/', {'products': [{'product_id': self.pear.id, 'quantity': 1}]}, format='json')
+        # 熱資料表與封存表各加總一次
+        with self.assertNumQueries(2):
+            summary = self.client.get('/api/orders/summary/').json()['data']
+        self.assertEqual(summary, {'order_count': 2, 'total_spent': '37.00'})
+
+    def test_backfill_recomputes_totals(self):
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, product_name='蘋果', product_price='12.50', quantity=2)
+        OrderItem.objects.create(order=order, product_name='梨子', product_price='3.00', quantity=1)
+        empty = Order.objects.create(user=self.user)
+
+        call_command('backfill_order_totals', stdout=StringIO())
+
+        order.refresh_from_db()
+        empty.refresh_from_db()
+        self.assertEqual((order.total_amount, order.item_count), (Decimal('28.00'), 3))
+        self.assertEqual((empty.total_amount, empty.item_count), (Decimal('0'), 0))
+
+
+class VerificationMailTests(TestCase):
+    def test_code_is_delivered_in_the_background(self):
+        response = APIClient().post('/api/send_verification_code/', {
+            'email': 'new@example.com', 'purpose': 'registration'
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        mail_queue.join()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['new@example.com'])
+        self.assertIn(security_cache().get('registration_new@example.com'), mail.outbox[0].body)
+
+    def test_invalid_addresses_are_not_queued(self):
+        for email in ('not-an-email', 'a@b', ['a@example.com']):
+            response = APIClient().post('/api/send_verification_code/', {
+                'email': email, 'purpose': 'registration'
+            }, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['message'], '電子郵件格式錯誤')
+        self.assertEqual(mail_queue.metrics()['queue_depth'], 0)
+
+    def test_failed_messages_are_retried_alone(self):
+        attempts = []
+
+        class FlakyBackend(locmem.EmailBackend):
+            def send_messages(self, messages):
+                attempts.extend(message.to[0] for message in messages)
+                if attempts.count('b@example.com') == 1 and messages[0].to == ['b@example.com']:
+                    raise ConnectionError('SMTP unavailable')
+                return super().send_messages(messages)
+
+        flaky_queue = MailQueue(workers=1, retry_delay=0)
+        with patch('myapp.mail.get_connection', lambda **kwargs: FlakyBackend(**kwargs)):
+            for to in ('a@example.com', 'b@example.com', 'c@example.com'):
+                flaky_queue.enqueue(mail.EmailMessage('驗證碼', '123456', to=[to]))
+            flaky_queue.join()
+
+        # 已送出的信件不會因為其他信件失敗而重寄
+        self.assertEqual(sorted(attempts), ['a@example.com', 'b@example.com', 'b@example.com', 'c@example.com'])
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['a@example.com', 'b@example.com', 'c@example.com'])
+        self.assertEqual(flaky_queue.metrics()['sent'], 3)
+
+    def test_refused_recipients_are_not_retried(self):
+        attempts = []
+
+        class RefusingBackend(locmem.EmailBackend):
+            def send_messages(self, messages):
+                attempts.extend(message.to[0] for message in messages)
+                if messages[0].to == ['nobody@example.com']:
+                    raise smtplib.SMTPRecipientsRefused({'nobody@example.com': (550, b'No such user')})
+                return super().send_messages(messages)
+
+        refusing_queue = MailQueue(workers=1, retry_delay=0)
+        with patch('myapp.mail.get_connection', lambda **kwargs: RefusingBackend(**kwargs)):
+            for to in ('nobody@example.com', 'a@example.com'):
+                refusing_queue.enqueue(mail.EmailMessage('驗證碼', '123456', to=[to]))
+            refusing_queue.join()
+
+        self.assertEqual(attempts, ['nobody@example.com', 'a@example.com'])
+        self.assertEqual([message.to for message in mail.outbox], [['a@example.com']])
+        metrics = refusing_queue.metrics()
+        self.assertEqual((metrics['sent'], metrics['failed']), (1, 1))
+
+
+@override_settings(JWT_AUTH_MODE='stateless')
+class StatelessAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password='password123', first_name='小明')
+        response = APIClient().post('/api/login/', {'email': 'buyer@example.com', 'password': 'password123'},
+                                    format='json')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['access_token']}")
+
+    def test_user_info_makes_no_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/user/info')
+        self.assertEqual(response.json()['data'], {'first_name': '小明', 'email': 'buyer@example.com'})
+
+    def test_order_list_skips_the_user_lookup(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/orders/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_inactive_claim_is_rejected(self):
+        token = AccessToken.for_user(self.user)
+        add_user_claims(token, self.user)
+        token['is_active'] = False
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get('/api/user/info').status_code, 401)
+
+    @override_settings(JWT_AUTH_MODE='cached')
+    def test_cached_mode_loads_the_user_once(self):
+        self.client.get('/api/user/info')
+        with self.assertNumQueries(0):
+            self.client.get('/api/user/info')
+        # 只快取 token 也會帶的欄位，不含密碼雜湊
+        self.assertEqual(cache.get(f'jwt_user_claims_{self.user.pk}'),
+                         {'email': 'buyer@example.com', 'first_name': '小明', 'is_active': True, 'is_staff': False})
+        self.client.put('/api/user/update_name/', {'name': '大明'}, format='json')
+        self.assertEqual(self.client.get('/api/user/info').json()['data']['first_name'], '大明')
+
+    @override_settings(JWT_AUTH_MODE='cached')
+    async def test_async_cached_mode_caches_only_the_claims(self):
+        token = await sync_to_async(lambda: str(AccessToken.for_user(self.user)))()
+        headers = {'Authorization': f'Bearer {token}'}
+        response = await AsyncClient().get('/api/async/user/info', headers=headers)
+        self.assertEqual(response.json()['data']['first_name'], '小明')
+        self.assertNotIn('password', await cache.aget(f'jwt_user_claims_{self.user.pk}'))
+        response = await AsyncClient().get('/api/async/user/info', headers=headers)
+        self.assertEqual(response.json()['data']['email'], 'buyer@example.com')
+
+
+class RefreshTokenBlacklistTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        security_cache().clear()
+        User.objects.create_user(email='buyer@example.com', password='password123')
+        self.client = APIClient()
+        self.refresh = self.client.post('/api/login/', {
+            'email': 'buyer@example.com', 'password': 'password123'
+        }, format='json').json()['refresh_token']
+
+    def test_rotated_refresh_token_cannot_be_reused(self):
+        first = self.client.post('/api/token/refresh/', {'refresh': self.refresh}, format='json')
+        self.assertEqual(first.status_code, 200)
+        self.assertNotEqual(first.json()['refresh'], self.refresh)
+
+        replay = self.client.post('/api/token/refresh/', {'refresh': self.refresh}, format='json')
+        self.assertEqual(replay.status_code, 401)
+        verify = self.client.post('/api/token/verify/', {'token': self.refresh}, format='json')
+        self.assertEqual(verify.status_code, 400)
+
+        rotated = self.client.post('/api/token/refresh/', {'refresh': first.json()['refresh']}, format='json')
+        self.assertEqual(rotated.status_code, 200)
+
+    def test_unrevoked_tokens_skip_the_cache_lookup(self):
+        jti = ShopRefreshToken(self.refresh)['jti']
+        with patch.object(security_cache(), 'get', wraps=security_cache().get) as cache_get:
+            revocation_filter._synced_at = time.monotonic()
+            self.assertFalse(is_revoked(jti))
+        cache_get.assert_not_called()
+
+        revoke(jti, ShopRefreshToken(self.refresh)['exp'])
+        self.assertTrue(is_revoked(jti))
+
+    def test_refresh_loads_the_user_once(self):
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/token/refresh/', {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AccessToken(response.json()['access'])['email'], 'buyer@example.com')
+
+        User.objects.filter(email='buyer@example.com').update(is_active=False)
+        response = self.client.post('/api/token/refresh/', {'refresh': response.json()['refresh']}, format='json')
+        self.assertEqual(response.status_code, 401)
+        User.objects.filter(email='buyer@example.com').update(is_active=True)
+        user = User.objects.get(email='buyer@example.com')
+        unused = str(ShopRefreshToken.for_user(user))
+        user.delete()
+        self.assertEqual(self.client.post('/api/token/refresh/', {'refresh': unused}, format='json').status_code, 401)
+
+    @override_settings(JWT_BLACKLIST_SYNC_INTERVAL=0)
+    def test_lost_sequence_is_detected_by_other_workers(self):
+        worker = RevocationFilter()
+        first, second = ShopRefreshToken(), ShopRefreshToken()
+        revoke(first['jti'], first['exp'])
+        self.assertTrue(worker.might_contain(first['jti']))
+
+        # 序號被清除後重新從 1 開始，覆寫同一個紀錄鍵
+        security_cache().delete(BLACKLIST_SEQ_KEY)
+        revoke(second['jti'], second['exp'])
+        self.assertEqual(security_cache().get(BLACKLIST_SEQ_KEY), 1)
+        self.assertTrue(worker.might_contain(second['jti']))
+        self.assertTrue(worker.might_contain(first['jti']))
+
+    @override_settings(JWT_BLACKLIST_SYNC_INTERVAL=0, JWT_BLACKLIST_SNAPSHOT_INTERVAL=3)
+    def test_cold_workers_start_from_the_snapshot(self):
+        tokens = [ShopRefreshToken() for _ in range(4)]
+        for token in tokens[:3]:
+            revoke(token['jti'], token['exp'])
+        RevocationFilter().might_contain(tokens[0]['jti'])
+        self.assertEqual(security_cache().get(BLACKLIST_SNAPSHOT_KEY)['seq'], 3)
+
+        # 已過期的撤銷不會重播
+        security_cache().set(f'{BLACKLIST_KEY_PREFIX}_log_4', ('expired', time.time() - 1))
+        security_cache().set(BLACKLIST_SEQ_KEY, 4)
+        revoke(tokens[3]['jti'], tokens[3]['exp'])
+
+        cold = RevocationFilter()
+        with patch.object(security_cache(), 'get_many', wraps=security_cache().get_many) as get_many:
+            self.assertTrue(all(cold.might_contain(token['jti']) for token in tokens))
+        replayed = [key for call in get_many.call_args_list for key in call.args[0] if '_log_' in key]
+        self.assertEqual(replayed, [f'{BLACKLIST_KEY_PREFIX}_log_4', f'{BLACKLIST_KEY_PREFIX}_log_5'])
+        self.assertNotIn('expired', cold._revoked)
+
+    @override_settings(JWT_BLACKLIST_SYNC_INTERVAL=0, JWT_BLACKLIST_SNAPSHOT_INTERVAL=3)
+    def test_expired_revocations_leave_the_filter(self):
+        worker = RevocationFilter()
+        worker.might_contain('warm-up')
+        for n in range(2):
+            worker.add(f'expired_{n}', time.time() - 1)
+        live = [ShopRefreshToken() for _ in range(3)]
+        for token in live:
+            revoke(token['jti'], token['exp'])
+        # 寫入快照時移除過期的項目並重新填入 filter
+        self.assertTrue(worker.might_contain(live[0]['jti']))
+        self.assertFalse(any(worker.might_contain(f'expired_{n}') for n in range(2)))
+        self.assertTrue(all(worker.might_contain(token['jti']) for token in live))
+        self.assertEqual(worker.metrics()['bloom_entries'], 3)
+
+    @override_settings(JWT_BLACKLIST_SYNC_INTERVAL=0, JWT_BLACKLIST_BLOOM_CAPACITY=4)
+    def test_filter_is_refilled_past_its_capacity(self):
+        worker = RevocationFilter()
+        for n in range(4):
+            worker.add(f'expired_{n}', time.time() - 1)
+        token = ShopRefreshToken()
+        worker.add(token['jti'], token['exp'])
+        self.assertGreater(worker.metrics()['bloom_fill_ratio'], 0)
+
+        self.assertTrue(worker.might_contain(token['jti']))
+        metrics = worker.metrics()
+        self.assertEqual((metrics['revoked'], metrics['bloom_entries']), (1, 1))
+        self.assertFalse(worker.might_contain('expired_0'))
+        self.assertLess(metrics['bloom_false_positive_rate'], 1e-20)
+
+
+class CacheConfigurationTests(TestCase):
+    def load_settings(self, **environ):
+        path = os.path.join(settings.BASE_DIR, 'shop_backend', 'settings.py')
+        with patch.dict(os.environ, {'REDIS_URL': '', 'CACHE_BACKEND': '', **environ}):
+            if not environ.get('CACHE_BACKEND'):
+                del os.environ['CACHE_BACKEND']
+            return runpy.run_path(path)['CACHES']
+
+    def test_settings_default_to_locmem_and_redis(self):
+        caches_setting = self.load_settings()
+        self.assertEqual(caches_setting['default']['BACKEND'], 'django.core.cache.backends.locmem.LocMemCache')
+        self.assertEqual(caches_setting['security']['OPTIONS']['MAX_ENTRIES'], sys.maxsize)
+
+        caches_setting = self.load_settings(REDIS_URL='redis://cache:6379/1')
+        self.assertEqual(caches_setting['default']['BACKEND'], 'django_redis.cache.RedisCache')
+        self.assertEqual(caches_setting['security']['BACKEND'], 'django_redis.cache.RedisCache')
+        self.assertEqual(caches_setting['security']['LOCATION'], 'redis://cache:6379/1')
+        self.assertNotEqual(caches_setting['security']['KEY_PREFIX'], caches_setting['default']['KEY_PREFIX'])
+
+    def test_database_and_file_caches_share_the_security_cache(self):
+        caches_setting = self.load_settings(CACHE_BACKEND='db')
+        for alias in ('default', 'security'):
+            self.assertEqual(caches_setting[alias]['BACKEND'], 'myapp.cache_backends.DatabaseCache')
+        self.assertNotEqual(caches_setting['security']['LOCATION'], caches_setting['default']['LOCATION'])
+        self.assertEqual(caches_setting['security']['OPTIONS']['MAX_ENTRIES'], sys.maxsize)
+
+        # 檔案快取的 security 別名不能退回各行程獨立的 locmem
+        caches_setting = self.load_settings(CACHE_BACKEND='file')
+        self.assertEqual(caches_setting['security']['BACKEND'], 'django.core.cache.backends.filebased.FileBasedCache')
+        self.assertNotEqual(caches_setting['security']['LOCATION'], caches_setting['default']['LOCATION'])
+
+    def test_database_cache(self):
+        call_command('createcachetable', 'shop_test_cache', stdout=StringIO())
+        db_cache = DatabaseCache('shop_test_cache', {})
+        self.assertTrue(db_cache.add('seq', 0, timeout=None))
+        self.assertFalse(db_cache.add('seq', 5, timeout=None))
+        self.assertEqual(db_cache.incr('seq'), 1)
+        self.assertEqual(db_cache.incr('seq', 5), 6)
+        self.assertEqual(db_cache.decr('seq'), 5)
+        self.assertEqual(db_cache.get('seq'), 5)
+        with self.assertRaises(ValueError):
+            db_cache.incr('missing')
+
+    def test_multiple_workers_require_redis(self):
+        self.assertEqual(check_cache_backends(None), [])
+        with override_settings(WEB_CONCURRENCY=4):
+            self.assertEqual({message.id for message in check_cache_backends(None)}, {'myapp.E001'})
+
+        redis_caches = {
+            alias: {'BACKEND': 'django_redis.cache.RedisCache', 'LOCATION': 'redis://cache:6379/0'}
+            for alias in ('default', 'security')
+        }
+        with patch.object(settings, 'CACHES', redis_caches), override_settings(WEB_CONCURRENCY=4):
+            self.assertEqual(check_cache_backends(None), [])
+
+        database_caches = {
+            alias: {'BACKEND': backend, 'LOCATION': f'shop_{alias}', 'OPTIONS': {'MAX_ENTRIES': sys.maxsize}}
+            for alias, backend in (('default', 'myapp.cache_backends.DatabaseCache'),
+                                   ('security', 'django.core.cache.backends.db.DatabaseCache'))
+        }
+        with patch.object(settings, 'CACHES', database_caches), override_settings(WEB_CONCURRENCY=4):
+            # Django 原本的 DatabaseCache 的 incr 沒有鎖定資料列
+            self.assertEqual([(message.id, message.obj) for message in check_cache_backends(None)],
+                             [('myapp.E001', 'security')])
+
+    def test_culling_and_file_caches_are_reported(self):
+        file_caches = {
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/shop'},
+            'security': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        }
+        with patch.object(settings, 'CACHES', file_caches):
+            messages = check_cache_backends(None)
+        self.assertEqual([(message.id, message.obj) for message in messages],
+                         [('myapp.W001', 'default'), ('myapp.E002', 'security')])
+
+    def test_revocations_survive_a_full_cache(self):
+        security_cache().clear()
+        refresh = ShopRefreshToken()
+        revoke(refresh['jti'], refresh['exp'])
+        # 一般快取項目數達上限時會刪除三分之一的項目
+        max_entries = settings.CACHES['default']['OPTIONS']['MAX_ENTRIES']
+        cache.set_many({f'filler_{n}': n for n in range(max_entries + 1)})
+        self.assertLessEqual(len(cache._cache), max_entries)
+        self.assertTrue(is_revoked(refresh['jti']))
+
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_cache_health(self):
+        response = APIClient().get('/api/health/cache/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['backend'], 'LocMemCache')
+        self.assertTrue(response.json()['data']['healthy'])
+
+        with patch('myapp.views.cache.set', side_effect=ConnectionError('Redis down')):
+            response = APIClient().get('/api/health/cache/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['message'], '快取無法使用')
+        self.assertFalse(response.json()['data']['healthy'])
+
+
+class FastJSONRendererTests(TestCase):
+    def test_output_matches_drf_json_renderer(self):
+        payload = {
+            'message': '訂單列表取得成功',
+            'data': [{
+                'id': 1,
+                'created_at': timezone.now(),
+                'day': timezone.now().date(),
+                'total_amount': Decimal('1234.50'),
+                'tiny': Decimal('0.00001'),
+                'huge': Decimal('12345678901234567'),
+                'note': '行分隔 段落 "引號"\n',
+                'errors': {0: ['A valid number is required.']},
+                'empty': None,
+            }],
+        }
+        self.assertEqual(FastJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+    def test_parser_matches_drf_json_parser(self):
+        body = '{"products":[{"product_id":1,"quantity":2}],"note":"蘋果"}'.encode('utf-8')
+        self.assertEqual(
+            FastJSONParser().parse(BytesIO(body)),
+            JSONParser().parse(BytesIO(body))
+        )
+
+
+class ProjectionContractTests(TestCase):
+    def test_products_match_product_serializer(self):
+        Product.objects.create(name='蘋果', price='19.9')
+        Product.objects.create(name='梨子', price='0')
+        products = Product.objects.order_by('id')
+        self.assertEqual(
+            serialize_products(products.values_list(*PRODUCT_COLUMNS)),
+            ProductSerializer(products, many=True).data
+        )
+
+    def test_orders_match_order_serializer(self):
+        user = User.objects.create_user(email='buyer@example.com', password='password123')
+        order = Order.objects.create(user=user, total_amount='39.80', item_count=2)
+        OrderItem.objects.create(order=order, product_name='蘋果', product_price='19.9', quantity=2)
+        Order.objects.create(user=None)
+
+        orders = Order.objects.order_by('-created_at', '-id')
+        expected = OrderSerializer(
+            orders.prefetch_related(Prefetch('items', queryset=OrderItem.objects.order_by('id'))),
+            many=True
+        ).data
+        self.assertEqual(serialize_orders(list(orders.values_list(*ORDER_COLUMNS))), expected)
+        self.assertEqual(JSONRenderer().render(serialize_orders(list(orders.values_list(*ORDER_COLUMNS)))),
+                         JSONRenderer().render(expected))
+
+
+class ConnectionMetricsTests(TestCase):
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_requests_reuse_the_open_connection(self):
+        connection_metrics.reset()
+        client = APIClient()
+        for _ in range(3):
+            response = client.get('/api/health/db/')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.json()['data']['healthy'])
+
+        stats = connection_metrics.metrics()
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['reused'], 3)
+        self.assertEqual(stats['opened'], 0)
+        self.assertEqual(stats['reuse_ratio'], 1.0)
+
+    def test_cached_responses_do_not_touch_the_connection(self):
+        cache.clear()
+        client = APIClient()
+        etag = client.get('/api/products/')['ETag']
+        connection_metrics.reset()
+        db = connections['default']
+        install_acquire_timer(db)
+        # 304 在 view 之前就回應，不應檢查或建立連線
+        with patch.object(db, 'close_if_health_check_failed') as health_check, \
+                patch.object(db, 'ensure_connection') as ensure_connection:
+            response = client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        health_check.assert_not_called()
+        ensure_connection.assert_not_called()
+
+        stats = connection_metrics.metrics()
+        self.assertEqual(stats['requests'], 0)
+        self.assertEqual(stats['requests_without_queries'], 1)
+        self.assertEqual(stats['opened'], 0)
+
+    def test_ratios(self):
+        metrics = ConnectionMetrics()
+        self.assertEqual(metrics.metrics()['reuse_ratio'], 0.0)
+        metrics.record_open()
+        metrics.record_request(reused=False, acquire_seconds=0.004)
+        metrics.record_request(reused=True, acquire_seconds=0.002, health_check_failed=False)
+
+        stats = metrics.metrics()
+        self.assertEqual(stats['opened_per_request'], 0.5)
+        self.assertEqual(stats['reuse_ratio'], 0.5)
+        self.assertAlmostEqual(stats['acquire_seconds_avg'], 0.003)
+        self.assertEqual(stats['acquire_seconds_max'], 0.004)
+
+
+class MonitoringAccessTests(TestCase):
+    paths = ('/api/metrics/', '/api/health/cache/', '/api/health/mail/', '/api/health/db/')
+
+    def test_anonymous_clients_need_an_allowed_ip(self):
+        for path in self.paths:
+            self.assertEqual(APIClient().get(path).status_code, 401, path)
+            self.assertEqual(APIClient().get(path, REMOTE_ADDR='10.0.0.5').status_code, 401, path)
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.5']):
+            self.assertEqual(APIClient().get('/api/metrics/', REMOTE_ADDR='10.0.0.5').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_metrics_token_and_staff(self):
+        for path in self.paths:
+            response = APIClient().get(path, HTTP_AUTHORIZATION='Bearer scrape-secret')
+            self.assertEqual(response.status_code, 200, path)
+        self.assertEqual(APIClient().get('/api/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+
+        buyer = User.objects.create_user(email='buyer@example.com', password='password123')
+        staff = User.objects.create_user(email='staff@example.com', password='password123', is_staff=True)
+        for user, expected in ((buyer, 403), (staff, 200)):
+            token = add_user_claims(ShopRefreshToken.for_user(user).access_token, user)
+            response = APIClient().get('/api/health/db/', HTTP_AUTHORIZATION=f'Bearer {token}')
+            self.assertEqual(response.status_code, expected)
+
+
+class ExplainQueriesTests(TestCase):
+    def test_every_hot_query_gets_a_plan(self):
+        out = StringIO()
+        call_command('explain_queries', verbose_plan=True, stdout=out)
+        lines = out.getvalue().splitlines()
+
+        queries = hot_queries('default')
+        for label, _ in queries:
+            # 每個查詢的狀態列之後接著縮排的執行計畫
+            index = next(i for i, line in enumerate(lines) if line.endswith(label) or f' {label}:' in line)
+            self.assertTrue(lines[index + 1].startswith('        '), label)
+        self.assertIn(f'of {len(queries)} queries use a full table scan ({connection.vendor})', lines[-1])
+
+    def test_fail_on_scan(self):
+        with patch('myapp.management.commands.explain_queries.BOUNDED_SCANS', set()):
+            with self.assertRaisesMessage(CommandError, 'GET api/products/'):
+                call_command('explain_queries', fail_on_scan=True, stdout=StringIO())
+
+
+class EndpointBenchmarkTests(TestCase):
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_every_route_runs_without_errors(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'bench.json')
+            call_command('bench_endpoints', users=2, products=5, orders=2, items=2, requests=3,
+                         output=output, stderr=StringIO())
+            with open(output, encoding='utf-8') as f:
+                report = json.load(f)
+
+        for result in report['results']:
+            self.assertEqual(result['errors'], 0, result['route'])
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertFalse(User.objects.filter(email__endswith='@bench.local').exists())
+
+
+class RequestTimingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics_registry.reset()
+        Product.objects.create(name='蘋果', price='19.90')
+
+    def test_server_timing_and_log_line(self):
+        with self.assertLogs('myapp.performance', level='INFO') as logs:
+            first = self.client.get('/api/products/')
+            second = self.client.get('/api/products/')
+
+        self.assertIn('cache;desc="hit=0 miss=1"', first['Server-Timing'])
+        self.assertIn('db;dur=', first['Server-Timing'])
+        self.assertIn('desc="0 queries"', second['Server-Timing'])
+        self.assertIn('cache;desc="hit=1 miss=0"', second['Server-Timing'])
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['route'], '/api/products/')
+        self.assertEqual(record['status'], 200)
+        self.assertGreaterEqual(record['db_queries'], 1)
+
+    async def test_async_view_queries_are_counted(self):
+        with self.assertLogs('myapp.performance', level='INFO') as logs:
+            response = await self.async_client.get('/api/async/products/')
+        self.assertEqual(response.status_code, 200)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['route'], '/api/async/products/')
+        # 查詢在 sync_to_async 的執行緒中執行，仍需計入這個請求
+        self.assertGreaterEqual(record['db_queries'], 1)
+        self.assertIn(f'desc="{record["db_queries"]} queries"', response['Server-Timing'])
+
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_metrics_endpoint_exposes_route_histogram(self):
+        with self.assertLogs('myapp.performance', level='INFO'):
+            self.client.get('/api/products/')
+            self.client.get('/api/orders/123/cancel/')
+            response = self.client.get('/api/metrics/')
+
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn('shop_http_requests_total{method="GET",route="/api/products/",status="200"} 1', body)
+        self.assertIn('route="/api/orders/<int:order_id>/cancel/"', body)
+        self.assertIn('shop_http_request_duration_seconds_bucket{method="GET",route="/api/products/",le="+Inf"} 1',
+                      body)
+        self.assertIn('shop_jwt_blacklist_bloom_false_positive_rate ', body)
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.staff = User.objects.create_user(email='staff@example.com', password='password123', is_staff=True)
+        self.buyer = User.objects.create_user(email='buyer@example.com', password='password123')
+
+    def get_orders(self, user, **headers):
+        client = APIClient()
+        token = add_user_claims(ShopRefreshToken.for_user(user).access_token, user)
+        return client.get('/api/orders/', HTTP_AUTHORIZATION=f'Bearer {token}', **headers)
+
+    def test_staff_header_saves_pstats_profile(self):
+        with override_settings(PROFILING_ENABLED=True, PROFILING_DIR=self.tmp.name):
+            response = self.get_orders(self.staff, HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+        self.assertTrue(profile_id.startswith('api_orders/'))
+
+        out = StringIO()
+        call_command('profiles', dir=self.tmp.name, stdout=out)
+        self.assertIn(profile_id, out.getvalue())
+        out = StringIO()
+        call_command('profiles', dir=self.tmp.name, show=profile_id, stdout=out)
+        self.assertIn('function calls', out.getvalue())
+
+    def test_header_from_non_staff_or_disabled_hook_is_ignored(self):
+        with override_settings(PROFILING_ENABLED=True, PROFILING_DIR=self.tmp.name):
+            self.assertNotIn('X-Profile-Id', self.get_orders(self.buyer, HTTP_X_PROFILE='1'))
+        with override_settings(PROFILING_ENABLED=False, PROFILING_DIR=self.tmp.name):
+            self.assertNotIn('X-Profile-Id', self.get_orders(self.staff, HTTP_X_PROFILE='1'))
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    @override_settings(JWT_AUTH_MODE='stateless')
+    def test_staff_header_in_stateless_mode(self):
+        # 不查詢資料庫，是否為 staff 只能從 token 的 claim 得知
+        with override_settings(PROFILING_ENABLED=True, PROFILING_DIR=self.tmp.name):
+            self.assertIn('X-Profile-Id', self.get_orders(self.staff, HTTP_X_PROFILE='1'))
+            self.assertNotIn('X-Profile-Id', self.get_orders(self.buyer, HTTP_X_PROFILE='1'))
+
+    def test_sample_rate_with_stack_sampler(self):
+        with override_settings(PROFILING_ENABLED=True, PROFILING_DIR=self.tmp.name, PROFILING_MODE='sampler',
+                               PROFILING_SAMPLE_RATE=1.0, PROFILING_SAMPLE_INTERVAL=0.0005):
+            response = self.get_orders(self.buyer)
+        self.assertTrue(response['X-Profile-Id'].endswith('.collapsed'))
+
+        out = StringIO()
+        call_command('profiles', dir=self.tmp.name, route='api/orders/', summary=True, stdout=out)
+        self.assertIn('samples', out.getvalue())
+
+    async def test_async_chain_profiles_async_views(self):
+        token = add_user_claims(ShopRefreshToken.for_user(self.staff).access_token, self.staff)
+        with override_settings(PROFILING_ENABLED=True, PROFILING_DIR=self.tmp.name):
+            response = await AsyncClient().get(
+                '/api/async/orders/', headers={'Authorization': f'Bearer {token}', 'X-Profile': '1'}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['X-Profile-Id'].startswith('api_async_orders/'))
+        self.assertTrue(response['X-Profile-Id'].endswith('.prof'))
+
+
+class ImportProductsTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_csv_upserts_by_sku_and_skips_invalid_rows(self):
+        Product.objects.create(sku='A-1', name='舊名稱', price='1.00')
+        Product.objects.create(name='無 SKU 商品', price='2.00')
+        path = self.write('products.csv', (
+            'sku,name,price\n'
+            'A-1,蘋果,19.9\n'
+            'B-2,梨子,5\n'
+            'B-2,梨子（大）,6.5\n'
+            'C-3,,1\n'
+            'D-4,香蕉,abc\n'
+        ))
+        version = get_catalog_version()
+        out, err = StringIO(), StringIO()
+        call_command('import_products', path, batch_size=2, stdout=out, stderr=err)
+
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertEqual(Product.objects.get(sku='A-1').price, Decimal('19.90'))
+        self.assertEqual(Product.objects.get(sku='B-2').name, '梨子（大）')
+        self.assertIn('3 upserted, 2 invalid', out.getvalue())
+        self.assertIn('Skipping line 5', err.getvalue())
+        self.assertEqual(get_catalog_version(), version + 1)
+
+    def test_jsonl_and_strict_mode(self):
+        path = self.write('products.jsonl', '{"sku": "J-1", "name": "蘋果", "price": "10"}\n\n[1]\n')
+        call_command('import_products', path, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Product.objects.get(sku='J-1').price, Decimal('10.00'))
+
+        with self.assertRaisesMessage(CommandError, 'Line 3'):
+            call_command('import_products', path, strict=True, stdout=StringIO())
+
+
+@override_settings(SEARCH_SYNC_INTERVAL=0, SEARCH_INDEX_SNAPSHOT='')
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.products = {
+            name: Product.objects.create(name=name, price='10.00')
+            for name in ('蘋果汁', '青蘋果', '有機蘋果汁 1L', 'Apple Juice', 'Pineapple Cake')
+        }
+        self.index = SearchIndex()
+        self.index.build()
+
+    def names(self, results):
+        return [row[1] for row in results]
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('蘋果汁 1L'), ['蘋', '果', '汁', '蘋果', '果汁', '1l'])
+        self.assertEqual(tokenize('蘋果汁', query=True), ['蘋果', '果汁'])
+        self.assertEqual(tokenize('ｐｉｎｅ 蘋', query=True), ['pine', '蘋'])
+
+    def test_search_requires_every_token_and_ranks_prefix_first(self):
+        self.assertEqual(self.names(self.index.search('蘋果汁')), ['蘋果汁', '有機蘋果汁 1L'])
+        self.assertEqual(self.names(self.index.search('蘋果'))[0], '蘋果汁')
+        self.assertEqual(self.index.search('芒果'), [])
+
+    def test_candidate_limit_keeps_single_token_ranking(self):
+        expected = self.index.search('果', limit=3)
+        with override_settings(SEARCH_CANDIDATE_LIMIT=1):
+            self.assertEqual(self.index.search('果', limit=3), expected)
+
+    def test_autocomplete_matches_names_then_words(self):
+        self.assertEqual(self.names(self.index.autocomplete('app')), ['Apple Juice'])
+        self.assertEqual(self.names(self.index.autocomplete('ju')), ['Apple Juice'])
+        self.assertEqual(self.names(self.index.autocomplete('蘋')), ['蘋果汁'])
+
+    def test_saves_and_deletes_reach_the_index(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='芒果汁', price='30.00')
+        self.assertEqual(self.names(self.index.search('果汁')), ['蘋果汁', '芒果汁', '有機蘋果汁 1L'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products['蘋果汁'].delete()
+            product = self.products['青蘋果']
+            product.name = '青蘋果汁'
+            product.save()
+        self.assertEqual(self.names(self.index.search('果汁')), ['芒果汁', '青蘋果汁', '有機蘋果汁 1L'])
+
+    def test_bulk_changes_rebuild_when_marked_stale(self):
+        Product.objects.bulk_create([Product(name='芒果乾', price='5.00')])
+        self.assertEqual(self.index.search('芒果'), [])
+        mark_search_index_stale()
+        self.assertEqual(self.names(self.index.search('芒果')), ['芒果乾'])
+
+    def test_snapshot_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'search.pickle')
+            self.index.save_snapshot(path)
+            loaded = SearchIndex()
+            self.assertEqual(loaded.load_snapshot(path), 5)
+        self.assertEqual(loaded.search('蘋果'), self.index.search('蘋果'))
+
+    def test_endpoint(self):
+        client = APIClient()
+        with patch('myapp.views.search_index', self.index):
+            response = client.get('/api/products/search/', {'q': '蘋果汁'})
+            completion = client.get('/api/products/search/', {'q': 'pine', 'autocomplete': 'true'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'][0], {
+            'id': self.products['蘋果汁'].id, 'name': '蘋果汁', 'price': '10.00',
+        })
+        self.assertEqual([row['name'] for row in completion.json()['data']], ['Pineapple Cake'])
+        self.assertEqual(client.get('/api/products/search/').status_code, 400)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        price_index.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password='password123', first_name='小明')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.apple = Product.objects.create(name='蘋果', price='12.50')
+
+    def place_order(self):
+        # 戳記在交易提交後才更新
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/orders/', {'products': [{'product_id': self.apple.id, 'quantity': 1}]}, format='json')
+
+    def test_order_list_revalidates_without_queries(self):
+        self.place_order()
+        first = self.client.get('/api/orders/')
+        self.assertEqual(first['Cache-Control'], 'private, no-cache')
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/orders/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], first['ETag'])
+        self.assertNotEqual(self.client.get('/api/orders/', {'limit': 1})['ETag'], first['ETag'])
+
+        self.place_order()
+        response = self.client.get('/api/orders/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['data']), 2)
+
+        order_id = response.json()['data'][0]['id']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/orders/{order_id}/cancel/')
+        self.assertEqual(self.client.get('/api/orders/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_failed_order_keeps_the_stamp(self):
+        etag = self.client.get('/api/orders/summary/')['ETag']
+        self.client.post('/api/orders/', {'products': [{'product_id': 999999, 'quantity': 1}]}, format='json')
+        self.assertEqual(self.client.get('/api/orders/summary/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.place_order()
+        self.assertEqual(self.client.get('/api/orders/summary/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_if_modified_since(self):
+        # 戳記落在目前這一秒時不送 Last-Modified
+        self.assertNotIn('Last-Modified', self.client.get('/api/orders/'))
+        cache.set(f'{ORDER_STAMP_KEY_PREFIX}:{self.user.id}', (int(time.time()) - 10) * 1_000_000)
+        first = self.client.get('/api/orders/')
+        since = first['Last-Modified']
+        self.assertEqual(self.client.get('/api/orders/', HTTP_IF_MODIFIED_SINCE=since).status_code, 304)
+        self.assertEqual(self.client.get(
+            '/api/orders/', HTTP_IF_MODIFIED_SINCE=since, HTTP_IF_NONE_MATCH='"other"'
+        ).status_code, 200)
+        self.place_order()
+        self.assertEqual(self.client.get('/api/orders/', HTTP_IF_MODIFIED_SINCE=since).status_code, 200)
+
+    def test_archiving_moves_the_stamp(self):
+        self.place_order()
+        Order.objects.update(created_at=timezone.now() - timedelta(days=400))
+        etag = self.client.get('/api/orders/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('archive_orders', stdout=StringIO())
+        self.assertEqual(self.client.get('/api/orders/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_user_info_etag_follows_the_profile(self):
+        first = self.client.get('/api/user/info')
+        self.assertEqual(self.client.get('/api/user/info', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.client.put('/api/user/update_name/', {'name': '小華'}, format='json')
+        self.user.refresh_from_db()
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/user/info', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['first_name'], '小華')
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        for i in range(30):
+            order = Order.objects.create(user=self.user, total_amount='10.00', item_count=1)
+            OrderItem.objects.create(order=order, product_name=f'商品{i}', product_price='10.00', quantity=1)
+
+    def test_negotiate_encoding(self):
+        self.assertEqual(negotiate_encoding('gzip, deflate, br', ('br', 'gzip')), 'br')
+        self.assertEqual(negotiate_encoding('gzip;q=1.0, br;q=0.5', ('br', 'gzip')), 'gzip')
+        self.assertEqual(negotiate_encoding('*;q=0.1, br;q=0', ('br', 'gzip')), 'gzip')
+        self.assertIsNone(negotiate_encoding('gzip;q=0', ('gzip',)))
+        self.assertIsNone(negotiate_encoding('', ('gzip',)))
+
+    @patch('myapp.compression.brotli', None)
+    def test_large_responses_are_gzipped(self):
+        plain = self.client.get('/api/orders/')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        response = self.client.get('/api/orders/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertLess(int(response['Content-Length']), len(plain.content))
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+        revalidated = self.client.get('/api/orders/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    @override_settings(COMPRESSION_MIN_SIZE=1024)
+    def test_small_responses_are_not_compressed(self):
+        response = self.client.get('/api/user/info', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertLess(len(response.content), 1024)
+        self.assertNotIn('Content-Encoding', response)
+
+
+class ProductCatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.products = [Product.objects.create(name=f'商品{i}', price='10.00') for i in range(3)]
+
+    def test_cached_page_and_conditional_get(self):
+        first = self.client.get('/api/products/')
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/products/')
+            not_modified = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], first['ETag'])
+        self.assertEqual(self.client.get('/api/products/', HTTP_IF_NONE_MATCH='W/' + first['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.products[0].price = '12.00'
+            self.products[0].save()
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual(response.json()['data'][0]['price'], '12.00')
+
+    def test_version_moves_only_after_commit(self):
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.products[0].save()
+            self.products[1].delete()
+            self.assertEqual(get_catalog_version(), version)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(get_catalog_version(), version)
+
+    def test_concurrent_misses_build_once(self):
+        calls = []
+
+        def builder():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'data': []}
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            entries = list(pool.map(lambda _: build_catalog(1, builder, 'stampede'), range(8)))
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(entry == entries[0] for entry in entries))
+        self.assertEqual(get_cached_catalog(1, 'stampede'), entries[0])
+
+    @override_settings(PRODUCT_CATALOG_LOCK_TIMEOUT=0.2)
+    def test_waiter_builds_without_storing_when_lock_holder_stalls(self):
+        cache.add(f'{CATALOG_KEY_PREFIX}:1:{hashlib.md5(b"stalled").hexdigest()}:lock', 1, timeout=60)
+        entry = build_catalog(1, lambda: {'data': [1]}, 'stalled')
+        self.assertEqual(entry['payload'], {'data': [1]})
+        self.assertIsNone(get_cached_catalog(1, 'stalled'))
+
+
+class AsgiMiddlewareTests(TestCase):
+    @override_settings(DEBUG=True, PROFILING_ENABLED=True)
+    def test_async_chain_is_not_adapted(self):
+        # DEBUG 時 Django 會記錄每個被 sync_to_async 包裝的 middleware
+        with self.assertLogs('django.request', level='DEBUG') as logs:
+            ASGIHandler()
+            logging.getLogger('django.request').debug('middleware loaded')
+        self.assertEqual([line for line in logs.output if 'adapted for middleware' in line], [])
+
+    async def test_async_views_are_compressed(self):
+        order = await Order.objects.acreate(user=await User.objects.acreate(email='buyer@example.com'))
+        await OrderItem.objects.abulk_create([
+            OrderItem(order=order, product_name=f'商品{i}', product_price='10.00', quantity=1) for i in range(40)
+        ])
+        token = add_user_claims(ShopRefreshToken.for_user(order.user).access_token, order.user)
+        response = await AsyncClient().get(
+            '/api/async/orders/', headers={'Authorization': f'Bearer {token}', 'Accept-Encoding': 'gzip'}
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))['data'][0]['items']), 40)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='buyer@example.com', password='password123', first_name='小明')
+        self.apple = Product.objects.create(name='蘋果', price='12.50')
+        order = Order.objects.create(user=self.user, total_amount='25.00', item_count=2)
+        OrderItem.objects.create(order=order, product_name='蘋果', product_price='12.50', quantity=2)
+        token = add_user_claims(ShopRefreshToken.for_user(self.user).access_token, self.user)
+        self.auth = {'Authorization': f'Bearer {token}'}
+
+    async def test_product_list_matches_the_sync_view(self):
+        response = await self.async_client.get('/api/async/products/', {'limit': 10})
+        self.assertEqual(response.status_code, 200)
+        expected = await sync_to_async(lambda: APIClient().get('/api/products/', {'limit': 10}).json())()
+        self.assertEqual(response.json(), expected)
+
+        revalidated = await self.async_client.get('/api/async/products/', {'limit': 10},
+                                                  headers={'If-None-Match': response['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+
+    async def test_product_list_errors(self):
+        response = await self.async_client.get('/api/async/products/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], '查詢參數錯誤')
+        self.assertEqual((await self.async_client.post('/api/async/products/')).status_code, 405)
+
+        with patch('myapp.async_views.aget_catalog_version', side_effect=DatabaseError('database is down')):
+            response = await self.async_client.get('/api/async/products/')
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json(), {'message': '資料庫錯誤，請稍後再試'})
+
+    async def test_order_list_requires_a_valid_token(self):
+        self.assertEqual((await self.async_client.get('/api/async/orders/')).status_code, 401)
+        response = await self.async_client.get('/api/async/orders/', headers={'Authorization': 'Bearer broken'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'message': '使用者未登入'})
+
+        response = await self.async_client.get('/api/async/orders/', headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'][0]['items'][0]['product_name'], '蘋果')
+        revalidated = await self.async_client.get('/api/async/orders/',
+                                                  headers={**self.auth, 'If-None-Match': response['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+
+    async def test_order_list_errors(self):
+        response = await self.async_client.get('/api/async/orders/', {'cursor': 'not-a-cursor'}, headers=self.auth)
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get('/api/async/orders/', {'status': 'lost'}, headers=self.auth)
+        self.assertEqual(response.status_code, 400)
+
+        with patch('myapp.async_views.order_page', side_effect=DatabaseError('database is down')):
+            response = await self.async_client.get('/api/async/orders/', headers=self.auth)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json(), {'message': '資料庫錯誤，請稍後再試'})
+
+    async def test_user_info(self):
+        self.assertEqual((await self.async_client.get('/api/async/user/info')).status_code, 401)
+        response = await self.async_client.get('/api/async/user/info', headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data'], {'first_name': '小明', 'email': 'buyer@example.com'})
+        revalidated = await self.async_client.get('/api/async/user/info',
+                                                  headers={**self.auth, 'If-None-Match': response['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+
+        await User.objects.filter(id=self.user.id).aupdate(is_active=False)
+        self.assertEqual((await self.async_client.get('/api/async/user/info', headers=self.auth)).status_code, 401)
+
+    async def test_user_info_database_error(self):
+        with patch.object(ShopJWTAuthentication, 'aget_user', side_effect=DatabaseError('database is down')):
+            response = await self.async_client.get('/api/async/user/info', headers=self.auth)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json(), {'message': '資料庫錯誤，請稍後再試'})
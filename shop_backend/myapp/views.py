@@ -1,8 +1,15 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError, DatabaseError
+from django.core.validators import validate_email
+from django.db import IntegrityError, DatabaseError, connection
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse
+from django_redis.exceptions import ConnectionInterrupted
+from redis.exceptions import RedisError
 from rest_framework import status
 import logging
 from rest_framework.authtoken.views import ObtainAuthToken
@@ -10,16 +17,39 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.exceptions import ValidationError as DRFValidationError
-from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from .models import Product, Order
-from .serializers import ProductSerializer, OrderSerializer, CreateOrderSerializer, CustomAuthTokenSerializer
+from .authentication import (MetricsTokenAuthentication, ShopJWTAuthentication, add_user_claims,
+                             invalidate_cached_user)
+from .blacklist import ShopRefreshToken, revocation_filter, security_cache
+from .db import connection_metrics
+from .idempotency import idempotent_response
+from .instrumentation import metrics_registry
+from .catalog import build_catalog, compute_etag, etag_matches, get_cached_catalog, get_catalog_version
+from .conditional import (get_order_stamp, is_not_modified, order_validators, set_validators,
+                          touch_orders_on_commit)
+from .mail import mail_queue, send_verification_code
+from .archive import ARCHIVED_ORDER_COLUMNS, merge_order_rows, order_page
+from .models import ArchivedOrder, Product, Order
+from .pagination import encode_cursor
+from .permissions import IsMonitoringClient
+from .projections import ORDER_COLUMNS, PRODUCT_COLUMNS, format_decimal, serialize_orders, serialize_products
+from .search import search_index
+from .serializers import (ProductQuerySerializer, OrderSerializer, OrderQuerySerializer,
+                          OrderSummarySerializer, CreateOrderSerializer, CustomAuthTokenSerializer,
+                          ProductSearchQuerySerializer, BulkCancelOrderSerializer)
+from .stock import InsufficientStock
+import json
 import secrets
+import time
+from decimal import Decimal
 from typing import cast, Dict, Any
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+# django-redis 包裝成 ConnectionInterrupted，Django 的 RedisCache 直接拋出 RedisError，
+# 資料庫快取拋出 DatabaseError，檔案快取與連線失敗拋出 OSError
+CACHE_ERRORS = (ConnectionInterrupted, RedisError, DatabaseError, OSError)
+
 
 class UserRegistrationView(APIView):
     """
@@ -58,7 +88,7 @@ class UserRegistrationView(APIView):
             )
 
         # 驗證註冊驗證碼
-        cached_code = cache.get(f'registration_{email}')
+        cached_code = security_cache().get(f'registration_{email}')
         if not cached_code:
             return Response(
                 {'message': '驗證碼不存在或已過期，請重新發送'},
@@ -82,7 +112,7 @@ class UserRegistrationView(APIView):
 
         try:
             User.objects.create_user(email=email, password=password, first_name=email.split('@')[0])
-            cache.delete(f'registration_{email}')
+            security_cache().delete(f'registration_{email}')
             return Response(
                 {'message': '註冊成功'},
                 status=status.HTTP_201_CREATED,
@@ -121,8 +151,8 @@ class UserLoginView(ObtainAuthToken):
 
         validated_data = cast(Dict[str, Any], serializer.validated_data)
         user = validated_data['user']
-        refresh = RefreshToken.for_user(user)
-        access_token = refresh.access_token
+        refresh = ShopRefreshToken.for_user(user)
+        access_token = add_user_claims(refresh.access_token, user)
 
         return Response({
             'message': '登入成功',
@@ -136,22 +166,44 @@ class UserLoginView(ObtainAuthToken):
 class ProductListView(APIView):
     """
     GET api/products/ - 獲取商品列表
+    以商品 ID 進行游標分頁，可用 cursor、limit、min_price、max_price、name（名稱前綴）篩選
     """
     permission_classes = [AllowAny]
 
     def get(self, request):
 
-        try:
-            products = Product.objects.all()
-            serializer = ProductSerializer(products, many=True)
+        query = ProductQuerySerializer(data=request.query_params)
+        if not query.is_valid():
             return Response(
                 {
-                    "message": "商品列表取得成功",
-                    "data": serializer.data
+                    "message": "查詢參數錯誤",
+                    "errors": query.errors
                 },
-                status=status.HTTP_200_OK,
+                status=status.HTTP_400_BAD_REQUEST,
                 content_type='application/json; charset=utf-8'
             )
+        params = query.validated_data
+
+        try:
+            version = get_catalog_version()
+            variant = json.dumps(sorted(params.items()), default=str)
+            catalog = get_cached_catalog(version, variant)
+            if catalog is None:
+                catalog = build_catalog(version, lambda: self._build_page(params), variant)
+
+            if etag_matches(catalog['etag'], request.headers.get('If-None-Match')):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = Response(
+                    {
+                        "message": "商品列表取得成功",
+                        **catalog['payload']
+                    },
+                    status=status.HTTP_200_OK,
+                    content_type='application/json; charset=utf-8'
+                )
+            response['ETag'] = catalog['etag']
+            return response
         except DatabaseError as e:
             logger.error(f"Product list database error: {str(e)}")
             return Response(
@@ -171,29 +223,135 @@ class ProductListView(APIView):
                 content_type='application/json; charset=utf-8'
             )
 
+    @staticmethod
+    def _build_page(params):
+        limit = min(params.get('limit', settings.PRODUCT_PAGE_SIZE), settings.PRODUCT_MAX_PAGE_SIZE)
+        products = Product.objects.order_by('id')
+        if 'min_price' in params:
+            products = products.filter(price__gte=params['min_price'])
+        if 'max_price' in params:
+            products = products.filter(price__lte=params['max_price'])
+        if 'name' in params:
+            products = products.filter(name__startswith=params['name'])
+        if 'cursor' in params:
+            products = products.filter(id__gt=params['cursor'])
+
+        rows = list(products.values_list(*PRODUCT_COLUMNS)[:limit + 1])
+        next_cursor = encode_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+        return {
+            "data": serialize_products(rows[:limit]),
+            "next_cursor": next_cursor
+        }
+
+
+class ProductSearchView(APIView):
+    """
+    GET api/products/search/?q= - 依商品名稱搜尋，依相關程度排序
+    加上 autocomplete=true 時改為名稱前綴自動完成
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+
+        query = ProductSearchQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(
+                {
+                    "message": "查詢參數錯誤",
+                    "errors": query.errors
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+                content_type='application/json; charset=utf-8'
+            )
+        params = query.validated_data
+        limit = min(params.get('limit', settings.SEARCH_PAGE_SIZE), settings.SEARCH_MAX_PAGE_SIZE)
+
+        try:
+            if params['autocomplete']:
+                results = search_index.autocomplete(params['q'], limit)
+            else:
+                results = [row[:3] for row in search_index.search(params['q'], limit)]
+        except DatabaseError as e:
+            logger.error(f"Product search database error: {str(e)}")
+            return Response(
+                {
+                    "message": "資料庫錯誤，請稍後再試",
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                content_type='application/json; charset=utf-8'
+            )
+
+        return Response(
+            {
+                "message": "商品搜尋成功",
+                "data": [
+                    {"id": product_id, "name": name, "price": format_decimal(price)}
+                    for product_id, name, price in results
+                ]
+            },
+            status=status.HTTP_200_OK,
+            content_type='application/json; charset=utf-8'
+        )
+
 
 class OrderManagementView(APIView):
     """
-    GET api/orders/ - 獲取用戶的訂單列表
-    POST api/orders/ - 建立新訂單，需提供商品 ID 和數量
-    DELETE api/orders/<int:order_id>/cancel/ - 取消訂單
+    GET api/orders/ - 獲取用戶的訂單列表，依建立時間由新到舊，以 cursor、limit 分頁，可依 status 篩選
+                      include_archived=true 時一併列出已封存的訂單
+                      回應帶 ETag 與 Last-Modified，訂單未變更時條件式請求回 304
+    POST api/orders/ - 建立新訂單，需提供商品 ID 和數量，名稱與價格由伺服器端決定
+                       可帶 Idempotency-Key 標頭，重試時重播第一次成功的回應
+    DELETE api/orders/<int:order_id>/cancel/ - 取消訂單，訂單與明細保留為已取消狀態
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ShopJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
 
-        try:
-            orders = Order.objects.filter(user=request.user)
-            serializer = OrderSerializer(orders, many=True)
+        query = OrderQuerySerializer(data=request.query_params)
+        if not query.is_valid():
             return Response(
+                {
+                    "message": "查詢參數錯誤",
+                    "errors": query.errors
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+                content_type='application/json; charset=utf-8'
+            )
+        params = query.validated_data
+        limit = min(params.get('limit', settings.ORDER_PAGE_SIZE), settings.ORDER_MAX_PAGE_SIZE)
+
+        try:
+            # 先讀訂單戳記再查詢；用戶端的版本仍是最新時直接回 304，不需任何查詢
+            variant = json.dumps(['list', sorted(params.items()), limit], default=str)
+            etag, last_modified = order_validators(request.user.id, get_order_stamp(request.user.id), variant)
+            if is_not_modified(request, etag, last_modified):
+                return set_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
+
+            # 以 (created_at, id) 由新到舊分頁，直接以 values_list 組出回應，items 以單一查詢載入
+            orders = order_page(Order.objects.filter(user_id=request.user.id), params)
+            rows = list(orders.values_list(*ORDER_COLUMNS)[:limit + 1])
+            archived_items = None
+            if params['include_archived']:
+                # 封存訂單的明細存在同一列，只多一次查詢
+                archived = order_page(ArchivedOrder.objects.filter(user_id=request.user.id), params)
+                rows, archived_items = merge_order_rows(
+                    rows, list(archived.values_list(*ARCHIVED_ORDER_COLUMNS)[:limit + 1]), limit
+                )
+            next_cursor = None
+            if len(rows) > limit:
+                order_id, _, created_at = rows[limit - 1][:3]
+                next_cursor = encode_cursor(created_at.isoformat(), order_id)
+            response = Response(
                 {
                     "message": "訂單列表取得成功",
-                    "data": serializer.data
+                    "data": serialize_orders(rows[:limit], archived_items),
+                    "next_cursor": next_cursor
                 },
                 status=status.HTTP_200_OK,
                 content_type='application/json; charset=utf-8'
             )
+            return set_validators(response, etag, last_modified)
         except DatabaseError as e:
             logger.error(f"Order list database error: {str(e)}")
             return Response(
@@ -210,6 +368,10 @@ class OrderManagementView(APIView):
             )
 
     def post(self, request):
+        # 客戶端重試時帶相同的 Idempotency-Key，只會建立一筆訂單
+        return idempotent_response(request, 'orders', lambda: self._create_order(request))
+
+    def _create_order(self, request):
 
         if not request.data or not any(request.data.values()):
             return Response(
@@ -240,6 +402,15 @@ class OrderManagementView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
                 content_type='application/json; charset=utf-8'
             )
+        except InsufficientStock as e:
+            return Response(
+                {
+                    "message": "訂單建立失敗，商品庫存不足",
+                    "data": {"product_ids": e.product_ids}
+                },
+                status=status.HTTP_409_CONFLICT,
+                content_type='application/json; charset=utf-8'
+            )
         except IntegrityError as e:
             logger.error(f"Order creation integrity error: {str(e)}")
             return Response(
@@ -271,21 +442,117 @@ class OrderManagementView(APIView):
     def delete(self, request, order_id):
 
         try:
-            order = Order.objects.get(id=order_id, user=request.user)
-            order.delete()
+            # 單一 UPDATE 完成取消，不經由 cascade 逐筆刪除明細
+            cancelled = Order.objects.filter(id=order_id, user_id=request.user.id).cancel()
+            if cancelled:
+                touch_orders_on_commit([request.user.id])
+                return Response(
+                    {'message': '訂單取消成功'},
+                    status=status.HTTP_200_OK,
+                    content_type='application/json; charset=utf-8'
+                )
+            # 只有取消失敗時才多查一次，區分已取消與不存在
+            if Order.objects.filter(id=order_id, user_id=request.user.id).exists():
+                return Response(
+                    {'message': '訂單已取消'},
+                    status=status.HTTP_409_CONFLICT,
+                    content_type='application/json; charset=utf-8'
+                )
             return Response(
-                {'message': '訂單移除成功'},
-                status=status.HTTP_200_OK,
+                {'message': '訂單不存在或無權限操作'},
+                status=status.HTTP_404_NOT_FOUND,
                 content_type='application/json; charset=utf-8'
             )
-        except Order.DoesNotExist:
+        except DatabaseError as e:
+            logger.error(f"Order cancellation database error: {str(e)}")
             return Response(
-                {'message': '訂單不存在或無權限操作'},
-                status=status.HTTP_404_NOT_FOUND,
+                {'message': '資料庫錯誤，請稍後再試'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 content_type='application/json; charset=utf-8'
             )
+
+
+class OrderBulkCancelView(APIView):
+    """
+    POST api/orders/cancel/ - 批次取消訂單，需提供 order_ids，以單一 UPDATE 完成
+    不存在、不屬於該用戶或已取消的訂單會被略過
+    """
+    authentication_classes = [ShopJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+
+        serializer = BulkCancelOrderSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {
+                    "message": "訂單取消失敗，請確認輸入資料",
+                    "errors": serializer.errors
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+                content_type='application/json; charset=utf-8'
+            )
+        order_ids = set(serializer.validated_data['order_ids'])
+
+        try:
+            cancelled = Order.objects.filter(id__in=order_ids, user_id=request.user.id).cancel()
+            if cancelled:
+                touch_orders_on_commit([request.user.id])
         except DatabaseError as e:
-            logger.error(f"Order deletion database error: {str(e)}")
+            logger.error(f"Order bulk cancellation database error: {str(e)}")
+            return Response(
+                {'message': '資料庫錯誤，請稍後再試'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                content_type='application/json; charset=utf-8'
+            )
+        return Response(
+            {
+                "message": "訂單取消成功",
+                "data": {
+                    "requested": len(order_ids),
+                    "cancelled": cancelled
+                }
+            },
+            status=status.HTTP_200_OK,
+            content_type='application/json; charset=utf-8'
+        )
+
+
+class OrderSummaryView(APIView):
+    """
+    GET api/orders/summary/ - 獲取用戶的累計消費金額與訂單數，含已封存、不含已取消的訂單
+    直接加總 Order 上的 total_amount，不需掃描訂單明細；訂單未變更時條件式請求回 304
+    """
+    authentication_classes = [ShopJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+
+        try:
+            etag, last_modified = order_validators(request.user.id, get_order_stamp(request.user.id), 'summary')
+            if is_not_modified(request, etag, last_modified):
+                return set_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
+
+            totals = [
+                model.objects.filter(user_id=request.user.id, status=Order.Status.PLACED).aggregate(
+                    order_count=Count('id'),
+                    total_spent=Coalesce(Sum('total_amount'), Value(Decimal('0')))
+                )
+                for model in (Order, ArchivedOrder)
+            ]
+            # 已封存的訂單仍計入累計消費
+            summary = {key: sum(total[key] for total in totals) for key in ('order_count', 'total_spent')}
+            response = Response(
+                {
+                    "message": "訂單統計取得成功",
+                    "data": OrderSummarySerializer(summary).data
+                },
+                status=status.HTTP_200_OK,
+                content_type='application/json; charset=utf-8'
+            )
+            return set_validators(response, etag, last_modified)
+        except DatabaseError as e:
+            logger.error(f"Order summary database error: {str(e)}")
             return Response(
                 {'message': '資料庫錯誤，請稍後再試'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -295,10 +562,10 @@ class OrderManagementView(APIView):
 
 class UserProfileView(APIView):
     """
-    GET api/user/info - 獲取用戶的姓名和電子郵件
+    GET api/user/info - 獲取用戶的姓名和電子郵件，回應帶 ETag，未變更時條件式請求回 304
     PUT api/user/update_name/ - 更新用戶的姓名，需提供新的姓名
     """
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [ShopJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -310,7 +577,11 @@ class UserProfileView(APIView):
                     "first_name": getattr(user, 'first_name', ''),
                     "email": getattr(user, 'email', '')
                 }
-                return Response(
+                # 資料已隨驗證載入，ETag 直接由內容計算
+                etag = compute_etag(data)
+                if is_not_modified(request, etag):
+                    return set_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+                response = Response(
                     {
                         "message": "用戶資料取得成功",
                         "data": data
@@ -318,6 +589,7 @@ class UserProfileView(APIView):
                     status=status.HTTP_200_OK,
                     content_type='application/json; charset=utf-8'
                 )
+                return set_validators(response, etag)
             else:
                 return Response(
                     {'message': '使用者未登入'},
@@ -346,10 +618,15 @@ class UserProfileView(APIView):
                 {'error': 'Name must be at least 2 characters'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        user.first_name = new_name
-        user.save()
+        # 以單一 UPDATE 更新，request.user 在無狀態驗證模式下可能是 TokenUser
+        User.objects.filter(pk=user.pk).update(first_name=new_name)
+        invalidate_cached_user(user.pk)
+        data = {'message': '使用者名稱更新成功'}
+        if request.auth is not None and 'first_name' in request.auth:
+            request.auth['first_name'] = new_name
+            data['access_token'] = str(request.auth)
         return Response(
-            {'message': '使用者名稱更新成功'},
+            data,
             status=status.HTTP_200_OK,
             content_type='application/json; charset=utf-8'
         )
@@ -374,15 +651,31 @@ class SendVerificationCodeView(APIView):
                 content_type='application/json; charset=utf-8'
             )
 
+        # 格式錯誤的地址不進入寄信佇列，避免佔用重試
+        try:
+            validate_email(email)
+        except (ValidationError, TypeError):
+            return Response(
+                {'message': '電子郵件格式錯誤'},
+                status=status.HTTP_400_BAD_REQUEST,
+                content_type='application/json; charset=utf-8'
+            )
+
         try:
             verification_code = f"{secrets.randbelow(1_000_000):06d}"
             if (purpose == 'registration'):
-                cache.set(f'registration_{email}', verification_code, timeout=300)  # 5 分鐘有效
+                security_cache().set(f'registration_{email}', verification_code, timeout=300)  # 5 分鐘有效
             else:
-                cache.set(f'password_reset_{email}', verification_code, timeout=300)  # 5 分鐘有效
+                security_cache().set(f'password_reset_{email}', verification_code, timeout=300)  # 5 分鐘有效
 
-            # TODO: 用郵件發送驗證碼
-            print(f'驗證碼發送到 {email}: {verification_code} 用於 {purpose}')
+            # 交由背景佇列寄送，不在請求中等待 SMTP
+            if not send_verification_code(email, verification_code, purpose):
+                logger.error("Verification code mail queue is full")
+                return Response(
+                    {'message': '驗證碼發送失敗，請稍後再試'},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    content_type='application/json; charset=utf-8'
+                )
 
             return Response(
                 {'message': '驗證碼已發送'},
@@ -426,7 +719,7 @@ class PasswordResetView(APIView):
                 content_type='application/json; charset=utf-8'
             )
 
-        cached_code = cache.get(f'password_reset_{email}')
+        cached_code = security_cache().get(f'password_reset_{email}')
         if cached_code != code:
             return Response(
                 {'message': '驗證碼錯誤或已過期'},
@@ -438,7 +731,7 @@ class PasswordResetView(APIView):
             user = User.objects.get(email=email)
             user.password = make_password(new_password)
             user.save()
-            cache.delete(f'password_reset_{email}')
+            security_cache().delete(f'password_reset_{email}')
             return Response(
                 {'message': '密碼重設成功'},
                 status=status.HTTP_200_OK,
@@ -462,3 +755,109 @@ class PasswordResetView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
                 content_type='application/json; charset=utf-8'
             )
+
+
+class CacheHealthView(APIView):
+    """
+    GET api/health/cache/ - 檢查快取是否可用並回報讀寫延遲（毫秒）
+    """
+    authentication_classes = [MetricsTokenAuthentication, ShopJWTAuthentication]
+    permission_classes = [IsMonitoringClient]
+
+    def get(self, request):
+
+        probe_key = f'health_probe_{secrets.token_hex(8)}'
+        backend = settings.CACHES['default']['BACKEND'].rsplit('.', 1)[-1]
+        start = time.perf_counter()
+        try:
+            cache.set(probe_key, 'ok', timeout=10)
+            healthy = cache.get(probe_key) == 'ok'
+            cache.delete(probe_key)
+        except CACHE_ERRORS as e:
+            logger.error(f"Cache health probe error: {str(e)}")
+            healthy = False
+        latency_ms = round((time.perf_counter() - start) * 1000, 3)
+
+        return Response(
+            {
+                "message": "快取運作正常" if healthy else "快取無法使用",
+                "data": {
+                    "backend": backend,
+                    "healthy": healthy,
+                    "latency_ms": latency_ms
+                }
+            },
+            status=status.HTTP_200_OK if healthy else status.HTTP_503_SERVICE_UNAVAILABLE,
+            content_type='application/json; charset=utf-8'
+        )
+
+
+class MailQueueHealthView(APIView):
+    """
+    GET api/health/mail/ - 回報寄信佇列深度、寄送數量與寄送延遲（秒）
+    """
+    authentication_classes = [MetricsTokenAuthentication, ShopJWTAuthentication]
+    permission_classes = [IsMonitoringClient]
+
+    def get(self, request):
+        return Response(
+            {
+                "message": "寄信佇列狀態取得成功",
+                "data": mail_queue.metrics()
+            },
+            status=status.HTTP_200_OK,
+            content_type='application/json; charset=utf-8'
+        )
+
+
+class DatabaseHealthView(APIView):
+    """
+    GET api/health/db/ - 檢查資料庫連線並回報查詢延遲（毫秒）、連線設定與連線重用統計
+    """
+    authentication_classes = [MetricsTokenAuthentication, ShopJWTAuthentication]
+    permission_classes = [IsMonitoringClient]
+
+    def get(self, request):
+
+        start = time.perf_counter()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                healthy = cursor.fetchone() == (1,)
+        except DatabaseError as e:
+            logger.error(f"Database health probe error: {str(e)}")
+            healthy = False
+        latency_ms = round((time.perf_counter() - start) * 1000, 3)
+
+        return Response(
+            {
+                "message": "資料庫運作正常" if healthy else "資料庫無法使用",
+                "data": {
+                    "vendor": connection.vendor,
+                    "healthy": healthy,
+                    "latency_ms": latency_ms,
+                    "conn_max_age": connection.settings_dict['CONN_MAX_AGE'],
+                    "conn_health_checks": connection.settings_dict['CONN_HEALTH_CHECKS'],
+                    "connections": connection_metrics.metrics()
+                }
+            },
+            status=status.HTTP_200_OK if healthy else status.HTTP_503_SERVICE_UNAVAILABLE,
+            content_type='application/json; charset=utf-8'
+        )
+
+
+class MetricsView(APIView):
+    """
+    GET api/metrics/ - 以 Prometheus 文字格式輸出各路由的請求數、延遲分佈、資料庫與快取統計
+    """
+    authentication_classes = [MetricsTokenAuthentication, ShopJWTAuthentication]
+    permission_classes = [IsMonitoringClient]
+
+    def get(self, request):
+        lines = [metrics_registry.render()]
+        for name, value in revocation_filter.metrics().items():
+            lines.append(f'# TYPE shop_jwt_blacklist_{name} gauge\nshop_jwt_blacklist_{name} {value}\n')
+        return HttpResponse(
+            ''.join(lines),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
@@ -1,7 +1,10 @@
 import os
+import sys
 from datetime import timedelta
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = os.getenv("SECRET_KEY")
@@ -24,6 +27,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # 放在最前面，量測的總時間才會涵蓋其他 middleware
+    'myapp.instrumentation.RequestTimingMiddleware',
+    # 預設關閉，關閉時不會加入 middleware 鏈（見 myapp/profiling.py）
+    'myapp.profiling.ProfilingMiddleware',
+    # 需在其他會修改回應內容的 middleware 之前（見 myapp/compression.py）
+    'myapp.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -32,6 +41,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'myapp.db.ConnectionMetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'shop_backend.urls'
@@ -53,19 +63,240 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'shop_backend.wsgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'shop_db',
-        'USER': 'root',
-        'PASSWORD': os.getenv('DB_PASSWORD'),
-        'HOST': 'localhost',
-        'PORT': '3306',
+# 資料庫連線：DB_ENGINE 可為 mysql 或 sqlite（本機測試用）
+DB_ENGINE = os.getenv('DB_ENGINE', 'mysql')
+
+# asgi.py 會設定 DJANGO_ASGI=1。ASGI 下連線綁定在各請求的執行緒上，持久連線無法跨請求重用，預設關閉
+ASGI_MODE = os.getenv('DJANGO_ASGI') == '1'
+
+# 連線保留秒數，0 表示每個請求結束即關閉，None 表示永久保留
+DB_CONN_MAX_AGE = os.getenv('DB_CONN_MAX_AGE', '0' if ASGI_MODE else '60')
+
+DB_CONN_HEALTH_CHECKS = os.getenv('DB_CONN_HEALTH_CHECKS', 'true').lower() == 'true'
+
+if DB_ENGINE == 'mysql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.mysql',
+            'NAME': os.getenv('DB_NAME', 'shop_db'),
+            'USER': os.getenv('DB_USER', 'root'),
+            'PASSWORD': os.getenv('DB_PASSWORD'),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '3306'),
+            'OPTIONS': {
+                'charset': 'utf8mb4',
+                'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5')),
+            },
+        }
+    }
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DB_NAME', str(BASE_DIR / 'db.sqlite3')),
+        }
+    }
+else:
+    raise ValueError(f'Unsupported DB_ENGINE: {DB_ENGINE}')
+
+DATABASES['default']['CONN_MAX_AGE'] = None if DB_CONN_MAX_AGE == 'none' else int(DB_CONN_MAX_AGE)
+
+DATABASES['default']['CONN_HEALTH_CHECKS'] = DB_CONN_HEALTH_CHECKS
+
+# 每個請求的 Server-Timing、效能記錄與 api/metrics/（見 myapp/instrumentation.py）
+REQUEST_TIMING_ENABLED = os.getenv('REQUEST_TIMING_ENABLED', 'true').lower() == 'true'
+
+# api/metrics/ 與 api/health/ 只允許 staff、帶 Authorization: Bearer <METRICS_TOKEN> 的請求或以下 IP
+# 反向代理與服務在同一台主機時 REMOTE_ADDR 都是 127.0.0.1，此時不要列出本機位址，改用 METRICS_TOKEN
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '').split(',') if ip.strip()]
+
+# 請求效能分析：staff 以 X-Profile 標頭觸發，或依 PROFILING_SAMPLE_RATE 抽樣
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+
+# cprofile 輸出 pstats，sampler 輸出 collapsed stack
+PROFILING_MODE = os.getenv('PROFILING_MODE', 'cprofile')
+
+PROFILING_SAMPLE_INTERVAL = 0.005
+
+PROFILING_DIR = os.getenv('PROFILING_DIR', str(BASE_DIR / '.profiles'))
+
+# manage.py test 時不輸出每個請求的效能記錄，需要時測試以 assertLogs 擷取
+TESTING = sys.argv[1:2] == ['test']
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'myapp.performance': {
+            'handlers': ['console'],
+            'level': os.getenv('PERFORMANCE_LOG_LEVEL', 'WARNING' if TESTING else 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# 記錄每個請求的連線開啟數、重用比例與取得連線的延遲（見 myapp/db.py）
+DB_CONNECTION_METRICS = os.getenv('DB_CONNECTION_METRICS', 'true').lower() == 'true'
+
+# 快取設定：CACHE_BACKEND 可為 redis、db、file 或 locmem
+# 未設定時，有 REDIS_URL 就使用 Redis，否則使用只適合單一行程開發環境的 locmem
+# file 與 locmem 的 add/incr 不是跨行程的原子操作，多個 worker 必須使用 Redis 或 db，否則系統檢查失敗（見 myapp/checks.py）
+# db 將快取存在主資料庫，部署前需執行 python manage.py createcachetable
+REDIS_URL = os.getenv('REDIS_URL', '')
+
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis' if REDIS_URL else 'locmem')
+
+# 服務的 worker 數，與 gunicorn 相同讀取 WEB_CONCURRENCY
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+
+REDIS_COMPRESSORS = {
+    'none': 'django_redis.compressors.identity.IdentityCompressor',
+    'zlib': 'django_redis.compressors.zlib.ZlibCompressor',
+    'lzma': 'django_redis.compressors.lzma.LzmaCompressor',
+    'lz4': 'django_redis.compressors.lz4.Lz4Compressor',
+    'zstd': 'django_redis.compressors.zstd.ZStdCompressor',
+}
+
+REDIS_SERIALIZERS = {
+    'pickle': 'django_redis.serializers.pickle.PickleSerializer',
+    'json': 'django_redis.serializers.json.JSONSerializer',
+    'msgpack': 'django_redis.serializers.msgpack.MSGPackSerializer',
+}
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL or 'redis://127.0.0.1:6379/0',
+            'KEY_PREFIX': 'shop',
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                'CONNECTION_POOL_KWARGS': {
+                    'max_connections': int(os.getenv('REDIS_MAX_CONNECTIONS', '50')),
+                    'retry_on_timeout': True,
+                    'health_check_interval': 30,
+                },
+                'SOCKET_CONNECT_TIMEOUT': float(os.getenv('REDIS_CONNECT_TIMEOUT', '1.0')),
+                'SOCKET_TIMEOUT': float(os.getenv('REDIS_SOCKET_TIMEOUT', '0.5')),
+                'COMPRESSOR': REDIS_COMPRESSORS[os.getenv('REDIS_COMPRESSOR', 'none')],
+                'SERIALIZER': REDIS_SERIALIZERS[os.getenv('REDIS_SERIALIZER', 'pickle')],
+            },
+        }
+    }
+elif CACHE_BACKEND == 'db':
+    CACHES = {
+        'default': {
+            'BACKEND': 'myapp.cache_backends.DatabaseCache',
+            'LOCATION': os.getenv('CACHE_TABLE', 'shop_cache'),
+            'KEY_PREFIX': 'shop',
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '10000')),
+            },
+        }
+    }
+    if DB_ENGINE == 'sqlite':
+        # SQLite 沒有列鎖，incr 的交易需要在讀取前取得寫入鎖
+        DATABASES['default'].setdefault('OPTIONS', {})['transaction_mode'] = 'IMMEDIATE'
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', str(BASE_DIR / '.django_cache')),
+            'KEY_PREFIX': 'shop',
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '10000')),
+            },
+        }
+    }
+elif CACHE_BACKEND == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'shop',
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '10000')),
+            },
+        }
+    }
+else:
+    raise ValueError(f'Unsupported CACHE_BACKEND: {CACHE_BACKEND}')
+
+# 撤銷的 refresh token 與驗證碼放在獨立的快取（見 myapp/blacklist.py）
+# 一般快取滿了會刪除項目，這些狀態被刪掉就等於撤銷失效
+SECURITY_CACHE_ALIAS = 'security'
+
+if CACHE_BACKEND == 'redis':
+    # 這個 Redis 的 maxmemory-policy 應設為 noeviction
+    CACHES[SECURITY_CACHE_ALIAS] = {
+        **CACHES['default'],
+        'LOCATION': os.getenv('REDIS_SECURITY_URL', '') or CACHES['default']['LOCATION'],
+        'KEY_PREFIX': 'shop_security',
+    }
+elif CACHE_BACKEND == 'db':
+    # 資料庫快取達到 MAX_ENTRIES 時會刪除三分之一的項目，這裡不設上限
+    CACHES[SECURITY_CACHE_ALIAS] = {
+        'BACKEND': 'myapp.cache_backends.DatabaseCache',
+        'LOCATION': os.getenv('CACHE_SECURITY_TABLE', 'shop_security_cache'),
+        'KEY_PREFIX': 'shop_security',
         'OPTIONS': {
-            'charset': 'utf8mb4',
+            'MAX_ENTRIES': sys.maxsize,
         },
     }
-}
+elif CACHE_BACKEND == 'file':
+    # 與一般快取分開的目錄，同一台主機上的行程共用；不設上限
+    CACHES[SECURITY_CACHE_ALIAS] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_SECURITY_LOCATION', str(BASE_DIR / '.django_cache_security')),
+        'KEY_PREFIX': 'shop_security',
+        'OPTIONS': {
+            'MAX_ENTRIES': sys.maxsize,
+        },
+    }
+else:
+    # locmem 達到 MAX_ENTRIES 時會隨機刪除三分之一的項目，這裡不設上限
+    CACHES[SECURITY_CACHE_ALIAS] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shop-security',
+        'OPTIONS': {
+            'MAX_ENTRIES': sys.maxsize,
+        },
+    }
+
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', '587'))
+
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'true').lower() == 'true'
+
+EMAIL_TIMEOUT = 10
+
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'no-reply@localhost')
+
+# 背景寄信佇列
+MAIL_QUEUE_SIZE = 1000
+
+MAIL_QUEUE_WORKERS = 2
+
+MAIL_BATCH_SIZE = 50
+
+MAIL_MAX_RETRIES = 3
+
+MAIL_RETRY_DELAY = 1.0
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -101,18 +332,99 @@ AUTHENTICATION_BACKENDS = [
 ]
 
 REST_FRAMEWORK = {
+    # 安裝 orjson 時使用較快的 JSON 編解碼，未安裝則退回標準函式庫
+    'DEFAULT_RENDERER_CLASSES': [
+        'myapp.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'myapp.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'myapp.authentication.ShopJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
 }
 
+PRODUCT_PAGE_SIZE = 100
+
+PRODUCT_MAX_PAGE_SIZE = 500
+
+ORDER_PAGE_SIZE = 50
+
+ORDER_MAX_PAGE_SIZE = 200
+
+# 批次取消單次最多可指定的訂單數
+ORDER_BULK_CANCEL_MAX = 100
+
+# manage.py archive_orders 將超過此天數的訂單搬至封存表（見 myapp/archive.py）
+ORDER_ARCHIVE_AFTER_DAYS = 365
+
+ORDER_ARCHIVE_BATCH_SIZE = 1000
+
+# Idempotency-Key 的回應保留時間，過期的列由 manage.py purge_idempotency_keys 刪除（見 myapp/idempotency.py）
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
+# manage.py set_stock --flash-sale 使用的庫存分片數（見 myapp/stock.py）
+STOCK_FLASH_SALE_SHARDS = 16
+
+# 每位使用者的訂單戳記，訂單列表與統計以此產生 ETag（見 myapp/conditional.py）
+ORDER_STAMP_TIMEOUT = 30 * 24 * 60 * 60
+
+# 回應小於此大小不壓縮；安裝 brotli 時優先使用 br
+COMPRESSION_MIN_SIZE = 1024
+
+COMPRESSION_GZIP_LEVEL = 6
+
+COMPRESSION_BROTLI_QUALITY = 5
+
+PRODUCT_CATALOG_CACHE_TIMEOUT = 60 * 60
+
+PRODUCT_CATALOG_LOCK_TIMEOUT = 10
+
+# JWT 使用者查詢方式：database、cached 或 stateless（見 myapp/authentication.py）
+JWT_AUTH_MODE = os.getenv('JWT_AUTH_MODE', 'database')
+
+JWT_USER_CACHE_TIMEOUT = 60
+
+# Refresh token 黑名單存放於快取，並以每個行程的 Bloom filter 加速查詢（見 myapp/blacklist.py）
+JWT_BLACKLIST_BLOOM = True
+
+JWT_BLACKLIST_SYNC_INTERVAL = 1.0
+
+# 預設 2^20 位元、7 個雜湊的 filter 約在十萬筆時誤判率達 1%，超過時移除過期項目並重新填入
+JWT_BLACKLIST_BLOOM_CAPACITY = 100_000
+
+# 每累積這麼多筆撤銷紀錄寫入一次快照，新啟動的行程只需重播快照之後的紀錄
+JWT_BLACKLIST_SNAPSHOT_INTERVAL = 1000
+
+# 商品搜尋索引（見 myapp/search.py）；設定快照路徑可讓 worker 啟動時直接載入
+SEARCH_INDEX_SNAPSHOT = os.getenv('SEARCH_INDEX_SNAPSHOT', '')
+
+SEARCH_SYNC_INTERVAL = 1.0
+
+SEARCH_LOG_TIMEOUT = 60 * 60
+
+SEARCH_PAGE_SIZE = 20
+
+SEARCH_MAX_PAGE_SIZE = 50
+
+# 每次查詢最多計分的商品數，命中更多時依最少見的查詢詞權重挑選
+SEARCH_CANDIDATE_LIMIT = 200
+
 CORS_ALLOWED_ORIGINS = []
 
 CORS_ALLOW_CREDENTIALS = True
 
+# 網頁版客戶端建立訂單時會帶 Idempotency-Key
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
@@ -137,6 +449,8 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
     'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
+    'TOKEN_REFRESH_SERIALIZER': 'myapp.serializers.ShopTokenRefreshSerializer',
+    'TOKEN_VERIFY_SERIALIZER': 'myapp.serializers.ShopTokenVerifySerializer',
 
     'JTI_CLAIM': 'jti',
 
@@ -1,10 +1,13 @@
 from django.urls import path
-from myapp.views import (UserRegistrationView,UserLoginView,ProductListView,OrderManagementView,
-                        UserProfileView,SendVerificationCodeView,PasswordResetView)
+from myapp.views import (UserRegistrationView,UserLoginView,ProductListView,ProductSearchView,OrderManagementView,OrderBulkCancelView,
+                        OrderSummaryView,UserProfileView,SendVerificationCodeView,PasswordResetView,
+                        CacheHealthView,MailQueueHealthView,DatabaseHealthView,MetricsView)
+from myapp import async_views
 from rest_framework_simplejwt.views import TokenRefreshView, TokenVerifyView
 
 urlpatterns = [
     path('api/orders/', OrderManagementView.as_view(), name='orders'),
+    path('api/orders/summary/', OrderSummaryView.as_view(), name='orders_summary'),
     path('api/user/info', UserProfileView.as_view(), name='user_info'),
     path('api/user/update_name/', UserProfileView.as_view(), name='update_username'),
     path('api/register/', UserRegistrationView.as_view(), name='register'),
@@ -12,7 +15,16 @@ urlpatterns = [
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
     path('api/products/', ProductListView.as_view(), name='products'),
+    path('api/products/search/', ProductSearchView.as_view(), name='product_search'),
     path('api/send_verification_code/',SendVerificationCodeView.as_view(),name='send_verification_code'),
     path('api/reset_password/',PasswordResetView.as_view(),name='reset_password'),
     path('api/orders/<int:order_id>/cancel/', OrderManagementView.as_view(), name='orders_cancel'),
+    path('api/orders/cancel/', OrderBulkCancelView.as_view(), name='orders_bulk_cancel'),
+    path('api/health/cache/', CacheHealthView.as_view(), name='cache_health'),
+    path('api/health/mail/', MailQueueHealthView.as_view(), name='mail_health'),
+    path('api/health/db/', DatabaseHealthView.as_view(), name='db_health'),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
+    path('api/async/products/', async_views.product_list, name='async_products'),
+    path('api/async/orders/', async_views.order_list, name='async_orders'),
+    path('api/async/user/info', async_views.user_info, name='async_user_info'),
 ]
@@ -26,6 +26,7 @@ class ClassificationPageState extends State<ClassificationPage> {
 
       return products.map<Map<String, dynamic>>((product) {
         return {
+          'id': product['id'],
           'name': product['name'] ?? '未命名商品',
           'price': product['price'] ?? 0,
           'quantity': product['quantity'] ?? 1,
@@ -42,8 +43,7 @@ class ClassificationPageState extends State<ClassificationPage> {
         selectedProducts.map((index) {
           final product = products[index];
           return {
-            'product_name': product['name'],
-            'product_price': product['price'],
+            'product_id': product['id'],
             'quantity': product['quantity'],
           };
         }).toList();